@@ -1,13 +1,42 @@
 # -*- coding: utf-8 -*- # Garante codificação correta
 
 import streamlit as st
-import requests
 import pandas as pd
+import time
 from itertools import combinations
-from collections import OrderedDict
 from datetime import date, timedelta
 import locale # Para nomes de meses em português
-import re # Para parsear nomes combinados
+
+# Núcleo de cálculo sem Streamlit (busca, acumulados e simulação)
+from indice_imobiliario import (
+    DEFAULT_DURATIONS,
+    INDICES_IDS,
+    RentScenario,
+    accumulated_inflation_window,
+    backtest_frame,
+    build_rent_scenarios,
+    cache_stats,
+    fetch_sgs_frame,
+    fetch_deadline,
+    fetch_sgs_many,
+    find_best_rules,
+    get_rolling_12m_table,
+    load_monthly_series,
+    metrics_snapshot,
+    observe,
+    ordinal_label,
+    project_rent_scenarios,
+    prometheus_text,
+    simulate_rent_payments_v3,
+    simulate_rent_scenarios,
+    span,
+    stale_series,
+)
+
+_page_start = time.perf_counter() # Tempo total da execução do script (ver painel de desempenho)
+PAGE_FETCH_BUDGET_SECONDS = 15 # Espera máxima pelo BCB somando todas as seções da página
+FAIR_RULE_TOLERANCE = 1.0 # R$: a regra 'mais próxima' aceita o primeiro total a essa distância da referência
+RULE_SEARCH_MAX_NODES = 20_000 # Subconjuntos avaliados por regra antes de parar com o melhor encontrado
 
 # --- Configuração da Página (MOVIDO PARA CÁ - DEVE SER O PRIMEIRO COMANDO st.*) ---
 st.set_page_config(layout="wide", page_title="Painel de Inflação BCB | LocX", initial_sidebar_state="expanded")
@@ -42,114 +71,23 @@ except locale.Error:
 st.title("📊 Painel de Índices de Inflação (BCB SGS)")
 st.markdown("Consulte e compare a inflação acumulada.")
 
-# --- Configuração Índices ---
-INDICES_IDS = OrderedDict([
-    ('IPCA', 433),
-    ('INPC', 188),
-    ('IGP-DI', 190),
-    ('INCC', 192),
-    ('IGP-M', 189),
-    ('IPC-FIPE', 191)
-])
-
-# --- Busca Dados BCB (Cache) ---
-@st.cache_data(ttl=3600) # Cache por 1 hora
+# --- Busca Dados BCB ---
+# O histórico completo de cada série fica em memória no núcleo (atualizado em
+# segundo plano); cada período/intervalo escolhido é só um recorte, sem acesso à rede.
 def get_bcb_data(codigo_sgs, period=None, start_date=None, end_date=None):
-    """Busca dados da API SGS do BCB."""
-    if period:
-        url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo_sgs}/dados/ultimos/{period}?formato=json"
-    elif start_date and end_date:
-        start_str = start_date.strftime('%d/%m/%Y')
-        end_str = end_date.strftime('%d/%m/%Y')
-        url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo_sgs}/dados?formato=json&dataInicial={start_str}&dataFinal={end_str}"
-    else:
-        print(f"Erro BCB ({codigo_sgs}): Nem 'period' nem 'start/end_date' fornecidos.")
-        return None # Precisa de um período ou datas
+    """Busca dados da série SGS no período (últimos N meses) ou intervalo de datas."""
+    df, error_msg = fetch_sgs_frame(codigo_sgs, period, start_date, end_date)
+    if error_msg:
+        st.error(error_msg)
+    return df
 
-    try:
-        response = requests.get(url, timeout=20) # Aumentado timeout
-        response.raise_for_status() # Verifica erros HTTP (4xx, 5xx)
-        data = response.json()
-
-        if not data: # Lista vazia retornada pela API
-            print(f"BCB ({codigo_sgs}): Nenhum dado retornado pela API para o período/datas.")
-            return None
-
-        df = pd.DataFrame(data)
-        df['data'] = pd.to_datetime(df['data'], format='%d/%m/%Y')
-        df = df.set_index('data')
-        col_name = f'sgs_{codigo_sgs}'
-        df = df.rename(columns={'valor': col_name})
-        df[col_name] = pd.to_numeric(df[col_name], errors='coerce')
-        df = df.dropna(subset=[col_name]) # Remove linhas onde a conversão falhou
-
-        if df.empty:
-             print(f"BCB ({codigo_sgs}): DataFrame vazio após limpeza inicial.")
-             return None
-
-        # Filtra novamente pelas datas exatas se fornecidas (API pode retornar um pouco mais)
-        if start_date and end_date:
-            df.index = pd.to_datetime(df.index)
-            df = df[(df.index >= pd.to_datetime(start_date)) & (df.index <= pd.to_datetime(end_date))]
-            # Garante índice único (em caso de dados duplicados raros na API)
-            df = df[~df.index.duplicated(keep='first')]
-
-        if df.empty:
-             print(f"BCB ({codigo_sgs}): DataFrame vazio após filtro final de datas.")
-             return None
-
-        return df[[col_name]] # Retorna apenas a coluna de valor
-
-    except requests.exceptions.Timeout:
-        st.error(f"Erro BCB ({codigo_sgs}): Timeout ao acessar API.")
-        return None
-    except requests.exceptions.RequestException as e:
-        st.error(f"Erro BCB ({codigo_sgs}): Erro na requisição - {e}")
-        return None
-    except Exception as e:
-        st.error(f"Erro processando dados BCB ({codigo_sgs}): {e}")
-        return None
-
-# --- Cálculo Acumulado (Comparação) ---
-def calculate_accumulated_inflation(df, column_name):
-    """Calcula inflação acumulada para uma coluna em um DataFrame."""
-    if column_name not in df.columns:
-        print(f"Erro Acumulado: Coluna '{column_name}' não encontrada.")
-        return None
-    try:
-        # Converte para numérico, tratando erros e removendo NaNs resultantes
-        numeric_series = pd.to_numeric(df[column_name], errors='coerce').dropna()
-
-        if numeric_series.empty:
-            print(f"Erro Acumulado ({column_name}): Série vazia após conversão/limpeza.")
-            return None
-        if len(numeric_series) < 1: # Precisa de pelo menos um valor
-             print(f"Erro Acumulado ({column_name}): Menos de 1 valor válido.")
-             return None
-        # Verifica se todos os valores são realmente numéricos e finitos
-        if not pd.api.types.is_numeric_dtype(numeric_series) or not all(numeric_series.apply(lambda x: pd.notna(x) and abs(x) != float('inf'))):
-             print(f"Erro Acumulado ({column_name}): Contém valores não numéricos ou infinitos.")
-             return None
-
-        # Cálculo da inflação acumulada
-        accumulated_inflation = (numeric_series.apply(lambda x: 1 + (x / 100)).prod() - 1) * 100
-        return accumulated_inflation
-    except Exception as e:
-        print(f"Erro inesperado em calculate_accumulated_inflation ({column_name}): {e}")
-        return None
-
-# --- Cálculo Acumulado 12M (Histórico/Aluguel) ---
-def calculate_rolling_12m_accumulation(series_window_monthly_perc):
-    """Função para ser usada com .rolling().apply() para calcular acum. 12 meses."""
-    valid_series = series_window_monthly_perc.dropna()
-    if len(valid_series) == 12: # Só calcula se tiver exatamente 12 meses válidos na janela
-        try:
-            accumulation = (valid_series.apply(lambda x: 1 + (x / 100)).prod() - 1) * 100
-            return accumulation
-        except Exception:
-            return pd.NA # Retorna NA em caso de erro no cálculo
-    else:
-        return pd.NA # Retorna NA se não tiver 12 meses válidos
+def get_bcb_data_many(codigos_sgs, period=None, start_date=None, end_date=None):
+    """Busca várias séries SGS (em paralelo, se fora da memória). Retorna {codigo_sgs: DataFrame ou None}."""
+    with span("app_busca_series"):
+        fetched, errors = fetch_sgs_many(codigos_sgs, period=period, start_date=start_date, end_date=end_date)
+    for error_msg in errors:
+        st.error(error_msg) # Mensagens exibidas na thread do script
+    return fetched
 
 # --- Controles Barra Lateral ---
 st.sidebar.header("⚙️ Configurações da Comparação")
@@ -209,615 +147,626 @@ selected_indices_names = st.sidebar.multiselect(
 )
 
 # --- Lógica Principal da Comparação Acumulada ---
-st.header(f"📈 Comparação Acumulada ({period_label})")
-
-if not selected_indices_names:
-    st.warning("👈 Selecione pelo menos um índice na barra lateral para iniciar a comparação.")
-    st.stop()
-
-dataframes = {}
-indices_validos_busca = [] # Guarda nomes dos índices que retornaram dados
-
-# Busca dados para cada índice selecionado
-# Usar st.spinner para feedback visual durante a busca
-with st.spinner(f"Buscando dados para comparação ({len(selected_indices_names)} índice(s), {period_label})..."):
-    for indice_name in selected_indices_names:
-        if indice_name in INDICES_IDS:
-            codigo_sgs = INDICES_IDS[indice_name]
-            # Passa os parâmetros corretos (period OU start/end_date)
-            df = get_bcb_data(codigo_sgs, period=period, start_date=start_date, end_date=end_date)
-
-            if df is not None and not df.empty:
-                # Renomeia a coluna para o nome do índice (IPCA, INPC, etc.)
-                col_name_sgs = f'sgs_{codigo_sgs}'
-                df = df.rename(columns={col_name_sgs: indice_name})
-                dataframes[indice_name] = df # Guarda o DataFrame no dicionário
-                indices_validos_busca.append(indice_name)
+# Cada seção é uma função: a comparação depende dos controles da barra lateral
+# (que sempre reexecutam a página), enquanto histórico, calculadora e backtest
+# são fragmentos - mexer num widget deles reexecuta só a própria seção.
+@span("secao_comparacao")
+def comparison_section():
+    """Inflação acumulada dos índices escolhidos na barra lateral, no período escolhido."""
+    st.header(f"📈 Comparação Acumulada ({period_label})")
+
+    if not selected_indices_names:
+        st.warning("👈 Selecione pelo menos um índice na barra lateral para iniciar a comparação.")
+        return
+
+    dataframes = {}
+    indices_validos_busca = [] # Guarda nomes dos índices que retornaram dados
+
+    # Busca dados para cada índice selecionado
+    # Usar st.spinner para feedback visual durante a busca
+    with st.spinner(f"Buscando dados para comparação ({len(selected_indices_names)} índice(s), {period_label})..."):
+        # Busca todos os índices selecionados em paralelo (period OU start/end_date)
+        fetched_comp = get_bcb_data_many(
+            tuple(INDICES_IDS[name] for name in selected_indices_names if name in INDICES_IDS),
+            period=period, start_date=start_date, end_date=end_date
+        )
+        for indice_name in selected_indices_names:
+            if indice_name in INDICES_IDS:
+                codigo_sgs = INDICES_IDS[indice_name]
+                df = fetched_comp.get(codigo_sgs)
+
+                if df is not None and not df.empty:
+                    # Renomeia a coluna para o nome do índice (IPCA, INPC, etc.)
+                    col_name_sgs = f'sgs_{codigo_sgs}'
+                    df = df.rename(columns={col_name_sgs: indice_name})
+                    dataframes[indice_name] = df # Guarda o DataFrame no dicionário
+                    indices_validos_busca.append(indice_name)
+                else:
+                     print(f"Comparação: Nenhum dado válido retornado para {indice_name}.")
             else:
-                 print(f"Comparação: Nenhum dado válido retornado para {indice_name}.")
-        else:
-            st.warning(f"Índice '{indice_name}' não reconhecido.") # Caso raro
+                st.warning(f"Índice '{indice_name}' não reconhecido.") # Caso raro
 
-# Verifica se algum dado foi obtido
-if not indices_validos_busca:
-    st.error("Nenhum dado pôde ser obtido para os índices selecionados no período especificado.")
-    st.stop()
+    # Verifica se algum dado foi obtido
+    if not indices_validos_busca:
+        st.error("Nenhum dado pôde ser obtido para os índices selecionados no período especificado.")
+        return
 
-# Combina os DataFrames obtidos
-indices_df_comp = None
-if dataframes:
-    try:
-        # Usa concat com outer join para manter todas as datas e preencher com NaN onde não há dados
-        indices_df_comp = pd.concat(dataframes.values(), axis=1, join='outer')
-        # Ordena pelo índice (data)
-        indices_df_comp = indices_df_comp.sort_index()
-    except Exception as e:
-        st.error(f"Erro ao combinar DataFrames para comparação: {e}")
-        st.stop()
-
-# Se a combinação falhar ou resultar em vazio
-if indices_df_comp is None or indices_df_comp.empty:
-    st.error("Falha ao criar ou DataFrame combinado vazio para comparação.")
-    st.stop()
-
-# Refiltra por datas se o modo de intervalo foi usado (garante limites exatos)
-if start_date and end_date:
-    indices_df_comp.index = pd.to_datetime(indices_df_comp.index) # Garante que é DatetimeIndex
-    indices_df_comp = indices_df_comp[(indices_df_comp.index >= pd.to_datetime(start_date)) & (indices_df_comp.index <= pd.to_datetime(end_date))]
-
-# Remove linhas que só contenham NaN (após o join e possível refiltro)
-indices_df_comp.dropna(axis=0, how='all', subset=indices_validos_busca, inplace=True)
-
-# Verifica se ainda há dados após a limpeza
-if indices_df_comp.empty:
-    st.warning(f"Nenhum dado comum encontrado para os índices no período {period_label} após combinação e limpeza.")
-    st.stop()
-
-# Calcula e exibe a inflação acumulada para cada índice válido
-accumulated_inflation_comp = {}
-final_valid_indices_comp = [] # Índices que tiveram acumulado calculado com sucesso
-
-# Exibe o período efetivo que está sendo comparado (pode ser menor que o solicitado)
-if not indices_df_comp.empty:
-    actual_start_comp = indices_df_comp.index.min().strftime('%d/%m/%Y')
-    actual_end_comp = indices_df_comp.index.max().strftime('%d/%m/%Y')
-    st.markdown(f"*Período efetivo considerado na comparação: **{actual_start_comp} a {actual_end_comp}***")
-
-# Cria colunas para exibir as métricas lado a lado
-num_indices_plot = len(indices_validos_busca)
-cols_metrics = st.columns(num_indices_plot) if num_indices_plot > 0 else [st] # Fallback se 0
-idx_col = 0
-
-for indice_name in indices_validos_busca: # Itera sobre os que retornaram dados
-     if indice_name in indices_df_comp.columns:
-         # Passa apenas o DataFrame com a coluna relevante
-         inflation = calculate_accumulated_inflation(indices_df_comp[[indice_name]], indice_name)
-         if inflation is not None:
-             accumulated_inflation_comp[indice_name] = inflation # Guarda o resultado
-             # Seleciona a coluna para exibir a métrica
-             current_col = cols_metrics[idx_col % num_indices_plot] if num_indices_plot > 0 else st
-             with current_col:
-                 st.metric(label=f"{indice_name} (Acum.)", value=f"{inflation:.2f}%")
-             final_valid_indices_comp.append(indice_name) # Adiciona à lista final
-             idx_col += 1
-         else:
-              print(f"Comparação: Não foi possível calcular acumulado para {indice_name}.")
-
-# Se nenhum acumulado pôde ser calculado
-if not final_valid_indices_comp:
-    st.error("Não foi possível calcular a inflação acumulada para nenhum dos índices selecionados neste período.")
-    st.stop()
-
-# Expander para mostrar os dados brutos mensais usados na comparação
-with st.expander("Ver dados mensais brutos (%) usados na Comparação Acumulada"):
-    st.dataframe(indices_df_comp[indices_validos_busca].style.format("{:.2f}", na_rep="-"))
-
-# Análise Combinada (Médias e Mínimos) - Somente se houver 2 ou mais índices com resultado
-if len(final_valid_indices_comp) >= 2:
-    st.subheader("Análise Combinada da Comparação")
-    mean_results_list = []
-    min_results_list = []
-
-    # Gera combinações de 2 até N índices
-    for r in range(2, len(final_valid_indices_comp) + 1):
-        for combination in combinations(final_valid_indices_comp, r):
-            indices_list = list(combination)
-            indices_str = ", ".join(indices_list) # Para exibição
-
-            # Cálculo da Média
-            try:
-                # Garante que todos os índices da combinação têm um valor calculado
-                if all(indice in accumulated_inflation_comp for indice in indices_list):
-                    mean_inflation = sum(accumulated_inflation_comp[indice] for indice in indices_list) / len(indices_list)
-                    mean_results_list.append(f"Média acumulada para ({indices_str}): **{mean_inflation:.2f}%**")
-                else:
-                    mean_results_list.append(f"Média acumulada para ({indices_str}): Erro (Dados ausentes para um ou mais índices)")
-            except Exception as e:
-                mean_results_list.append(f"Média acumulada para ({indices_str}): Erro ({type(e).__name__})")
-
-            # Cálculo do Mínimo
-            try:
-                 # Filtra apenas os valores válidos (não None) para a combinação atual
-                 valid_values = {k: v for k, v in accumulated_inflation_comp.items() if k in indices_list and v is not None}
-                 if not valid_values: # Se não houver valores válidos
-                     min_results_list.append(f"Menor acumulada entre ({indices_str}): N/A (nenhum valor válido)")
-                     continue
-                 # Encontra o menor valor e o nome do índice correspondente
-                 min_inflation_val = min(valid_values.values())
-                 min_index_name = min(valid_values, key=valid_values.get) # Encontra a chave (nome) com o menor valor
-                 min_results_list.append(f"Menor acumulada entre ({indices_str}): **{min_inflation_val:.2f}%** ({min_index_name})")
-            except Exception as e:
-                 min_results_list.append(f"Menor acumulada entre ({indices_str}): Erro ({type(e).__name__})")
-
-    # Exibe os resultados das médias e mínimos
-    st.markdown("--- **Médias entre Índices** ---")
-    st.markdown("\n".join(mean_results_list)) # Usa markdown para negrito
-    st.markdown("--- **Menor Índice em Comparação** ---")
-    st.markdown("\n".join(min_results_list))
+    # Combina os DataFrames obtidos
+    indices_df_comp = None
+    if dataframes:
+        try:
+            # Usa concat com outer join para manter todas as datas e preencher com NaN onde não há dados
+            indices_df_comp = pd.concat(dataframes.values(), axis=1, join='outer')
+            # Ordena pelo índice (data)
+            indices_df_comp = indices_df_comp.sort_index()
+        except Exception as e:
+            st.error(f"Erro ao combinar DataFrames para comparação: {e}")
+            return
+
+    # Se a combinação falhar ou resultar em vazio
+    if indices_df_comp is None or indices_df_comp.empty:
+        st.error("Falha ao criar ou DataFrame combinado vazio para comparação.")
+        return
+
+    # Refiltra por datas se o modo de intervalo foi usado (garante limites exatos)
+    if start_date and end_date:
+        indices_df_comp = indices_df_comp[(indices_df_comp.index >= pd.to_datetime(start_date)) & (indices_df_comp.index <= pd.to_datetime(end_date))]
+
+    # Remove linhas que só contenham NaN (após o join e possível refiltro)
+    indices_df_comp.dropna(axis=0, how='all', subset=indices_validos_busca, inplace=True)
+
+    # Verifica se ainda há dados após a limpeza
+    if indices_df_comp.empty:
+        st.warning(f"Nenhum dado comum encontrado para os índices no período {period_label} após combinação e limpeza.")
+        return
+
+    # Calcula e exibe a inflação acumulada para cada índice válido
+    accumulated_inflation_comp = {}
+    final_valid_indices_comp = [] # Índices que tiveram acumulado calculado com sucesso
+
+    # Exibe o período efetivo que está sendo comparado (pode ser menor que o solicitado)
+    if not indices_df_comp.empty:
+        actual_start_comp = indices_df_comp.index.min().strftime('%d/%m/%Y')
+        actual_end_comp = indices_df_comp.index.max().strftime('%d/%m/%Y')
+        st.markdown(f"*Período efetivo considerado na comparação: **{actual_start_comp} a {actual_end_comp}***")
+
+    # Cria colunas para exibir as métricas lado a lado
+    num_indices_plot = len(indices_validos_busca)
+    cols_metrics = st.columns(num_indices_plot) if num_indices_plot > 0 else [st] # Fallback se 0
+    idx_col = 0
+
+    for indice_name in indices_validos_busca: # Itera sobre os que retornaram dados
+         if indice_name in indices_df_comp.columns:
+             # Janela efetiva do índice lida no número-índice em cache (uma divisão, sem produto da janela)
+             index_window = indices_df_comp[indice_name].dropna().index
+             with span("comparacao_acumulado"):
+                 inflation = accumulated_inflation_window(
+                     INDICES_IDS[indice_name], index_window[0], index_window[-1]
+                 ) if len(index_window) else None
+             if inflation is not None:
+                 accumulated_inflation_comp[indice_name] = inflation # Guarda o resultado
+                 # Seleciona a coluna para exibir a métrica
+                 current_col = cols_metrics[idx_col % num_indices_plot] if num_indices_plot > 0 else st
+                 with current_col:
+                     st.metric(label=f"{indice_name} (Acum.)", value=f"{inflation:.2f}%")
+                 final_valid_indices_comp.append(indice_name) # Adiciona à lista final
+                 idx_col += 1
+             else:
+                  print(f"Comparação: Não foi possível calcular acumulado para {indice_name}.")
+
+    # Se nenhum acumulado pôde ser calculado
+    if not final_valid_indices_comp:
+        st.error("Não foi possível calcular a inflação acumulada para nenhum dos índices selecionados neste período.")
+        return
+
+    # Expander para mostrar os dados brutos mensais usados na comparação
+    with st.expander("Ver dados mensais brutos (%) usados na Comparação Acumulada"):
+        with span("render_tabela_comparacao"):
+            st.dataframe(indices_df_comp[indices_validos_busca].style.format("{:.2f}", na_rep="-"))
+
+    # Análise Combinada (Médias e Mínimos) - Somente se houver 2 ou mais índices com resultado
+    if len(final_valid_indices_comp) >= 2:
+        st.subheader("Análise Combinada da Comparação")
+        mean_results_list = []
+        min_results_list = []
+
+        # Gera combinações de 2 até N índices
+        for r in range(2, len(final_valid_indices_comp) + 1):
+            for combination in combinations(final_valid_indices_comp, r):
+                indices_list = list(combination)
+                indices_str = ", ".join(indices_list) # Para exibição
+
+                # Cálculo da Média
+                try:
+                    # Garante que todos os índices da combinação têm um valor calculado
+                    if all(indice in accumulated_inflation_comp for indice in indices_list):
+                        mean_inflation = sum(accumulated_inflation_comp[indice] for indice in indices_list) / len(indices_list)
+                        mean_results_list.append(f"Média acumulada para ({indices_str}): **{mean_inflation:.2f}%**")
+                    else:
+                        mean_results_list.append(f"Média acumulada para ({indices_str}): Erro (Dados ausentes para um ou mais índices)")
+                except Exception as e:
+                    mean_results_list.append(f"Média acumulada para ({indices_str}): Erro ({type(e).__name__})")
+
+                # Cálculo do Mínimo
+                try:
+                     # Filtra apenas os valores válidos (não None) para a combinação atual
+                     valid_values = {k: v for k, v in accumulated_inflation_comp.items() if k in indices_list and v is not None}
+                     if not valid_values: # Se não houver valores válidos
+                         min_results_list.append(f"Menor acumulada entre ({indices_str}): N/A (nenhum valor válido)")
+                         continue
+                     # Encontra o menor valor e o nome do índice correspondente
+                     min_inflation_val = min(valid_values.values())
+                     min_index_name = min(valid_values, key=valid_values.get) # Encontra a chave (nome) com o menor valor
+                     min_results_list.append(f"Menor acumulada entre ({indices_str}): **{min_inflation_val:.2f}%** ({min_index_name})")
+                except Exception as e:
+                     min_results_list.append(f"Menor acumulada entre ({indices_str}): Erro ({type(e).__name__})")
+
+        # Exibe os resultados das médias e mínimos
+        st.markdown("--- **Médias entre Índices** ---")
+        st.markdown("\n".join(mean_results_list)) # Usa markdown para negrito
+        st.markdown("--- **Menor Índice em Comparação** ---")
+        st.markdown("\n".join(min_results_list))
 
-# --- Seção do Gráfico Histórico COMPARATIVO (Acumulado 12 Meses) ---
-st.divider()
-st.header("📜 Histórico Comparativo de Índices")
-st.markdown("Visualize e compare a inflação **acumulada em 12 meses** para múltiplos índices ao longo do tempo.")
-
-historical_indices_options = list(INDICES_IDS.keys())
-selected_historical_indices = st.multiselect(
-    "Escolha o(s) índice(s) para ver o histórico:",
-    options=historical_indices_options,
-    default=historical_indices_options[:1], # Default: apenas o primeiro índice
-    key="hist_indices_multiselect"
-)
 
-if selected_historical_indices:
-    # Opções de período para o gráfico histórico
-    historical_range_options = {
-        "Últimos 3 Meses": 3, "Últimos 6 Meses": 6, "Último Ano": 12,
-        "Últimos 3 Anos": 36, "Últimos 5 Anos": 60, #"Tudo (desde 1995 aprox.)": 350
-    }
-    selected_range_label = st.radio(
-        "Selecione o período para visualizar o gráfico:",
-        options=list(historical_range_options.keys()),
-        horizontal=True,
-        index=2, # Default: Último Ano
-        key="hist_range_radio"
+# --- Seção do Gráfico Histórico COMPARATIVO (Acumulado 12 Meses) ---
+@st.fragment
+@span("secao_historico") # Medido também quando o fragmento reexecuta sozinho
+def history_section():
+    """Histórico do acumulado 12m dos índices escolhidos (reexecuta sozinho ao trocar índices ou período)."""
+    st.header("📜 Histórico Comparativo de Índices")
+    st.markdown("Visualize e compare a inflação **acumulada em 12 meses** para múltiplos índices ao longo do tempo.")
+
+    historical_indices_options = list(INDICES_IDS.keys())
+    selected_historical_indices = st.multiselect(
+        "Escolha o(s) índice(s) para ver o histórico:",
+        options=historical_indices_options,
+        default=historical_indices_options[:1], # Default: apenas o primeiro índice
+        key="hist_indices_multiselect"
     )
-    months_in_range = historical_range_options[selected_range_label]
-
-    # Determina a data inicial para buscar dados (precisa de 11 meses extras para o cálculo rolling)
-    MONTHS_TO_FETCH_FOR_ROLLING = months_in_range + 11 # Busca dados suficientes para a janela móvel
-    today_hist = date.today()
-    # Define uma data inicial segura para a busca (evita buscar décadas desnecessariamente)
-    # Usa uma data fixa mínima se o período for muito longo ou "Tudo"
-    min_hist_date = date(1994, 7, 1) # Pouco antes do Plano Real
-    start_date_fetch = max(today_hist - timedelta(days=MONTHS_TO_FETCH_FOR_ROLLING * 31), min_hist_date) # Pega a data mais recente
-
-    historical_rolling_dfs = {} # Dicionário para armazenar os DataFrames com acumulado 12m calculado
-    valid_hist_indices = [] # Nomes dos índices com histórico calculado
-
-    with st.spinner(f"Buscando e calculando histórico acumulado 12m para {len(selected_historical_indices)} índice(s)..."):
-        for index_name in selected_historical_indices:
-            if index_name in INDICES_IDS:
-                codigo_sgs_hist = INDICES_IDS[index_name]
-                # Busca os dados MENSAIS para o período estendido
-                historical_df_monthly = get_bcb_data(codigo_sgs=codigo_sgs_hist, start_date=start_date_fetch, end_date=today_hist)
-
-                if historical_df_monthly is not None and not historical_df_monthly.empty:
-                    col_name_monthly = f'sgs_{codigo_sgs_hist}'
-                    if col_name_monthly not in historical_df_monthly.columns:
-                         print(f"Histórico: Coluna {col_name_monthly} não encontrada para {index_name} após busca.")
-                         continue # Pula para o próximo índice se a coluna esperada não existir
-
-                    # Renomeia coluna e garante índice Datetime
-                    historical_df_monthly = historical_df_monthly.rename(columns={col_name_monthly: index_name})
-                    historical_df_monthly.index = pd.to_datetime(historical_df_monthly.index)
-
-                    window_size = 12 # Janela para acumulado 12 meses
-                    rolling_accum_col_name = f"{index_name}_Acum12M" # Nome da nova coluna
-
-                    # Calcula o acumulado 12 meses usando rolling().apply()
-                    # raw=False é importante para passar a série correta para a função
-                    historical_df_monthly[rolling_accum_col_name] = historical_df_monthly[index_name].rolling(
-                        window=window_size,
-                        min_periods=window_size # Garante que só calcula com 12 períodos completos
-                    ).apply(calculate_rolling_12m_accumulation, raw=False)
-
-                    # Seleciona apenas a coluna calculada e remove NaNs (gerados no início do rolling)
-                    df_to_store = historical_df_monthly[[rolling_accum_col_name]].dropna()
-
-                    if not df_to_store.empty:
-                        historical_rolling_dfs[index_name] = df_to_store
-                        valid_hist_indices.append(index_name)
-                    else:
-                        print(f"Histórico: DataFrame acumulado 12m vazio para {index_name} após cálculo/dropna.")
-                else:
-                     print(f"Histórico: Nenhum dado mensal encontrado para {index_name} no período de busca.")
-            else:
-                 st.warning(f"Índice histórico '{index_name}' não reconhecido.")
 
-    # Se nenhum histórico pôde ser calculado
-    if not valid_hist_indices:
-        st.error("Não foi possível calcular o histórico acumulado em 12 meses para nenhum dos índices selecionados.")
-        st.stop()
+    if selected_historical_indices:
+        # Opções de período para o gráfico histórico
+        historical_range_options = {
+            "Últimos 3 Meses": 3, "Últimos 6 Meses": 6, "Último Ano": 12,
+            "Últimos 3 Anos": 36, "Últimos 5 Anos": 60, "Tudo (desde 1995 aprox.)": None
+        }
+        selected_range_label = st.radio(
+            "Selecione o período para visualizar o gráfico:",
+            options=list(historical_range_options.keys()),
+            horizontal=True,
+            index=2, # Default: Último Ano
+            key="hist_range_radio"
+        )
+        months_in_range = historical_range_options[selected_range_label]
+
+        today_hist = date.today()
+        valid_hist_indices = [] # Nomes dos índices com histórico calculado
+        combined_rolling_df = None
+
+        with st.spinner(f"Buscando e calculando histórico acumulado 12m para {len(selected_historical_indices)} índice(s)..."):
+            for index_name in selected_historical_indices:
+                if index_name not in INDICES_IDS:
+                     st.warning(f"Índice histórico '{index_name}' não reconhecido.")
+            # Acumulado 12m do histórico completo, em cache até chegar um mês novo;
+            # trocar o período exibido é só um recorte
+            with span("historico_acumulado_12m"):
+                historical_rolling_df, hist_errors = get_rolling_12m_table(
+                    [name for name in selected_historical_indices if name in INDICES_IDS]
+                )
+            for error_msg in hist_errors:
+                st.error(error_msg)
 
-    # Combina os DataFrames de acumulado 12m (um por índice)
-    combined_rolling_df = None
-    try:
-        if historical_rolling_dfs:
-            # Concatena usando as colunas calculadas (e nomes dos índices)
-            combined_rolling_df = pd.concat(historical_rolling_dfs.values(), axis=1)
-            # Renomeia as colunas para os nomes dos índices (sem o sufixo _Acum12M) para o gráfico
-            rename_map = {f"{name}_Acum12M": name for name in valid_hist_indices}
-            combined_rolling_df.rename(columns=rename_map, inplace=True)
-            combined_rolling_df = combined_rolling_df.sort_index() # Garante ordem cronológica
+            for index_name in historical_rolling_df.names:
+                if pd.notna(historical_rolling_df.column(index_name)).any():
+                    valid_hist_indices.append(index_name)
+                else:
+                    print(f"Histórico: DataFrame acumulado 12m vazio para {index_name} após cálculo/dropna.")
+
+            if valid_hist_indices:
+                # Remove as linhas iniciais sem janela completa de 12 meses
+                combined_rolling_df = historical_rolling_df.select(valid_hist_indices).to_frame().dropna(how='all')
+
+        # Se nenhum histórico pôde ser calculado
+        if not valid_hist_indices:
+            st.error("Não foi possível calcular o histórico acumulado em 12 meses para nenhum dos índices selecionados.")
+            return
+
+        # Se a combinação falhar
+        if combined_rolling_df is None or combined_rolling_df.empty:
+            st.error("Falha ao criar DataFrame combinado histórico ou resultado vazio.")
+            return
+
+        # Filtra o DataFrame combinado para o período de VISUALIZAÇÃO selecionado pelo usuário
+        end_date_display = today_hist
+        if months_in_range is None: # Tudo: desde o primeiro acumulado 12m disponível
+            start_date_display = combined_rolling_df.index.min()
+        else:
+            # Calcula a data de início da visualização baseada nos meses selecionados
+            start_date_display = end_date_display - pd.DateOffset(months=months_in_range)
+            # Garante que não tenta exibir antes da data mínima disponível no DF combinado
+            start_date_display = max(pd.to_datetime(start_date_display), combined_rolling_df.index.min())
+
+
+        # Filtra o DataFrame para o período de exibição
+        combined_rolling_df_display = combined_rolling_df[
+            (combined_rolling_df.index >= pd.to_datetime(start_date_display)) &
+            (combined_rolling_df.index <= pd.to_datetime(end_date_display))
+        ].copy() # .copy() para evitar SettingWithCopyWarning
+
+        # Remove linhas que só contenham NaN no período de exibição
+        combined_rolling_df_display.dropna(axis=0, how='all', inplace=True)
+
+        # Exibe o gráfico e dados se houver algo para mostrar
+        if not combined_rolling_df_display.empty:
+            actual_start_display = combined_rolling_df_display.index.min().strftime('%m/%Y')
+            actual_end_display = combined_rolling_df_display.index.max().strftime('%m/%Y')
+            st.markdown(f"**Médias do Acum. 12M no Período Selecionado ({actual_start_display} a {actual_end_display}):**")
+
+            # Exibe métricas da média do acumulado 12m no período visualizado
+            cols_hist_metrics = st.columns(len(valid_hist_indices)) if len(valid_hist_indices) > 0 else [st]
+            idx_hist_col = 0
+            for index_name in valid_hist_indices: # Itera sobre os índices que têm dados
+                if index_name in combined_rolling_df_display.columns:
+                    # Calcula a média da coluna (que representa o acum. 12m)
+                    average_val = combined_rolling_df_display[index_name].mean()
+                    if pd.notna(average_val):
+                        current_col = cols_hist_metrics[idx_hist_col % len(valid_hist_indices)] if len(valid_hist_indices)>0 else st
+                        with current_col:
+                             help_text = f"Média da inflação acumulada em 12 meses de {index_name} entre {actual_start_display} e {actual_end_display}."
+                             st.metric(label=f"{index_name}", value=f"{average_val:.2f}%", help=help_text)
+                        idx_hist_col += 1
+
+            # Plota o gráfico de linhas
+            with span("render_grafico_historico"):
+                st.line_chart(combined_rolling_df_display)
+
+            # Expander para mostrar os dados do gráfico
+            with st.expander("Ver dados do gráfico (Inflação Acumulada 12 Meses %)"), span("render_tabela_historico"):
+                st.dataframe(combined_rolling_df_display.style.format("{:.2f}", na_rep="-"))
         else:
-            st.warning("Nenhum DataFrame histórico válido para concatenar após cálculos.")
-            st.stop()
-    except Exception as e:
-        st.error(f"Erro ao combinar dados históricos acumulados: {e}")
-        st.stop()
-
-    # Se a combinação falhar
-    if combined_rolling_df is None or combined_rolling_df.empty:
-        st.error("Falha ao criar DataFrame combinado histórico ou resultado vazio.")
-        st.stop()
-
-    # Filtra o DataFrame combinado para o período de VISUALIZAÇÃO selecionado pelo usuário
-    end_date_display = today_hist
-    # Calcula a data de início da visualização baseada nos meses selecionados
-    start_date_display = end_date_display - pd.DateOffset(months=months_in_range)
-    # Garante que não tenta exibir antes da data mínima disponível no DF combinado
-    start_date_display = max(pd.to_datetime(start_date_display), combined_rolling_df.index.min())
-
-
-    # Filtra o DataFrame para o período de exibição
-    combined_rolling_df_display = combined_rolling_df[
-        (combined_rolling_df.index >= pd.to_datetime(start_date_display)) &
-        (combined_rolling_df.index <= pd.to_datetime(end_date_display))
-    ].copy() # .copy() para evitar SettingWithCopyWarning
-
-    # Remove linhas que só contenham NaN no período de exibição
-    combined_rolling_df_display.dropna(axis=0, how='all', inplace=True)
-
-    # Exibe o gráfico e dados se houver algo para mostrar
-    if not combined_rolling_df_display.empty:
-        actual_start_display = combined_rolling_df_display.index.min().strftime('%m/%Y')
-        actual_end_display = combined_rolling_df_display.index.max().strftime('%m/%Y')
-        st.markdown(f"**Médias do Acum. 12M no Período Selecionado ({actual_start_display} a {actual_end_display}):**")
-
-        # Exibe métricas da média do acumulado 12m no período visualizado
-        cols_hist_metrics = st.columns(len(valid_hist_indices)) if len(valid_hist_indices) > 0 else [st]
-        idx_hist_col = 0
-        for index_name in valid_hist_indices: # Itera sobre os índices que têm dados
-            if index_name in combined_rolling_df_display.columns:
-                # Calcula a média da coluna (que representa o acum. 12m)
-                average_val = combined_rolling_df_display[index_name].mean()
-                if pd.notna(average_val):
-                    current_col = cols_hist_metrics[idx_hist_col % len(valid_hist_indices)] if len(valid_hist_indices)>0 else st
-                    with current_col:
-                         help_text = f"Média da inflação acumulada em 12 meses de {index_name} entre {actual_start_display} e {actual_end_display}."
-                         st.metric(label=f"{index_name}", value=f"{average_val:.2f}%", help=help_text)
-                    idx_hist_col += 1
-
-        # Plota o gráfico de linhas
-        st.line_chart(combined_rolling_df_display)
-
-        # Expander para mostrar os dados do gráfico
-        with st.expander("Ver dados do gráfico (Inflação Acumulada 12 Meses %)"):
-            st.dataframe(combined_rolling_df_display.style.format("{:.2f}", na_rep="-"))
+            # Mensagem se não houver dados no período de visualização selecionado
+            st.info(f"Não há dados de inflação acumulada em 12 meses para os índices selecionados no período ({selected_range_label}) após o cálculo.")
     else:
-        # Mensagem se não houver dados no período de visualização selecionado
-        st.info(f"Não há dados de inflação acumulada em 12 meses para os índices selecionados no período ({selected_range_label}) após o cálculo.")
-else:
-    # Mensagem se nenhum índice for selecionado para o histórico
-    st.info("👆 Selecione um ou mais índices acima para visualizar o histórico comparativo.")
+        # Mensagem se nenhum índice for selecionado para o histórico
+        st.info("👆 Selecione um ou mais índices acima para visualizar o histórico comparativo.")
 
 
 # --- Seção de Cálculo de Reajuste de Aluguel ---
-st.divider()
-st.header("💸 Calculadora de Reajuste de Aluguel")
-st.markdown("Simule o reajuste do seu aluguel com base em diferentes índices (individuais, média ou mínimo de combinações).")
-
-# --- Inputs para o Cálculo do Aluguel ---
-rent_col1, rent_col2 = st.columns(2)
-with rent_col1:
-    initial_rent = st.number_input(
-        "Valor Inicial do Aluguel (R$):",
-        min_value=0.01, value=1000.0, step=100.0, format="%.2f",
-        key="rent_initial_value"
-    )
-    # Data de início: Pelo menos 1 mês atrás
-    contract_start_date = st.date_input(
-        "Data de Início do Contrato:",
-        value=date.today() - timedelta(days=365*2), # Default 2 anos atrás
-        max_value=date.today() - timedelta(days=31), # Máximo 1 mês atrás
-        help="A data que define o mês de aniversário do reajuste.",
-        key="rent_start_date"
-    )
-with rent_col2:
-    # Opção para selecionar o índice REALMENTE usado no contrato
-    rent_index_options = ["Selecione o índice..."] + list(INDICES_IDS.keys())
-    actual_rent_index = st.selectbox(
-        "Índice Aplicado no Contrato Real:",
-        options=rent_index_options,
-        index=0, # Default "Selecione..."
-        help="Qual índice consta no seu contrato para reajuste anual?",
-        key="rent_actual_index"
-    )
-    # Data final: Pelo menos 1 mês depois do início
-    contract_end_date = st.date_input(
-        "Data Final do Contrato (ou data desejada para simulação):",
-        value=date.today(), # Default hoje
-        min_value=contract_start_date + timedelta(days=30),
-        max_value=date.today() + timedelta(days=365*10), # Limite futuro
-        key="rent_end_date"
-    )
+@st.fragment
+@span("secao_aluguel")
+def rent_section():
+    """Calculadora de reajuste de aluguel (reexecuta sozinha ao alterar os dados do contrato)."""
+    st.header("💸 Calculadora de Reajuste de Aluguel")
+    st.markdown("Simule o reajuste do seu aluguel com base em diferentes índices (individuais, média ou mínimo de combinações).")
+
+    # --- Inputs para o Cálculo do Aluguel ---
+    rent_col1, rent_col2 = st.columns(2)
+    with rent_col1:
+        initial_rent = st.number_input(
+            "Valor Inicial do Aluguel (R$):",
+            min_value=0.01, value=1000.0, step=100.0, format="%.2f",
+            key="rent_initial_value"
+        )
+        # Data de início: Pelo menos 1 mês atrás
+        contract_start_date = st.date_input(
+            "Data de Início do Contrato:",
+            value=date.today() - timedelta(days=365*2), # Default 2 anos atrás
+            max_value=date.today() - timedelta(days=31), # Máximo 1 mês atrás
+            help="A data que define o mês de aniversário do reajuste.",
+            key="rent_start_date"
+        )
+    with rent_col2:
+        # Opção para selecionar o índice REALMENTE usado no contrato
+        rent_index_options = ["Selecione o índice..."] + list(INDICES_IDS.keys())
+        actual_rent_index = st.selectbox(
+            "Índice Aplicado no Contrato Real:",
+            options=rent_index_options,
+            index=0, # Default "Selecione..."
+            help="Qual índice consta no seu contrato para reajuste anual?",
+            key="rent_actual_index"
+        )
+        # Data final: Pelo menos 1 mês depois do início
+        contract_end_date = st.date_input(
+            "Data Final do Contrato (ou data desejada para simulação):",
+            value=date.today(), # Default hoje
+            min_value=contract_start_date + timedelta(days=30),
+            max_value=date.today() + timedelta(days=365*10), # Limite futuro
+            key="rent_end_date"
+        )
 
-# Botão para iniciar o cálculo
-calculate_button = st.button("Calcular Reajuste e Comparar Cenários", key="rent_calculate_btn")
+    search_best_rules = st.checkbox(
+        "Buscar a melhor regra entre todos os subconjuntos de índices (busca exata)",
+        value=False,
+        help="Média, mínimo, mediana e média aparada de qualquer combinação de índices, além dos cenários acima.",
+        key="rent_best_rule_search"
+    )
 
-# --- Lógica do Cálculo (Executa ao clicar no botão e se índice real foi selecionado) ---
-if calculate_button and actual_rent_index != "Selecione o índice...":
+    # Botão para iniciar o cálculo
+    calculate_button = st.button("Calcular Reajuste e Comparar Cenários", key="rent_calculate_btn")
 
-    # 1. Determinar período de busca e buscar dados MENSAIS para TODOS os índices base
-    # Busca desde 12 meses ANTES do início do contrato para ter dados pro 1º reajuste
-    fetch_start_date = pd.to_datetime(contract_start_date) - pd.DateOffset(months=12)
-    fetch_end_date = pd.to_datetime(contract_end_date) # Usa a data final fornecida
+    # --- Lógica do Cálculo (Executa ao clicar no botão e se índice real foi selecionado) ---
+    if calculate_button and actual_rent_index != "Selecione o índice...":
 
-    all_base_indices = list(INDICES_IDS.keys()) # Lista de todos os índices disponíveis
-    monthly_data_all_indices = {} # Dicionário para guardar DFs mensais
-    failed_indices_fetch = [] # Guarda nomes dos que falharam na busca
+        # 1. Acumulado 12 meses de TODOS os índices base, pré-calculado sobre o histórico
+        # completo e mantido em cache (evita recalcular o rolling a cada simulação)
+        all_base_indices = list(INDICES_IDS.keys()) # Lista de todos os índices disponíveis
 
-    with st.spinner(f"Buscando dados mensais ({fetch_start_date.strftime('%m/%Y')} a {fetch_end_date.strftime('%m/%Y')})..."):
-        for index_name in all_base_indices:
-            codigo_sgs = INDICES_IDS[index_name]
-            # Busca os dados mensais
-            df_monthly = get_bcb_data(codigo_sgs=codigo_sgs, start_date=fetch_start_date.date(), end_date=fetch_end_date.date())
+        with st.spinner("Buscando dados mensais e calculando acumulado 12 meses dos índices base..."), span("aluguel_acumulado_12m"):
+            rolling_12m_all_indices, rent_errors = get_rolling_12m_table(all_base_indices)
+        for error_msg in rent_errors:
+            st.error(error_msg)
 
-            if df_monthly is not None and not df_monthly.empty:
-                col_name_sgs = f'sgs_{codigo_sgs}'
-                if col_name_sgs in df_monthly.columns:
-                    df_monthly = df_monthly.rename(columns={col_name_sgs: index_name})
-                    monthly_data_all_indices[index_name] = df_monthly[[index_name]] # Guarda só a coluna do índice
-                else:
-                    failed_indices_fetch.append(index_name) # Falha se coluna não encontrada
-            else:
-                failed_indices_fetch.append(index_name) # Falha se não retornou dados
-
-    # Verifica se o índice REAL do contrato foi obtido
-    if actual_rent_index not in monthly_data_all_indices:
-        st.error(f"Dados históricos mensais ausentes para o índice base do contrato ({actual_rent_index}). Não é possível continuar.")
-        st.stop()
-
-    # Avisa sobre outros índices que falharam (para a comparação)
-    if failed_indices_fetch:
-        st.warning(f"Não foi possível obter dados mensais para comparar com: {', '.join(failed_indices_fetch)}")
-
-    valid_base_indices = list(monthly_data_all_indices.keys()) # Índices que tiveram dados mensais obtidos
-
-    # 2. PRÉ-CALCULAR Acumulado 12 Meses para TODOS os índices base válidos
-    # Isso evita recalcular o rolling para cada cenário de simulação
-    rolling_12m_all_indices = {} # Dicionário para guardar as séries Acum12m pré-calculadas
-
-    with st.spinner("Calculando acumulado 12 meses para índices base..."):
-        for index_name in valid_base_indices:
-            df_monthly = monthly_data_all_indices[index_name] # Pega o DF mensal
-            rolling_accum_col = f"{index_name}_Acum12M" # Nome da coluna de acumulado
-
-            df_monthly.index = pd.to_datetime(df_monthly.index) # Garante DatetimeIndex
-            # Calcula o rolling e guarda na coluna nova
-            df_monthly[rolling_accum_col] = df_monthly[index_name].rolling(
-                window=12, min_periods=12
-            ).apply(calculate_rolling_12m_accumulation, raw=False)
-
-            # Guarda SOMENTE a série de acumulado 12m (sem NaNs iniciais) no dicionário
-            rolling_12m_all_indices[index_name] = df_monthly[[rolling_accum_col]].dropna()
-
-    # 3. Função para Simular Pagamentos (aceita nomes de índices base, média ou mínimo)
-    def simulate_rent_payments_v3(start_rent, start_date, end_date, simulation_index_name, precalculated_rolling_data):
-        """Simula pagamentos de aluguel mês a mês, aplicando reajuste anual."""
-        payment_history = []
-        current_rent = start_rent
-        total_paid = 0.0
-        # Gera o range de meses do contrato
-        date_range = pd.date_range(start=start_date, end=end_date, freq='MS') # MS = Month Start
-
-        base_indices_in_sim = []
-        sim_type = "base" # Tipo de simulação: 'base', 'media', 'minimo'
-
-        # --- Identifica o tipo de simulação e os índices base envolvidos ---
-        if simulation_index_name.startswith("Média (") and simulation_index_name.endswith(")"):
-            sim_type = "media"
-            # Extrai os nomes dos índices da string (ex: "Média (IGP-M, IPCA)")
-            try: base_indices_in_sim = [idx.strip() for idx in re.findall(r'\((.*?)\)', simulation_index_name)[0].split(',')]
-            except IndexError: return None, 0, f"Formato inválido para Média: {simulation_index_name}"
-        elif simulation_index_name.startswith("Mínimo (") and simulation_index_name.endswith(")"):
-            sim_type = "minimo"
-            try: base_indices_in_sim = [idx.strip() for idx in re.findall(r'\((.*?)\)', simulation_index_name)[0].split(',')]
-            except IndexError: return None, 0, f"Formato inválido para Mínimo: {simulation_index_name}"
-        elif simulation_index_name in precalculated_rolling_data:
-            sim_type = "base"
-            base_indices_in_sim = [simulation_index_name]
-        else:
-            # Se o nome não corresponde a nenhum formato conhecido ou índice base
-            return None, 0, f"Índice/Cenário '{simulation_index_name}' inválido ou sem dados pré-calculados."
-
-        # Verifica se temos os dados pré-calculados para TODOS os índices base necessários
-        missing_data = [idx for idx in base_indices_in_sim if idx not in precalculated_rolling_data]
-        if missing_data:
-            return None, 0, f"Dados acumulados 12m ausentes para simular com: {', '.join(missing_data)}"
-        #-------------------------------------------------------------------------
-
-        # Itera sobre cada mês do contrato
-        for current_month_start in date_range:
-            adjustment_perc = pd.NA # Percentual de reajuste aplicado (NA se não for mês de reajuste)
-            adjusted_value = 0.0 # Valor do reajuste (0 se não houver)
-
-            # Verifica se é mês de aniversário do contrato (e não o primeiro mês)
-            if current_month_start.month == pd.Timestamp(start_date).month and current_month_start > pd.Timestamp(start_date):
-
-                # A data do índice para reajuste é o mês ANTERIOR ao mês do reajuste
-                adjustment_index_date = current_month_start - pd.DateOffset(months=1)
-                # Converte para Period('M') para buscar no índice pré-calculado
-                adjustment_month_period = adjustment_index_date.to_period('M')
-
-                accum_values_for_month = [] # Guarda os valores acumulados 12m dos índices base
-                indices_found_for_month = True # Flag para verificar se todos foram encontrados
-
-                # Busca o valor acumulado 12m para cada índice base necessário
-                for base_idx in base_indices_in_sim:
-                    rolling_col = f"{base_idx}_Acum12M" # Nome da coluna pré-calculada
-                    try:
-                        # Busca o valor no DataFrame pré-calculado correspondente ao mês/ano
-                        val = precalculated_rolling_data[base_idx].loc[precalculated_rolling_data[base_idx].index.to_period('M') == adjustment_month_period, rolling_col].iloc[0]
-                        if pd.notna(val):
-                            accum_values_for_month.append(val)
-                        else:
-                            # Se UM valor for NA, não podemos calcular média/mínimo confiavelmente
-                            indices_found_for_month = False; break
-                    except IndexError:
-                        # Mês/Ano não encontrado nos dados pré-calculados (raro, mas possível)
-                        print(f"Simulação {simulation_index_name}: Índice {base_idx} não encontrado para {adjustment_month_period}")
-                        indices_found_for_month = False; break
-                    except Exception as e:
-                         print(f"Simulação {simulation_index_name}: Erro buscando {base_idx} em {adjustment_month_period}: {e}")
-                         indices_found_for_month = False; break
-
-                # Se todos os valores necessários foram encontrados com sucesso
-                if indices_found_for_month and accum_values_for_month:
-                    # Aplica a lógica baseada no tipo de simulação
-                    if sim_type == "base":
-                        adjustment_perc = accum_values_for_month[0] # Pega o único valor
-                    elif sim_type == "media":
-                        adjustment_perc = sum(accum_values_for_month) / len(accum_values_for_month)
-                    elif sim_type == "minimo":
-                        adjustment_perc = min(accum_values_for_month)
-
-                    # Se o percentual foi calculado (não é NA)
-                    if pd.notna(adjustment_perc):
-                        new_rent = current_rent * (1 + adjustment_perc / 100)
-                        adjusted_value = new_rent - current_rent # Calcula a diferença
-                        current_rent = new_rent # Atualiza o aluguel para os próximos meses
-                    else:
-                        # Caso onde o cálculo da média/min resultou em NA (pode acontecer?)
-                         adjustment_perc = pd.NA # Garante que fica NA
-                         print(f"Simulação {simulation_index_name}: Cálculo de ajuste resultou em NA para {current_month_start.strftime('%m/%Y')}")
+        valid_base_indices = [name for name in all_base_indices if name in rolling_12m_all_indices]
+        failed_indices_fetch = [name for name in all_base_indices if name not in valid_base_indices]
 
+        # Verifica se o índice REAL do contrato foi obtido
+        if actual_rent_index not in valid_base_indices:
+            st.error(f"Dados históricos mensais ausentes para o índice base do contrato ({actual_rent_index}). Não é possível continuar.")
+            return
 
-            # Adiciona o registro do mês ao histórico
-            payment_history.append({
-                "Mês/Ano": current_month_start.strftime("%m/%Y"),
-                "Índice Mês Reajuste (%)": adjustment_perc if pd.notna(adjustment_perc) else None, # Só mostra se houve reajuste
-                "Valor Reajuste (R$)": adjusted_value if adjusted_value != 0 else None,
-                "Aluguel Pago (R$)": current_rent
-            })
-            total_paid += current_rent # Acumula o total pago
+        # Avisa sobre outros índices que falharam (para a comparação)
+        if failed_indices_fetch:
+            st.warning(f"Não foi possível obter dados mensais para comparar com: {', '.join(failed_indices_fetch)}")
 
-        # Cria o DataFrame do histórico
-        history_df = pd.DataFrame(payment_history)
-        return history_df, total_paid, None # Retorna DF, Total e None (sem erro)
+        # 2. Simular o Contrato Real (usando o índice selecionado pelo usuário)
+        st.subheader(f"Simulação do Contrato Real (Índice: {actual_rent_index})")
+        with span("aluguel_simulacao_real"):
+            actual_history_df, actual_total_paid, error_msg = simulate_rent_payments_v3(
+                initial_rent, contract_start_date, contract_end_date,
+                RentScenario("base", (actual_rent_index,)), rolling_12m_all_indices
+            )
 
+        # Se houve erro na simulação real, para aqui
+        if error_msg:
+            st.error(f"Erro crítico ao simular o contrato real: {error_msg}")
+            return
+
+        # Exibe o histórico e o total pago do contrato real
+        if actual_history_df is not None:
+            with span("render_tabela_contrato"):
+                st.dataframe(
+                    actual_history_df.style.format({
+                        "Índice Mês Reajuste (%)": "{:.2f}%",
+                        "Valor Reajuste (R$)": "R$ {:,.2f}",
+                        "Aluguel Pago (R$)": "R$ {:,.2f}",
+                    }, na_rep="-").hide(axis="index") # Esconde o índice do DF
+                )
+            st.metric(label=f"Total Pago Estimado com {actual_rent_index} (R$)", value=f"{actual_total_paid:,.2f}")
+        else:
+            st.error("Não foi possível gerar o histórico de pagamentos para o contrato real.")
+            return # Para se a simulação real falhou por algum motivo inesperado
+
+        # Aniversários ainda sem dado: projeção Monte Carlo (bootstrap em blocos do histórico)
+        with st.spinner("Projetando os reajustes futuros..."), span("aluguel_projecao"):
+            monthly_all_indices, _ = load_monthly_series([actual_rent_index]) # Erros já exibidos acima
+            proj_months, proj_rent, proj_total, first_projected = project_rent_scenarios(
+                initial_rent, contract_start_date, contract_end_date,
+                [RentScenario("base", (actual_rent_index,))], monthly_all_indices
+            )
+        if first_projected is not None:
+            st.markdown(
+                f"**Projeção a partir de {ordinal_label(first_projected)}:** sem dados do {actual_rent_index}, "
+                "o total acima não aplica esses reajustes. Faixas de 2.000 cenários sorteados do histórico mensal desde 2000:"
+            )
+            proj_cols = st.columns(len(proj_total))
+            for current_col, label, total in zip(proj_cols, ("Otimista (P5)", "Mediana (P50)", "Pessimista (P95)"), proj_total[:, 0]):
+                with current_col:
+                    st.metric(label=f"Total Pago {label} (R$)", value=f"{total:,.2f}")
+            projection_df = pd.DataFrame(
+                proj_rent[:, 0].T, columns=["P5", "P50", "P95"],
+                index=pd.Index([ordinal_label(month) for month in proj_months], name="Mês")
+            )
+            st.line_chart(projection_df)
 
-    # 4. Simular o Contrato Real (usando o índice selecionado pelo usuário)
-    st.subheader(f"Simulação do Contrato Real (Índice: {actual_rent_index})")
-    actual_history_df, actual_total_paid, error_msg = simulate_rent_payments_v3(
-        initial_rent, contract_start_date, contract_end_date, actual_rent_index, rolling_12m_all_indices
-    )
+        # 3. Gerar Opções Combinadas e Simular Comparações
+        st.subheader("Comparação com Outros Cenários de Reajuste")
+        comparison_results = [] # Lista para guardar os resultados das comparações
 
-    # Se houve erro na simulação real, para aqui
-    if error_msg:
-        st.error(f"Erro crítico ao simular o contrato real: {error_msg}")
-        st.stop()
+        # Índices base (exceto o já usado no contrato real) e Média/Mínimo de todas
+        # as combinações de 2 até N índices, avaliados juntos numa única passada
+        scenarios_to_compare = build_rent_scenarios(valid_base_indices, exclude_base=actual_rent_index)
 
-    # Exibe o histórico e o total pago do contrato real
-    if actual_history_df is not None:
-        st.dataframe(
-            actual_history_df.style.format({
-                "Índice Mês Reajuste (%)": "{:.2f}%",
-                "Valor Reajuste (R$)": "R$ {:,.2f}",
-                "Aluguel Pago (R$)": "R$ {:,.2f}",
-            }, na_rep="-").hide(axis="index") # Esconde o índice do DF
-        )
-        st.metric(label=f"Total Pago Estimado com {actual_rent_index} (R$)", value=f"{actual_total_paid:,.2f}")
-    else:
-        st.error("Não foi possível gerar o histórico de pagamentos para o contrato real.")
-        st.stop() # Para se a simulação real falhou por algum motivo inesperado
-
-    # 5. Gerar Opções Combinadas e Simular Comparações
-    st.subheader("Comparação com Outros Cenários de Reajuste")
-    comparison_results = [] # Lista para guardar os resultados das comparações
-    indices_to_compare_final = [] # Lista de nomes dos cenários a comparar
-
-    # Adiciona os índices base (exceto o já usado no contrato real)
-    indices_to_compare_final.extend([idx for idx in valid_base_indices if idx != actual_rent_index])
-
-    # Gera nomes para cenários de Média e Mínimo (combinações de 2 e 3 índices)
-    # Limita a 3 para não gerar combinações demais
-    max_combo_size = min(len(valid_base_indices), 3)
-    for r in range(2, max_combo_size + 1):
-        for combo in combinations(valid_base_indices, r):
-            combo_str = ", ".join(combo)
-            # Adiciona os nomes formatados à lista de cenários
-            indices_to_compare_final.append(f"Média ({combo_str})")
-            indices_to_compare_final.append(f"Mínimo ({combo_str})")
-
-    # Se houver cenários para comparar
-    if indices_to_compare_final:
-        with st.spinner("Simulando outros cenários de reajuste..."):
-            for sim_index_name in indices_to_compare_final:
-                # Roda a simulação para cada cenário
-                sim_history_df, sim_total_paid, error_msg_sim = simulate_rent_payments_v3(
-                    initial_rent, contract_start_date, contract_end_date, sim_index_name, rolling_12m_all_indices
+        # Se houver cenários para comparar
+        if scenarios_to_compare:
+            with st.spinner(f"Simulando {len(scenarios_to_compare)} outros cenários de reajuste..."), span("aluguel_cenarios"):
+                _, _, _, sim_totals_paid = simulate_rent_scenarios(
+                    initial_rent, contract_start_date, contract_end_date, scenarios_to_compare, rolling_12m_all_indices
                 )
-
-                status = "Calculado"
-                difference = pd.NA # Diferença em relação ao contrato real
-
-                if error_msg_sim:
-                    status = f"Erro: {error_msg_sim}" # Mostra a mensagem de erro específica
-                    sim_total_paid = pd.NA # Define total como NA se houve erro
-                elif sim_total_paid is not None and pd.notna(sim_total_paid):
-                    # Calcula a diferença apenas se a simulação foi bem-sucedida
-                    difference = sim_total_paid - actual_total_paid
-                else:
-                    # Caso de erro inesperado onde não houve mensagem mas total é None/NA
-                    status = "Erro desconhecido na simulação"
-                    sim_total_paid = pd.NA
-
-                # Adiciona o resultado à lista
-                comparison_results.append({
-                    "Cenário Simulado": sim_index_name,
-                    "Total Pago Simulado (R$)": sim_total_paid,
-                    "Diferença vs Contrato (R$)": difference,
-                    "Status": status
-                })
-
-        # Se a lista de resultados não estiver vazia
-        if comparison_results:
-            # Cria o DataFrame de comparação
-            comparison_df = pd.DataFrame(comparison_results)
-            # Ordena pela diferença (menor diferença primeiro), colocando erros no final
-            comparison_df = comparison_df.sort_values(by="Diferença vs Contrato (R$)", ascending=True, na_position='last')
-
-            # Exibe o DataFrame formatado
-            st.dataframe(
-                comparison_df.style.format({
-                    "Total Pago Simulado (R$)": "R$ {:,.2f}",
-                    "Diferença vs Contrato (R$)": "{:+,.2f}" # Sinal de + ou -
-                }, na_rep="-")
-                .applymap( # Colore a diferença: vermelho > 0, verde < 0
-                    lambda x: 'color: red' if isinstance(x, (int, float)) and x > 0 else ('color: green' if isinstance(x, (int, float)) and x < 0 else ''),
-                    subset=['Diferença vs Contrato (R$)']
-                ).hide(axis="index") # Esconde o índice do DF
-            )
+                for scenario, sim_total_paid in zip(scenarios_to_compare, sim_totals_paid):
+                    # Adiciona o resultado à lista
+                    comparison_results.append({
+                        "Cenário Simulado": scenario.label,
+                        "Total Pago Simulado (R$)": sim_total_paid,
+                        "Diferença vs Contrato (R$)": sim_total_paid - actual_total_paid,
+                        "Status": "Calculado"
+                    })
+
+            # Se a lista de resultados não estiver vazia
+            if comparison_results:
+                # Cria o DataFrame de comparação
+                comparison_df = pd.DataFrame(comparison_results)
+                # Ordena pela diferença (menor diferença primeiro), colocando erros no final
+                comparison_df = comparison_df.sort_values(by="Diferença vs Contrato (R$)", ascending=True, na_position='last')
+
+                # Exibe o DataFrame formatado
+                with span("render_tabela_cenarios"):
+                    st.dataframe(
+                        comparison_df.style.format({
+                            "Total Pago Simulado (R$)": "R$ {:,.2f}",
+                            "Diferença vs Contrato (R$)": "{:+,.2f}" # Sinal de + ou -
+                        }, na_rep="-")
+                        .applymap( # Colore a diferença: vermelho > 0, verde < 0
+                            lambda x: 'color: red' if isinstance(x, (int, float)) and x > 0 else ('color: green' if isinstance(x, (int, float)) and x < 0 else ''),
+                            subset=['Diferença vs Contrato (R$)']
+                        ).hide(axis="index") # Esconde o índice do DF
+                    )
+            else:
+                st.info("Não foi possível calcular nenhum cenário de comparação.")
         else:
-            st.info("Não foi possível calcular nenhum cenário de comparação.")
-    else:
-        st.info("Não há outros índices com dados disponíveis para gerar cenários de comparação.")
-
-# --- Fim da Seção de Cálculo de Reajuste de Aluguel ---
+            st.info("Não há outros índices com dados disponíveis para gerar cenários de comparação.")
+
+        # 4. Busca exata da melhor regra (todos os subconjuntos e agregações, com poda)
+        if search_best_rules:
+            st.subheader("Melhor Regra de Reajuste (Busca Exata)")
+            # Referência do objetivo 'justo': total pago corrigido pela inflação oficial (IPCA)
+            fair_reference = "IPCA" if "IPCA" in valid_base_indices else actual_rent_index
+            with st.spinner("Buscando a melhor regra entre todos os subconjuntos de índices..."), span("aluguel_busca_regra"):
+                _, _, _, reference_totals = simulate_rent_scenarios(
+                    initial_rent, contract_start_date, contract_end_date,
+                    [RentScenario("base", (fair_reference,))], rolling_12m_all_indices
+                )
+                cheapest, excluded = find_best_rules(
+                    initial_rent, contract_start_date, contract_end_date, rolling_12m_all_indices,
+                    index_names=valid_base_indices, objective="barato", max_nodes=RULE_SEARCH_MAX_NODES
+                )
+                # Sem o próprio índice de referência, que seria sempre a resposta exata
+                fairest, _ = find_best_rules(
+                    initial_rent, contract_start_date, contract_end_date, rolling_12m_all_indices,
+                    index_names=[name for name in valid_base_indices if name != fair_reference],
+                    objective="justo", target_total=float(reference_totals[0]), tolerance=FAIR_RULE_TOLERANCE,
+                    max_nodes=RULE_SEARCH_MAX_NODES
+                )
+            if excluded:
+                st.warning(f"Fora da busca por falta de acumulado 12m em algum aniversário: {', '.join(excluded)}")
+            if not all(result["completa"] for result in cheapest + fairest):
+                st.warning(
+                    f"Busca interrompida após {RULE_SEARCH_MAX_NODES:,} subconjuntos em alguma regra: "
+                    "a regra mostrada é a melhor encontrada até ali."
+                )
+            best_rows = [
+                {
+                    "Objetivo": objective_label,
+                    "Melhor Regra": result["cenario"].label,
+                    "Total Pago (R$)": result["total_pago"],
+                    "Diferença vs Contrato (R$)": result["total_pago"] - actual_total_paid,
+                    "Subconjuntos Avaliados": result["nos_visitados"],
+                }
+                for objective_label, results in (("Mais barata", cheapest), (f"Até R$ {FAIR_RULE_TOLERANCE:.2f} do {fair_reference}", fairest))
+                for result in results
+            ]
+            if best_rows:
+                # Quando a melhor escolha é um único índice, várias agregações dão a mesma linha
+                best_df = pd.DataFrame(best_rows).drop_duplicates(subset=["Objetivo", "Melhor Regra"])
+                st.dataframe(
+                    best_df.style.format({
+                        "Total Pago (R$)": "R$ {:,.2f}",
+                        "Diferença vs Contrato (R$)": "{:+,.2f}",
+                    }).hide(axis="index")
+                )
+            else:
+                st.info("Nenhum índice com dados em todos os aniversários do contrato para a busca.")
+
+# --- Seção de Backtest Histórico ---
+@st.fragment
+@span("secao_backtest")
+def backtest_section():
+    """Backtest de um cenário contra um índice de referência, para todo mês de início possível."""
+    st.header("🧪 Backtest Histórico dos Reajustes")
+    st.markdown("Compare como cada regra de reajuste teria se saído para contratos iniciados em qualquer mês desde 1995.")
+
+    with st.spinner("Calculando acumulado 12 meses dos índices..."):
+        rolling_table, backtest_errors = get_rolling_12m_table(list(INDICES_IDS.keys()))
+    for error_msg in backtest_errors:
+        st.error(error_msg)
+    if len(rolling_table.names) < 2:
+        st.info("São necessários ao menos dois índices com dados para o backtest.")
+        return
+
+    scenarios = build_rent_scenarios(rolling_table.names)
+    scenario_labels = [sc.label for sc in scenarios]
+    bt_col1, bt_col2 = st.columns(2)
+    with bt_col1:
+        selected_label = st.selectbox(
+            "Cenário avaliado:", options=scenario_labels,
+            index=len(rolling_table.names), # Default: primeira média
+            key="backtest_scenario"
+        )
+        durations = st.multiselect(
+            "Durações do contrato (meses):", options=[24, 30, 36, 48, 60, 120], # Com 12 meses não há reajuste
+            default=list(DEFAULT_DURATIONS), key="backtest_durations"
+        )
+    with bt_col2:
+        reference_label = st.selectbox(
+            "Índice de referência:", options=list(rolling_table.names),
+            index=list(rolling_table.names).index("IGP-M") if "IGP-M" in rolling_table else 0,
+            key="backtest_reference"
+        )
+    if not durations:
+        st.info("👆 Selecione ao menos uma duração de contrato.")
+        return
+
+    with st.spinner("Simulando todos os meses de início..."):
+        backtest_df = backtest_frame(rolling_table, scenarios, sorted(durations))
+    totals = backtest_df.pivot_table(
+        index="Início", columns=["Cenário", "Duração (meses)"], values="Total Pago (R$)", observed=True
+    )
+    if selected_label not in totals.columns.get_level_values(0) or reference_label not in totals.columns.get_level_values(0):
+        st.info("Não há contratos encerrados com dados suficientes para esse cenário.")
+        return
+
+    # Diferença % do total pago: cenário avaliado vs índice de referência, por início e duração
+    diff_perc = (totals[selected_label] / totals[reference_label] - 1) * 100
+    diff_perc = diff_perc.dropna(how="all")
+    diff_perc.columns = [f"{months} meses" for months in diff_perc.columns]
+
+    st.markdown(f"**Total pago com {selected_label} vs {reference_label} (%), por mês de início do contrato:**")
+    cols_backtest = st.columns(len(diff_perc.columns))
+    for current_col, column in zip(cols_backtest, diff_perc.columns):
+        cheaper_share = (diff_perc[column].dropna() < 0).mean() * 100
+        with current_col:
+            st.metric(
+                label=f"{column}: mais barato em", value=f"{cheaper_share:.0f}% dos inícios",
+                help=f"Parcela dos contratos de {column} em que {selected_label} custou menos que {reference_label}."
+            )
+    with span("render_grafico_backtest"):
+        st.line_chart(diff_perc)
+    with st.expander("Ver tabela do backtest (diferença % no total pago)"), span("render_tabela_backtest"):
+        st.dataframe(diff_perc.style.format("{:+.2f}", na_rep="-"))
+
+# --- Execução das Seções ---
+# Séries fora da memória esperam no máximo o orçamento da página; as atrasadas
+# seguem carregando em segundo plano e aparecem na próxima interação
+with fetch_deadline(PAGE_FETCH_BUDGET_SECONDS):
+    comparison_section()
+    st.divider()
+    history_section()
+    st.divider()
+    rent_section()
+    st.divider()
+    backtest_section()
 
 # --- Rodapé na Barra Lateral ---
 st.sidebar.markdown("---")
+stale = stale_series()
+if stale:
+    stale_names = {codigo: name for name, codigo in INDICES_IDS.items()}
+    st.sidebar.warning(
+        "BCB indisponível no momento; exibindo a última versão obtida de: "
+        + ", ".join(f"{stale_names.get(codigo, codigo)} (até {last_month})" for codigo, (last_month, _) in stale.items())
+    )
 st.sidebar.info("Fonte dos Dados: API de Séries Temporais do Banco Central do Brasil (BCB SGS).")
-st.sidebar.markdown("Cache de dados da API ativo por **1 hora**.")
+st.sidebar.markdown("Séries atualizadas em **segundo plano**, conforme o calendário de divulgação de cada índice.")
+st.sidebar.markdown("Séries armazenadas localmente: só os meses novos e os últimos 12 (revisões) são buscados na API.")
+_cache_info = cache_stats()
+st.sidebar.caption(
+    f"Cache em memória: {_cache_info['entradas']} itens, {_cache_info['bytes'] / 2**20:.1f} de "
+    f"{_cache_info['max_bytes'] / 2**20:.0f} MiB · acertos {_cache_info['acertos']}, "
+    f"faltas {_cache_info['faltas']}, descartes {_cache_info['descartes']}"
+)
 # st.sidebar.info("Criado por Riuler") # Descomente se quiser
+
+# --- Painel de Desempenho (opcional) ---
+with st.sidebar.expander("🔧 Painel de desempenho"):
+    observe("pagina_total", time.perf_counter() - _page_start)
+    _snapshot = metrics_snapshot()
+    if _snapshot["etapas"]:
+        st.dataframe(
+            pd.DataFrame.from_dict(_snapshot["etapas"], orient="index")
+            .style.format({"contagem": "{:d}", "total_ms": "{:.1f}", "p50_ms": "{:.2f}", "p90_ms": "{:.2f}", "p99_ms": "{:.2f}"})
+        )
+    st.caption(" · ".join(f"{name}: {value}" for name, value in _snapshot["contadores"].items()) or "Sem contadores.")
+    st.download_button(
+        "Exportar (Prometheus)", prometheus_text(), file_name="metricas.prom", mime="text/plain",
+        key="metrics_download"
+    )
+
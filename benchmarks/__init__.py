@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks offline dos caminhos de cálculo (python -m benchmarks.run)."""
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Dados sintéticos no formato da API SGS, gerados de forma reprodutível (sem rede)."""
+
+import random
+from datetime import date
+
+import pandas as pd
+
+FIRST_MONTH = date(1994, 7, 1) # Início do histórico real das séries
+FULL_HISTORY_MONTHS = 387 # Jul/1994 a Set/2026
+
+def _months(n_months):
+    """Primeiros dias dos n_months meses a partir de FIRST_MONTH."""
+    year, month = FIRST_MONTH.year, FIRST_MONTH.month
+    for _ in range(n_months):
+        yield date(year, month, 1)
+        month += 1
+        if month == 13:
+            year, month = year + 1, 1
+
+def make_sgs_payload(codigo_sgs, n_months):
+    """Lista [{"data": "dd/mm/aaaa", "valor": "x.xx"}] como a devolvida pela API SGS."""
+    rnd = random.Random(codigo_sgs)
+    return [
+        {"data": month.strftime("%d/%m/%Y"), "valor": f"{rnd.gauss(0.5, 0.4):.2f}"}
+        for month in _months(n_months)
+    ]
+
+def make_index_names(n_indices):
+    """Nomes de índices sintéticos (IDX01, IDX02, ...)."""
+    return [f"IDX{i + 1:02d}" for i in range(n_indices)]
+
+def make_monthly_table(n_months, n_indices):
+    """Tabela mensal (%) de n_indices índices sintéticos (meses x índices)."""
+    names = make_index_names(n_indices)
+    columns = {}
+    for i, name in enumerate(names):
+        payload = make_sgs_payload(1000 + i, n_months)
+        columns[name] = [float(item["valor"]) for item in payload]
+    index = pd.DatetimeIndex([pd.Timestamp(month) for month in _months(n_months)], name="data")
+    return pd.DataFrame(columns, index=index)
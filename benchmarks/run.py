@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks dos caminhos de cálculo com dados SGS sintéticos.
+
+Uso:
+    python -m benchmarks.run                      # mede e compara com benchmarks/baseline.json
+    python -m benchmarks.run --salvar-baseline    # mede e grava o novo baseline
+    python -m benchmarks.run --filtro rolling     # só os casos cujo nome contém 'rolling'
+
+Cada caso registra o melhor tempo e o mediano entre as repetições e o pico de
+memória (tracemalloc). A comparação usa o melhor tempo, menos sensível a ruído,
+dividido pelo tempo de um caso de referência (REFERENCE_CASE, uma carga fixa
+de Python, numpy e pandas que não usa o pacote) medido na mesma execução, então
+um baseline gravado em outra máquina continua comparável. Casos mais lentos
+que o baseline além da tolerância são marcados como regressão e o comando
+termina com código 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from indice_imobiliario import (
+    DEFAULT_DURATIONS,
+    RentScenario,
+    IndexTables,
+    MonthlySeries,
+    backtest_rent_grid,
+    build_rent_scenarios,
+    build_rolling_12m_table,
+    calculate_accumulated_inflation,
+    calculate_rolling_12m_accumulation,
+    decode_sgs_payload,
+    evaluate_rent_scenarios,
+    find_best_rules,
+    memory_cache,
+    month_start,
+    parse_sgs_payload,
+    project_rent_paths,
+    sgs_frame_from_arrays,
+    simulate_rent_payments_v3,
+    simulate_rent_scenarios,
+)
+
+from .fixtures import FULL_HISTORY_MONTHS, make_monthly_table, make_sgs_payload
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+HISTORY_SIZES = (12, 60, 120, FULL_HISTORY_MONTHS)
+INDEX_COUNTS = (1, 3, 6, 12)
+REFERENCE_CASE = "referencia[maquina]"
+
+_REFERENCE_VALUES = np.random.default_rng(0).normal(0.5, 0.4, FULL_HISTORY_MONTHS)
+
+def reference_workload():
+    """Carga fixa (laço Python, numpy e pandas pequenos) que mede a velocidade da máquina, não do pacote."""
+    series = pd.Series(_REFERENCE_VALUES).dropna()
+    total = float(np.prod(1 + series.to_numpy() / 100))
+    for value in _REFERENCE_VALUES.tolist():
+        total += value * value
+    return total
+
+def _cold(func):
+    """Chamada sem os caminhos de reajuste em cache (mede a simulação, não um acerto do memory_cache)."""
+    def call():
+        memory_cache.clear(lambda key: key[0] == "rent_paths")
+        return func()
+    return call
+
+def build_cases():
+    """Lista de (nome, função sem argumentos) a medir; os dados são preparados aqui."""
+    cases = [(REFERENCE_CASE, reference_workload)]
+
+    for n_months in HISTORY_SIZES:
+        payload = make_sgs_payload(433, n_months)
+        cases.append((f"parse_sgs_payload[meses={n_months}]", lambda p=payload: parse_sgs_payload(p, 433)))
+        raw = json.dumps(payload).encode("utf-8") # Corpo da resposta como chega da API
+        cases.append((
+            f"json_parse_sgs[meses={n_months}]",
+            lambda r=raw: parse_sgs_payload(json.loads(r), 433),
+        ))
+        cases.append((
+            f"decode_sgs_payload[meses={n_months}]",
+            lambda r=raw: sgs_frame_from_arrays(*decode_sgs_payload(r), 433),
+        ))
+
+        table = make_monthly_table(n_months, 1)
+        cases.append((
+            f"accumulated_inflation[meses={n_months}]",
+            lambda t=table: calculate_accumulated_inflation(t, "IDX01"),
+        ))
+
+    for n_indices in INDEX_COUNTS:
+        for n_months in (120, FULL_HISTORY_MONTHS):
+            table = make_monthly_table(n_months, n_indices)
+            cases.append((
+                f"rolling_12m[meses={n_months},indices={n_indices}]",
+                lambda t=table: calculate_rolling_12m_accumulation(t),
+            ))
+        table = make_monthly_table(FULL_HISTORY_MONTHS, n_indices)
+        cases.append((f"index_tables_build[indices={n_indices}]", lambda t=table: IndexTables(t)))
+
+    tables = IndexTables(make_monthly_table(FULL_HISTORY_MONTHS, 6))
+    cases.append((
+        "index_tables_window_lookup",
+        lambda: tables.accumulated_inflation("IDX01", tables.first_ordinal + 60, tables.last_ordinal),
+    ))
+
+    # Projeção Monte Carlo: contrato de 10 anos iniciado 1 ano antes do último mês com dado
+    monthly = MonthlySeries.from_frame(make_monthly_table(FULL_HISTORY_MONTHS, 6))
+    start, end = month_start(monthly.last_ordinal - 11), month_start(monthly.last_ordinal + 108)
+    for scenarios in ([RentScenario("base", ("IDX01",))], build_rent_scenarios(monthly.names, max_combo_size=2)):
+        cases.append((
+            f"project_rent_paths[cenarios={len(scenarios)},caminhos=2000,anos=10]",
+            lambda sc=scenarios: project_rent_paths(start, end, sc, monthly, history_start=None),
+        ))
+
+    for n_indices in (3, 6, 8):
+        rolling_table = build_rolling_12m_table(make_monthly_table(FULL_HISTORY_MONTHS, n_indices))
+        scenarios = build_rent_scenarios(rolling_table.names)
+        cases.append((
+            f"backtest_rent_grid[indices={n_indices},cenarios={len(scenarios)},duracoes=3]",
+            lambda sc=scenarios, rt=rolling_table: backtest_rent_grid(rt, sc, DEFAULT_DURATIONS),
+        ))
+        for years in (1, 10, 30):
+            start = month_start(rolling_table.first_ordinal + 12)
+            end = month_start(rolling_table.first_ordinal + 12 + 12 * years - 1)
+            cases.append((
+                f"evaluate_rent_scenarios[indices={n_indices},cenarios={len(scenarios)},anos={years}]",
+                lambda s=start, e=end, sc=scenarios, rt=rolling_table: evaluate_rent_scenarios(1000.0, s, e, sc, rt),
+            ))
+            if n_indices == 6:
+                cases.append((
+                    f"simulate_rent_scenarios[cenarios={len(scenarios)},anos={years}]",
+                    _cold(lambda s=start, e=end, sc=scenarios, rt=rolling_table: simulate_rent_scenarios(1234.0, s, e, sc, rt)),
+                ))
+                cases.append(( # Busca exata da regra mais barata entre todos os subconjuntos
+                    f"find_best_rules[indices={n_indices},anos={years}]",
+                    lambda s=start, e=end, rt=rolling_table: find_best_rules(1000.0, s, e, rt),
+                ))
+                cases.append((
+                    f"simulate_rent_payments_v3[anos={years}]",
+                    _cold(lambda s=start, e=end, rt=rolling_table: simulate_rent_payments_v3(
+                        1000.0, s, e, RentScenario("base", ("IDX01",)), rt
+                    )),
+                ))
+    return cases
+
+def measure(func, min_time=0.5, repeats=7):
+    """Melhor e mediano tempo por chamada (s) e pico de memória de uma chamada (bytes)."""
+    func() # Aquecimento
+    calls = 1
+    while True: # Calibra o número de chamadas por repetição
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeats or calls >= 1_000_000:
+            break
+        calls *= 10
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        timings.append((time.perf_counter() - start) / calls)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), statistics.median(timings), peak
+
+def relative_time(results, name):
+    """Melhor tempo do caso em unidades do caso de referência da mesma execução (None se faltar algum)."""
+    result, reference = results.get(name), results.get(REFERENCE_CASE)
+    if not result or not reference:
+        return None
+    return result["segundos"] / reference["segundos"]
+
+def compare(results, baseline, tolerance):
+    """Nomes dos casos mais lentos que o baseline além da tolerância (ex: 0.25 = 25%), em tempo relativo."""
+    regressions = []
+    for name in results:
+        current, reference = relative_time(results, name), relative_time(baseline, name)
+        if name != REFERENCE_CASE and current and reference and current > reference * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+def host_info():
+    """Identificação da máquina gravada junto do baseline (só informativa)."""
+    return {"maquina": platform.node(), "processador": platform.machine(), "python": platform.python_version()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks offline dos cálculos de índices.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Arquivo JSON do baseline")
+    parser.add_argument("--salvar-baseline", action="store_true", help="Grava os resultados como novo baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Lentidão aceita antes de acusar regressão")
+    parser.add_argument("--filtro", default="", help="Mede só os casos cujo nome contém este texto")
+    parser.add_argument("--saida", help="Grava os resultados desta execução em JSON")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.salvar_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    baseline_host = baseline.pop("_maquina", None)
+    if baseline and REFERENCE_CASE not in baseline:
+        print(f"Baseline sem o caso {REFERENCE_CASE}: regrave com --salvar-baseline para comparar.")
+    elif baseline_host and baseline_host != host_info():
+        print(f"Baseline gravado em outra máquina ({baseline_host['maquina']}): comparação pelo tempo relativo.")
+
+    results = {}
+    for name, func in build_cases():
+        if args.filtro not in name and name != REFERENCE_CASE: # A referência é sempre medida
+            continue
+        seconds, median, peak = measure(func)
+        results[name] = {"segundos": seconds, "segundos_mediana": median, "pico_memoria_bytes": peak}
+        current, reference = relative_time(results, name), relative_time(baseline, name)
+        ratio = f"{current / reference:6.2f}x" if current and reference else "    -  "
+        print(f"{name:70s} {seconds * 1e3:10.3f} ms {peak / 1024:10.1f} KiB {ratio}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"_maquina": host_info(), **results}, f, indent=1, sort_keys=True)
+        print(f"Baseline gravado em {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerancia)
+    for name in regressions:
+        print(f"REGRESSÃO: {name}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
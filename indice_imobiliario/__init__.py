@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Núcleo de cálculo do painel de índices (sem Streamlit).
+
+Busca das séries SGS do BCB, inflação acumulada e simulação de reajuste de
+aluguel, utilizáveis por scripts, serviços e benchmarks. Os submódulos (e
+pandas/numpy/requests) só são importados quando um nome é acessado.
+"""
+
+from importlib import import_module
+
+from .indices import INDICES_IDS, INDICES_RELEASE, SGS_HISTORY_START
+
+# Nome público -> submódulo que o define (importado sob demanda)
+_LAZY_EXPORTS = {
+    "get_http_session": "bcb",
+    "download_sgs": "bcb",
+    "parse_sgs_payload": "bcb",
+    "decode_sgs_payload": "bcb",
+    "sgs_frame_from_arrays": "bcb",
+    "download_sgs_chunked": "bcb",
+    "CircuitBreaker": "bcb",
+    "CircuitOpenError": "bcb",
+    "bcb_circuit": "bcb",
+    "SGS_STORE_PATH": "store",
+    "load_sgs_store": "store",
+    "sync_sgs_store": "store",
+    "fetch_sgs_frame": "fetch",
+    "fetch_sgs_many": "fetch",
+    "load_monthly_table": "fetch",
+    "load_monthly_series": "fetch",
+    "get_number_index": "fetch",
+    "accumulated_inflation_window": "fetch",
+    "fetch_deadline": "fetch",
+    "stale_series": "fetch",
+    "get_full_series": "fetch",
+    "slice_series": "fetch",
+    "calculate_accumulated_inflation": "accumulation",
+    "calculate_rolling_12m_accumulation": "accumulation",
+    "build_number_index": "accumulation",
+    "get_adjustment_schedule": "simulation",
+    "compute_rent_path": "simulation",
+    "RentScenario": "simulation",
+    "AGGREGATIONS": "simulation",
+    "aggregate_adjustments": "simulation",
+    "scenario_membership": "simulation",
+    "build_rent_scenarios": "simulation",
+    "build_rolling_12m_table": "simulation",
+    "evaluate_rent_scenarios": "simulation",
+    "simulate_rent_scenarios": "simulation",
+    "simulate_rent_payments_v3": "simulation",
+    "MonthlySeries": "monthly",
+    "month_ordinal": "monthly",
+    "ordinal_label": "monthly",
+    "month_start": "monthly",
+    "backtest_rent_grid": "backtest",
+    "backtest_frame": "backtest",
+    "DEFAULT_DURATIONS": "backtest",
+    "find_best_rules": "search",
+    "bootstrap_monthly_paths": "projection",
+    "project_rent_paths": "projection",
+    "project_rent_scenarios": "projection",
+    "IndexTables": "tables",
+    "get_rolling_12m_table": "tables",
+    "expected_last_month": "schedule",
+    "refresh_interval": "schedule",
+    "span": "metrics",
+    "observe": "metrics",
+    "metrics_snapshot": "metrics",
+    "prometheus_text": "metrics",
+    "LRUCache": "cache",
+    "memory_cache": "cache",
+    "cache_stats": "cache",
+    "SharedDirectoryCache": "shared",
+    "RedisSharedCache": "shared",
+    "open_shared_cache": "shared",
+    "shared_cache": "shared",
+}
+
+__all__ = ["INDICES_IDS", "INDICES_RELEASE", "SGS_HISTORY_START", *_LAZY_EXPORTS]
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module_name}", __name__), name)
+    globals()[name] = value # Próximos acessos não passam mais por aqui
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Inflação acumulada num período e acumulado móvel de 12 meses."""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .monthly import MonthlySeries
+
+# --- Cálculo Acumulado (Comparação) ---
+def calculate_accumulated_inflation(df, column_name):
+    """Calcula inflação acumulada para uma coluna em um DataFrame."""
+    if column_name not in df.columns:
+        print(f"Erro Acumulado: Coluna '{column_name}' não encontrada.")
+        return None
+    try:
+        # Converte para numérico, tratando erros e removendo NaNs resultantes
+        numeric_series = pd.to_numeric(df[column_name], errors='coerce').dropna()
+
+        if numeric_series.empty:
+            print(f"Erro Acumulado ({column_name}): Série vazia após conversão/limpeza.")
+            return None
+        if len(numeric_series) < 1: # Precisa de pelo menos um valor
+             print(f"Erro Acumulado ({column_name}): Menos de 1 valor válido.")
+             return None
+        values = numeric_series.to_numpy(dtype=float)
+        # Verifica se todos os valores são realmente numéricos e finitos
+        if not pd.api.types.is_numeric_dtype(numeric_series) or not np.isfinite(values).all():
+             print(f"Erro Acumulado ({column_name}): Contém valores não numéricos ou infinitos.")
+             return None
+
+        # Cálculo da inflação acumulada
+        accumulated_inflation = (np.prod(1 + values / 100) - 1) * 100
+        return accumulated_inflation
+    except Exception as e:
+        print(f"Erro inesperado em calculate_accumulated_inflation ({column_name}): {e}")
+        return None
+
+# --- Número-Índice Encadeado ---
+def build_number_index(monthly_perc):
+    """Número-índice encadeado: produto de (1 + v/100) desde o primeiro mês até cada mês.
+
+    Aceita Series, DataFrame ou MonthlySeries; meses sem valor mantêm o nível
+    anterior. A inflação acumulada entre dois meses vira uma divisão:
+    (indice[fim] / indice[mês anterior ao início] - 1) * 100.
+    """
+    if isinstance(monthly_perc, MonthlySeries):
+        return monthly_perc.with_values(np.cumprod(1 + np.nan_to_num(monthly_perc.values, nan=0.0) / 100, axis=0))
+    return (1 + monthly_perc.fillna(0.0) / 100).cumprod()
+
+# --- Cálculo Acumulado 12M (Histórico/Aluguel) ---
+def _rolling_accumulation(values, window):
+    """Acumulado móvel (%) de cada coluna de um array 2-D (meses x índices)."""
+    factors = 1 + values / 100
+    accumulated = np.full(factors.shape, np.nan)
+    if len(factors) >= window:
+        windows = sliding_window_view(factors, window, axis=0) # (janelas, índices, window)
+        accumulated[window - 1:] = (windows.prod(axis=-1) - 1) * 100
+    return accumulated
+
+def calculate_rolling_12m_accumulation(monthly_perc, window=12):
+    """Calcula o acumulado móvel de 12 meses (%) para uma Series, DataFrame ou MonthlySeries.
+
+    Todas as colunas são calculadas de uma vez, como produto das janelas de um
+    array 2-D (meses x índices). Só janelas com 12 valores válidos produzem
+    resultado; qualquer NaN na janela (ou início da série) resulta em NaN.
+    """
+    if isinstance(monthly_perc, MonthlySeries): # Grade contínua: a janela é sempre de 12 meses corridos
+        return monthly_perc.with_values(_rolling_accumulation(monthly_perc.values, window))
+    values = monthly_perc.to_numpy(dtype=float)
+    accumulated = _rolling_accumulation(values.reshape(len(values), -1), window) # Sempre 2-D: (meses, índices)
+
+    if isinstance(monthly_perc, pd.Series):
+        return pd.Series(accumulated[:, 0], index=monthly_perc.index, name=monthly_perc.name)
+    return pd.DataFrame(accumulated, index=monthly_perc.index, columns=monthly_perc.columns)
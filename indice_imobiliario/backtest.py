@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Backtest histórico dos cenários de reajuste para todo mês de início possível.
+
+Para cada (cenário x mês de início x duração) calcula o total pago e o aluguel
+final de um contrato iniciado no dia 01 do mês, com as mesmas regras de
+simulate_rent_payments_v3: reajuste no aniversário pelo acumulado 12m do mês
+anterior. Tudo sai de uma matriz de reajustes (cenários x meses) e de produtos
+acumulados com passo de 12 meses, sem laço por contrato.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .cache import memory_cache
+from .metrics import span
+from .monthly import MonthlySeries, ordinal_label
+from .simulation import _scenario_adjustments
+
+DEFAULT_DURATIONS = (30, 36, 60) # Durações usuais de contrato, em meses
+
+def backtest_rent_grid(rolling, scenarios, durations, initial_rent=1.0):
+    """Total pago e aluguel final de cada (cenário x mês de início x duração em meses).
+
+    Os meses de início são todos os meses de `rolling` (acumulado 12m).
+    Retorna (ordinais dos inícios, total pago, aluguel final), os dois últimos
+    com forma (cenários x inícios x durações). A célula fica NaN se o contrato
+    ainda não terminou no último mês disponível, ou se algum reajuste depender
+    de um mês sem acumulado 12m de algum índice do cenário.
+    """
+    if not isinstance(rolling, MonthlySeries):
+        rolling = MonthlySeries.from_frame(rolling)
+    durations = np.asarray(durations, dtype=np.int64)
+    if (durations < 1).any():
+        raise ValueError("Durações devem ter ao menos 1 mês")
+    n_months = len(rolling)
+    anniversaries = (durations - 1) // 12 # Reajustes dentro de cada duração
+    max_anniversaries = int(anniversaries.max(initial=0))
+
+    # Reajuste % de cada cenário quando o mês t é o mês do índice: (cenários x meses),
+    # seguido de NaN para os meses ainda sem dado
+    perc = _scenario_adjustments(scenarios, rolling, np.ones(n_months, dtype=bool), rolling.ordinals)
+    perc = np.concatenate((perc, np.full((len(scenarios), 12 * max_anniversaries), np.nan)), axis=1)
+
+    # Índice do j-ésimo aniversário do contrato iniciado no mês m: m + 12j - 1
+    index_positions = np.arange(n_months)[:, None] + 12 * np.arange(1, max_anniversaries + 1) - 1
+    factors = 1 + perc[:, index_positions] / 100 # (cenários x inícios x aniversários)
+    # Nível do aluguel em cada ano do contrato (ano 0 = aluguel inicial); NaN propaga adiante
+    level = np.cumprod(np.concatenate((np.ones(factors.shape[:2] + (1,)), factors), axis=-1), axis=-1)
+    paid_before = np.concatenate((np.zeros(level.shape[:2] + (1,)), np.cumsum(level, axis=-1)[..., :-1]), axis=-1)
+
+    # Anos completos pagam 12 meses; o último ano pode ser parcial
+    final_level = level[..., anniversaries]
+    total_paid = 12 * paid_before[..., anniversaries] + (durations - 12 * anniversaries) * final_level
+    unfinished = np.arange(n_months)[:, None] + durations > n_months # (inícios x durações)
+    total_paid[:, unfinished] = np.nan
+    final_level = np.where(unfinished, np.nan, final_level)
+    return rolling.ordinals, initial_rent * total_paid, initial_rent * final_level
+
+def backtest_frame(rolling, scenarios, durations=DEFAULT_DURATIONS, initial_rent=1000.0):
+    """Backtest em formato longo, pronto para mapa de calor (uma linha por início, duração e cenário).
+
+    O grid por aluguel unitário fica em memory_cache (chave: versão dos dados,
+    cenários e durações); outro aluguel inicial só reescala. Linhas sem
+    resultado (NaN) ficam de fora.
+    """
+    if not isinstance(rolling, MonthlySeries):
+        rolling = MonthlySeries.from_frame(rolling)
+    scenarios, durations = tuple(scenarios), tuple(int(d) for d in durations)
+
+    def compute():
+        with span("backtest_grid"):
+            return backtest_rent_grid(rolling, scenarios, durations)
+
+    starts, total_paid, final_rent = memory_cache.get_or_compute(
+        ("backtest", rolling.digest(), scenarios, durations), compute
+    )
+    n_scenarios, n_starts, n_durations = total_paid.shape
+    # Início e cenário como categorias: códigos inteiros repetidos, sem strings por linha
+    start_codes = np.tile(np.repeat(np.arange(n_starts), n_durations), n_scenarios)
+    scenario_codes = np.repeat(np.arange(n_scenarios), n_starts * n_durations)
+    frame = pd.DataFrame({
+        "Início": pd.Categorical.from_codes(start_codes, [ordinal_label(m) for m in starts], ordered=True),
+        "Duração (meses)": np.tile(durations, n_scenarios * n_starts),
+        "Cenário": pd.Categorical.from_codes(scenario_codes, [sc.label for sc in scenarios]),
+        "Total Pago (R$)": initial_rent * total_paid.ravel(),
+        "Aluguel Final (R$)": initial_rent * final_rent.ravel(),
+    })
+    return frame.dropna(subset=["Total Pago (R$)"]).reset_index(drop=True)
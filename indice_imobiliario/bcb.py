@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""Acesso HTTP à API de séries temporais (SGS) do BCB.
+
+Cada requisição tem tempo limite curto e, se demorar mais que
+HEDGE_AFTER_SECONDS, ganha um pedido duplicado (vale a primeira resposta).
+Um disjuntor (bcb_circuit) para de chamar a API depois de várias falhas
+seguidas e só volta a tentar após um intervalo, com um único pedido de teste.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import requests
+
+from .indices import INDICES_IDS
+from .metrics import count, span
+
+SGS_URL = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo_sgs}/dados"
+HTTP_TIMEOUT = (5, 15) # Segundos para conectar e para cada leitura da resposta
+HEDGE_AFTER_SECONDS = 3.0 # Sem resposta até aqui: dispara um pedido duplicado
+
+# Disjuntor da API: falhas transitórias seguidas que o abrem e espera até o pedido de teste
+CIRCUIT_FAILURES = 5
+CIRCUIT_RESET_SECONDS = 60
+
+# Carga do histórico completo (download_sgs_chunked)
+BACKFILL_CHUNK_YEARS = 8 # Anos por requisição na carga do histórico completo
+BACKFILL_WORKERS = 4 # Blocos buscados em paralelo por série
+BACKFILL_RETRIES = 3 # Novas tentativas por bloco em falhas transitórias
+BACKFILL_BACKOFF_SECONDS = 0.5 # Espera antes da 1ª nova tentativa (dobra a cada uma)
+
+# --- Sessão HTTP Compartilhada ---
+# Uma única sessão com pool de conexões keep-alive para api.bcb.gov.br,
+# dimensionada para buscar todos os índices (e seus blocos) em paralelo.
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """Sessão requests compartilhada pelo processo (criada no primeiro uso)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                pool_size = max(len(INDICES_IDS), 4) * BACKFILL_WORKERS
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+# --- Disjuntor e Pedidos Duplicados ---
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """API do BCB considerada fora do ar: a chamada nem é feita."""
+
+class CircuitBreaker:
+    """Fechado -> aberto após `failures` falhas seguidas; após `reset_seconds`, um pedido de teste decide.
+
+    before_call devolve um bilhete (geração, é_teste) que a chamada entrega a
+    record. A geração muda a cada abertura, então resultados de chamadas
+    liberadas antes dela (que terminam atrasadas) são ignorados: não liberam
+    outro teste nem adiam a próxima tentativa.
+    """
+
+    def __init__(self, failures=CIRCUIT_FAILURES, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._consecutive = 0
+        self._opened_at = None
+        self._probing = False
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """'fechado', 'aberto' ou 'meio-aberto' (pedido de teste liberado ou em andamento)."""
+        with self._lock:
+            if self._opened_at is None:
+                return "fechado"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "meio-aberto"
+            return "aberto"
+
+    def before_call(self):
+        """Bilhete da chamada liberada, ou CircuitOpenError (aberto, ou teste já em andamento)."""
+        with self._lock:
+            if self._opened_at is None:
+                return self._generation, False
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._probing = True # Só esta chamada testa a API
+                return self._generation, True
+        count("bcb_circuito_rejeitadas")
+        raise CircuitOpenError("Circuito aberto: API do BCB indisponível, tentando de novo em instantes")
+
+    def record(self, ticket, success):
+        """Resultado da chamada do bilhete; o de chamadas anteriores à última abertura é descartado."""
+        generation, probe = ticket
+        with self._lock:
+            if generation != self._generation:
+                count("bcb_circuito_resultados_atrasados")
+                return
+            if probe:
+                self._probing = False
+            if success:
+                self._consecutive, self._opened_at = 0, None
+                return
+            self._consecutive += 1
+            if probe or (self._opened_at is None and self._consecutive >= self.failures):
+                if not probe:
+                    print(f"BCB: {self._consecutive} falhas seguidas, suspendendo chamadas por {self.reset_seconds}s")
+                    count("bcb_circuito_aberturas")
+                self._generation += 1
+                self._opened_at = time.monotonic() # Abertura, ou teste falhou: reinicia a espera
+
+# Disjuntor do processo, compartilhado por todas as séries (a indisponibilidade é da API)
+bcb_circuit = CircuitBreaker()
+
+_hedge_executor = None
+
+def _get_hedge_executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _session_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=2 * max(len(INDICES_IDS), 4) * BACKFILL_WORKERS, thread_name_prefix="bcb-http"
+                )
+    return _hedge_executor
+
+def _hedged_get(session, url, hedge_after=HEDGE_AFTER_SECONDS):
+    """GET que dispara um pedido duplicado se o primeiro passar de hedge_after segundos; vale o primeiro a responder."""
+    executor = _get_hedge_executor()
+    first = executor.submit(session.get, url, timeout=HTTP_TIMEOUT)
+    if wait([first], timeout=hedge_after).done:
+        return first.result()
+    count("bcb_pedidos_duplicados")
+    pending = {first, executor.submit(session.get, url, timeout=HTTP_TIMEOUT)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result() # O outro pedido termina sozinho e é descartado
+            except requests.exceptions.RequestException as e:
+                error = e
+    raise error
+
+def decode_sgs_payload(raw):
+    """Decodifica o JSON bruto da API SGS direto em arrays: (ordinais de mês int64, valores float64).
+
+    O texto é cortado nas aspas, sem montar dicionários nem datas em Python; o
+    ordinal é ano * 12 + mês - 1. Devolve None se o conteúdo fugir do formato
+    [{"data": "01/mm/aaaa", "valor": "x"}, ...] (quem chamou usa então o json).
+    """
+    parts = raw.split(b'"')
+    n = len(parts) // 8
+    if n == 0 or len(parts) != 8 * n + 1 or parts[1::8].count(b"data") != n or parts[5::8].count(b"valor") != n:
+        return None
+    digits = np.frombuffer(b"".join(parts[3::8]), dtype=np.uint8)
+    if digits.size != 10 * n:
+        return None
+    digits = digits.reshape(n, 10).astype(np.int64) - 48 # 'dd/mm/aaaa' -> dígitos
+    if (digits[:, [0, 1, 3, 4, 6, 7, 8, 9]] > 9).any() or (digits[:, [0, 1, 3, 4, 6, 7, 8, 9]] < 0).any():
+        return None
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 3] * 10 + digits[:, 4]
+    if (day != 1).any() or (month < 1).any() or (month > 12).any(): # Séries mensais: sempre dia 01
+        return None
+    year = digits[:, 6] * 1000 + digits[:, 7] * 100 + digits[:, 8] * 10 + digits[:, 9]
+    try:
+        values = np.array(parts[7::8], dtype="S32").astype(np.float64)
+    except ValueError: # Valor vazio ou não numérico
+        return None
+    return year * 12 + month - 1, values
+
+def sgs_frame_from_arrays(ordinals, values, codigo_sgs):
+    """DataFrame indexado por data (dia 01 de cada mês) a partir dos arrays de decode_sgs_payload."""
+    valid = ~np.isnan(values)
+    dates = (ordinals[valid] - 1970 * 12).astype("datetime64[M]").astype("datetime64[ns]")
+    return pd.DataFrame({f'sgs_{codigo_sgs}': values[valid]}, index=pd.DatetimeIndex(dates, name='data'))
+
+def parse_sgs_payload(data, codigo_sgs):
+    """Converte o JSON da API SGS (já decodificado em lista de dicionários) em DataFrame indexado por data."""
+    df = pd.DataFrame(data)
+    df['data'] = pd.to_datetime(df['data'], format='%d/%m/%Y')
+    df = df.set_index('data')
+    col_name = f'sgs_{codigo_sgs}'
+    df = df.rename(columns={'valor': col_name})
+    df[col_name] = pd.to_numeric(df[col_name], errors='coerce')
+    df = df.dropna(subset=[col_name]) # Remove linhas onde a conversão falhou
+    return df[[col_name]]
+
+def download_sgs(codigo_sgs, start_date, end_date, session=None):
+    """Baixa da API SGS os valores entre duas datas (None se a API não tiver dados)."""
+    if session is None:
+        session = get_http_session()
+    start_str = start_date.strftime('%d/%m/%Y')
+    end_str = end_date.strftime('%d/%m/%Y')
+    url = f"{SGS_URL.format(codigo_sgs=codigo_sgs)}?formato=json&dataInicial={start_str}&dataFinal={end_str}"
+    ticket = bcb_circuit.before_call()
+    try:
+        with span("bcb_http"):
+            response = _hedged_get(session, url)
+        if response.status_code != 404: # API responde 404 quando não há valores no intervalo
+            response.raise_for_status() # Verifica erros HTTP (4xx, 5xx)
+    except Exception as e: # Só 4xx (fora 429) indica API no ar
+        bcb_circuit.record(ticket, success=isinstance(e, requests.exceptions.RequestException) and not _is_transient(e))
+        raise
+    bcb_circuit.record(ticket, success=True)
+    if response.status_code == 404:
+        return None
+    with span("bcb_json"):
+        decoded = decode_sgs_payload(response.content)
+        if decoded is not None:
+            return sgs_frame_from_arrays(*decoded, codigo_sgs)
+        data = response.json() # Formato inesperado: caminho genérico
+        if not data: # Lista vazia retornada pela API
+            return None
+        return parse_sgs_payload(data, codigo_sgs)
+
+# --- Carga do Histórico em Blocos ---
+def _is_transient(error):
+    """Falha que vale repetir: timeout, conexão caída, 429 ou erro 5xx da API (não com o circuito aberto)."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+def download_sgs_retrying(codigo_sgs, start_date, end_date, session=None, retries=BACKFILL_RETRIES):
+    """download_sgs com novas tentativas (espera exponencial) nas falhas transitórias."""
+    for attempt in range(retries + 1):
+        try:
+            return download_sgs(codigo_sgs, start_date, end_date, session=session)
+        except requests.exceptions.RequestException as e:
+            if attempt == retries or not _is_transient(e):
+                raise
+            count("bcb_retentativas")
+            print(f"BCB ({codigo_sgs}): Falha transitória em {start_date}..{end_date}, tentando de novo - {e}")
+            time.sleep(BACKFILL_BACKOFF_SECONDS * 2 ** attempt)
+
+def date_chunks(start_date, end_date, years=BACKFILL_CHUNK_YEARS):
+    """Divide [start_date, end_date] em intervalos contíguos de até `years` anos."""
+    chunks = []
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        next_start = date(chunk_start.year + years, chunk_start.month, 1)
+        chunks.append((chunk_start, min(next_start - timedelta(days=1), end_date)))
+        chunk_start = next_start
+    return chunks
+
+def download_sgs_chunked(codigo_sgs, start_date, end_date, session=None,
+                         years=BACKFILL_CHUNK_YEARS, workers=BACKFILL_WORKERS):
+    """Baixa um intervalo longo em blocos de datas paralelos, com novas tentativas.
+
+    Os blocos são juntados numa única série, ordenada e sem meses repetidos.
+    Se algum bloco falhar de vez, a exceção é propagada (nada de série com
+    buracos). Retorna None se a API não tiver dados no intervalo.
+    """
+    if session is None:
+        session = get_http_session()
+    chunks = date_chunks(start_date, end_date, years)
+    if len(chunks) == 1:
+        return download_sgs_retrying(codigo_sgs, start_date, end_date, session=session)
+    with span("bcb_carga_blocos"), ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        frames = list(executor.map(lambda chunk: download_sgs_retrying(codigo_sgs, *chunk, session=session), chunks))
+    frames = [df for df in frames if df is not None and not df.empty]
+    if not frames:
+        return None
+    df = pd.concat(frames).sort_index()
+    return df[~df.index.duplicated(keep='last')]
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""Cache em memória, limitado em bytes, das séries SGS e das tabelas derivadas.
+
+Uma única cópia canônica por código SGS: consultas por "últimos N meses" ou por
+intervalo de datas são atendidas recortando essa cópia, sem nova busca. Séries e
+tabelas derivadas (acumulados 12m, simulações) dividem o mesmo orçamento de
+bytes (INDICE_CACHE_MAX_BYTES, padrão 64 MiB); ao estourar, sai o item usado há
+mais tempo (LRU). Faltas simultâneas da mesma chave são coalescidas: uma só carga
+roda e as demais esperam. Séries vencidas seguem sendo servidas enquanto são
+atualizadas em segundo plano e, com uma camada compartilhada (shared.py), cada
+atualização é feita por uma única réplica e lida pelas demais.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+SHARED_WAIT_SECONDS = 30 # Espera pela carga inicial que outra réplica já está fazendo
+FAILED_REFRESH_SECONDS = 60 # Nova tentativa depois de uma atualização que falhou
+
+def estimate_size(value):
+    """Tamanho aproximado em bytes de um valor em cache (DataFrames pelo conteúdo real)."""
+    if hasattr(value, "memory_usage"): # DataFrame / Series
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    if hasattr(value, "nbytes"): # ndarray
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if hasattr(value, "__slots__"):
+        return sum(estimate_size(getattr(value, slot, None)) for slot in value.__slots__)
+    return sys.getsizeof(value)
+
+class _Call:
+    """Carga em andamento de uma chave (resultado ou exceção compartilhados)."""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    """No máximo uma execução por chave ao mesmo tempo; chamadas concorrentes esperam o resultado dela."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+class LRUCache:
+    """Cache chave -> valor com orçamento de bytes e descarte do item usado há mais tempo."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # chave -> (valor, bytes, gravado_em)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_entry(self, key, max_age=None, count=True):
+        """(valor, gravado_em) da chave, ou None se ausente ou mais velha que max_age segundos."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (max_age is not None and time.monotonic() - entry[2] > max_age):
+                if count:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[0], entry[2]
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def put(self, key, value, size=None):
+        """Grava o valor, descartando os itens menos usados até caber no orçamento."""
+        size = estimate_size(value) if size is None else size
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                return # Maior que o orçamento inteiro: não guarda
+            while self._entries and self._bytes + size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+
+    def get_or_compute(self, key, compute, max_age=None, count=True):
+        """Valor da chave; se ausente (ou mais velho que max_age), calcula com compute(), grava e devolve.
+
+        Faltas simultâneas da mesma chave executam compute() uma única vez.
+        """
+        entry = self.get_entry(key, max_age, count)
+        if entry is not None:
+            return entry[0]
+
+        def load():
+            entry = self.get_entry(key, max_age, count=False) # Outra thread pode ter acabado de gravar
+            if entry is not None:
+                return entry[0]
+            value = compute()
+            self.put(key, value)
+            return value
+
+        return self._flight.do(key, load)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self, predicate=None):
+        """Remove todos os itens (ou só as chaves para as quais predicate(chave) é verdadeiro)."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate is None or predicate(k)]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        """Entradas, bytes usados, orçamento, acertos, faltas, descartes e cargas coalescidas."""
+        with self._lock:
+            return {
+                "entradas": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "acertos": self.hits,
+                "faltas": self.misses,
+                "descartes": self.evictions,
+                "coalescidas": self._flight.coalesced,
+            }
+
+# Cache do processo, compartilhado por séries e tabelas derivadas
+memory_cache = LRUCache(int(os.environ.get("INDICE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
+
+def cache_stats():
+    """Estatísticas do cache do processo."""
+    return memory_cache.stats()
+
+class SeriesCache:
+    """Histórico completo por código SGS, servido da memória e atualizado em segundo plano.
+
+    Uma série vencida continua sendo servida enquanto o `loader` busca a nova
+    versão numa thread à parte (stale-while-revalidate); só a primeira carga de
+    um código sem nada armazenado espera pelo BCB. Com `shared` (camada
+    compartilhada entre réplicas), uma série publicada por outra réplica dentro
+    do prazo é usada sem nova busca, e cada busca é publicada para as demais.
+    """
+
+    def __init__(self, loader, refresh_interval=3600, stored_loader=None, cache=None, shared=None):
+        self._loader = loader # loader(codigo_sgs, session=None) -> DataFrame ou None
+        self._stored_loader = stored_loader # stored_loader(codigo_sgs) -> DataFrame ou None, sem rede
+        # Segundos entre atualizações: número fixo ou refresh_interval(codigo_sgs, df)
+        self._refresh_interval = refresh_interval if callable(refresh_interval) else (lambda codigo_sgs, df: refresh_interval)
+        self._cache = memory_cache if cache is None else cache
+        self._shared = shared
+        self._failures = {} # codigo_sgs -> mensagem da última atualização que falhou
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def peek(self, codigo_sgs):
+        """(série, carregada_em) se em memória, mesmo vencida, sem carregar (None caso contrário)."""
+        return self._cache.get_entry(("serie", codigo_sgs), count=False)
+
+    def get(self, codigo_sgs, session=None):
+        """Série completa do código; se vencida, devolve a atual e agenda a atualização.
+
+        Sessões que pedem o mesmo código ao mesmo tempo esperam uma única carga.
+        """
+        entry = self._cache.get_entry(("serie", codigo_sgs))
+        if entry is None:
+            return self._cache.get_or_compute(
+                ("serie", codigo_sgs), lambda: self._load_initial(codigo_sgs, session), count=False
+            )
+        df, loaded_at = entry
+        interval = self._refresh_interval(codigo_sgs, df)
+        if codigo_sgs in self._failures:
+            interval = min(interval, FAILED_REFRESH_SECONDS)
+        if time.monotonic() - loaded_at > interval:
+            self.refresh_async(codigo_sgs)
+        return df
+
+    def _load_initial(self, codigo_sgs, session):
+        """Primeira carga: a camada compartilhada, o armazenamento local (ambos atualizados em segundo plano) ou o loader."""
+        shared = self._shared_entry(codigo_sgs)
+        if shared is not None:
+            df, fresh = shared
+            if not fresh:
+                self.refresh_async(codigo_sgs)
+            return df
+        df = self._stored_loader(codigo_sgs) if self._stored_loader else None
+        if df is None or df.empty:
+            return self._fetch(codigo_sgs, session, wait=True)
+        self.refresh_async(codigo_sgs)
+        return df
+
+    def _shared_entry(self, codigo_sgs):
+        """(série publicada na camada compartilhada, se ainda está no prazo de atualização), ou None."""
+        entry = self._shared.get(("serie", codigo_sgs)) if self._shared is not None else None
+        if entry is None:
+            return None
+        df, _, published_at = entry
+        return df, time.time() - published_at <= self._refresh_interval(codigo_sgs, df)
+
+    def _fetch(self, codigo_sgs, session=None, wait=False):
+        """Busca pelo loader e publica na camada compartilhada.
+
+        Se outra réplica já estiver buscando o mesmo código, não busca de novo:
+        com `wait`, espera a publicação dela (até SHARED_WAIT_SECONDS); sem, devolve None.
+        """
+        if self._shared is None:
+            return self._loader(codigo_sgs, session=session)
+        key = ("serie", codigo_sgs)
+        if not self._shared.lock(key):
+            deadline = time.monotonic() + (SHARED_WAIT_SECONDS if wait else 0)
+            while time.monotonic() < deadline:
+                time.sleep(0.5)
+                entry = self._shared.get(key)
+                if entry is not None:
+                    return entry[0]
+            if not wait:
+                return None
+            print(f"Cache BCB ({codigo_sgs}): Sem publicação da outra réplica, buscando diretamente")
+            return self._loader(codigo_sgs, session=session)
+        try:
+            df = self._loader(codigo_sgs, session=session)
+            if df is not None:
+                self._shared.publish(key, df)
+            return df
+        finally:
+            self._shared.unlock(key)
+
+    def refresh(self, codigo_sgs):
+        """Atualiza a série agora (na thread atual); em caso de falha mantém a versão em memória.
+
+        Uma versão publicada por outra réplica dentro do prazo dispensa a busca.
+        """
+        try:
+            shared = self._shared_entry(codigo_sgs)
+            df = shared[0] if shared is not None and shared[1] else self._fetch(codigo_sgs)
+        except Exception as e:
+            print(f"Cache BCB ({codigo_sgs}): Falha na atualização em segundo plano, mantendo a série atual - {e}")
+            self._failures[codigo_sgs] = str(e)
+            df = None
+        else:
+            if df is not None:
+                self._failures.pop(codigo_sgs, None)
+        if df is None:
+            entry = self._cache.get_entry(("serie", codigo_sgs), count=False)
+            if entry is None: # Série já descartada da memória: nada a manter, a próxima consulta carrega de novo
+                return
+            df = entry[0]
+        self._cache.put(("serie", codigo_sgs), df) # Também reinicia o prazo, evitando nova tentativa imediata
+
+    def refresh_async(self, codigo_sgs):
+        """Agenda a atualização numa thread em segundo plano (ignorado se já houver uma em andamento)."""
+        with self._lock:
+            if codigo_sgs in self._refreshing:
+                return
+            self._refreshing.add(codigo_sgs)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="atualiza-serie")
+        self._executor.submit(self._run_refresh, codigo_sgs)
+
+    def _run_refresh(self, codigo_sgs):
+        try:
+            self.refresh(codigo_sgs)
+        finally:
+            with self._lock:
+                self._refreshing.discard(codigo_sgs)
+
+    def failures(self):
+        """{codigo_sgs: erro} das séries servidas como última versão boa porque a atualização falhou."""
+        return dict(self._failures)
+
+    def invalidate(self, codigo_sgs=None):
+        """Descarta uma série (ou todas), forçando nova carga no próximo acesso."""
+        if codigo_sgs is None:
+            self._cache.clear(lambda key: key[0] == "serie")
+        else:
+            self._cache.pop(("serie", codigo_sgs))
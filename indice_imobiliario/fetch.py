@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""Busca de séries SGS (individual ou em paralelo) servida pelo histórico em memória.
+
+Nada aqui usa Streamlit: erros voltam como mensagens para quem chamou exibir.
+"""
+
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import date
+from functools import partial
+
+import pandas as pd
+import requests
+
+from .accumulation import build_number_index
+from .bcb import get_http_session
+from .cache import SeriesCache, memory_cache
+from .indices import INDICES_IDS, SGS_HISTORY_START
+from .metrics import count
+from .monthly import MonthlySeries
+from .schedule import refresh_interval
+from .shared import shared_cache
+from .store import load_sgs_store, sync_sgs_store
+
+# Histórico completo de cada código, compartilhado por todas as consultas do processo
+# e atualizado em segundo plano conforme o calendário de divulgação de cada índice
+# (com INDICE_SHARED_CACHE, também entre réplicas). Falhas de atualização chegam ao
+# cache, que mantém a última versão boa e a marca como desatualizada (stale_series)
+series_cache = SeriesCache(
+    partial(sync_sgs_store, keep_local_on_error=False), refresh_interval=refresh_interval,
+    stored_loader=load_sgs_store, shared=shared_cache
+)
+
+# Espera máxima pelas séries que ainda não estão em memória (segundos), por chamada
+# a fetch_sgs_many; fetch_deadline limita também a soma de várias chamadas
+FETCH_DEADLINE_SECONDS = float(os.environ.get("INDICE_FETCH_DEADLINE", 10))
+FETCH_WORKERS = max(len(INDICES_IDS), 4) # Cargas de séries ausentes em paralelo, no processo todo
+_deadline_scope = threading.local()
+_fetch_executor = None
+_loading = {} # codigo_sgs -> Future da carga em andamento (uma por código, reaproveitada por quem chegar depois)
+_loading_lock = threading.Lock()
+
+@contextmanager
+def fetch_deadline(seconds):
+    """Orçamento total de espera pelo BCB para todas as buscas do bloco (ex.: uma carga de página)."""
+    previous = getattr(_deadline_scope, "until", None)
+    until = time.monotonic() + seconds
+    _deadline_scope.until = until if previous is None else min(previous, until)
+    try:
+        yield
+    finally:
+        _deadline_scope.until = previous
+
+def _remaining_wait(deadline=None):
+    """Segundos de espera permitidos agora: o da chamada (ou o padrão), limitado pelo fetch_deadline ativo."""
+    remaining = FETCH_DEADLINE_SECONDS if deadline is None else deadline
+    until = getattr(_deadline_scope, "until", None)
+    if until is not None:
+        remaining = min(remaining, until - time.monotonic())
+    return max(remaining, 0.0)
+
+def stale_series():
+    """{codigo_sgs: (último mês 'AAAA-MM', erro)} das séries servidas como última versão boa."""
+    stale = {}
+    for codigo_sgs, error in series_cache.failures().items():
+        entry = series_cache.peek(codigo_sgs)
+        if entry is not None and entry[0] is not None and not entry[0].empty:
+            stale[codigo_sgs] = (entry[0].index[-1].strftime("%Y-%m"), error)
+    return stale
+
+def get_full_series(codigo_sgs, session=None):
+    """Histórico mensal completo de um código SGS (memória; se ausente, armazenamento local ou API)."""
+    return series_cache.get(codigo_sgs, session=session)
+
+def get_number_index(codigo_sgs):
+    """Número-índice encadeado da série completa do código (Series por data), em cache ao lado da série.
+
+    É recalculado só quando a série em memória é substituída (mês novo ou
+    revisão); a entrada guarda uma referência fraca à série de origem.
+    """
+    df = get_full_series(codigo_sgs)
+    if df is None or df.empty:
+        return None
+    entry = memory_cache.get(("numero_indice", codigo_sgs))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    number_index = build_number_index(df[f'sgs_{codigo_sgs}'])
+    memory_cache.put(("numero_indice", codigo_sgs), (weakref.ref(df), number_index), size=number_index.memory_usage())
+    return number_index
+
+def accumulated_inflation_window(codigo_sgs, first_date, last_date):
+    """Inflação acumulada (%) do código entre dois meses, inclusive, por uma divisão do número-índice.
+
+    Retorna None se não houver valores no intervalo.
+    """
+    number_index = get_number_index(codigo_sgs)
+    if number_index is None:
+        return None
+    start = number_index.index.searchsorted(pd.Timestamp(first_date), side='left')
+    end = number_index.index.searchsorted(pd.Timestamp(last_date), side='right') - 1
+    if end < start:
+        return None
+    base = number_index.iat[start - 1] if start > 0 else 1.0
+    return float((number_index.iat[end] / base - 1) * 100)
+
+def slice_series(df, period=None, start_date=None, end_date=None):
+    """Recorta a série completa: as últimas `period` observações ou o intervalo de datas (inclusive)."""
+    if period:
+        # Equivalente ao endpoint /ultimos/{period}: as últimas N observações
+        return df.iloc[-int(period):]
+    # Índice ordenado e sem datas repetidas (garantido pelo armazenamento local)
+    start = df.index.searchsorted(pd.Timestamp(start_date), side='left')
+    end = df.index.searchsorted(pd.Timestamp(end_date), side='right')
+    return df.iloc[start:end]
+
+def fetch_sgs_frame(codigo_sgs, period=None, start_date=None, end_date=None, session=None):
+    """Busca uma série SGS (seguro para threads), recortando o histórico completo em memória.
+
+    Retorna (DataFrame ou None, mensagem de erro ou None).
+    """
+    if not period and not (start_date and end_date):
+        print(f"Erro BCB ({codigo_sgs}): Nem 'period' nem 'start/end_date' fornecidos.")
+        return None, None # Precisa de um período ou datas
+
+    count("busca_serie_acertos" if series_cache.peek(codigo_sgs) is not None else "busca_serie_faltas")
+    try:
+        df = get_full_series(codigo_sgs, session=session)
+    except Exception as e:
+        return None, _fetch_error(codigo_sgs, e)
+    return _frame_result(codigo_sgs, df, period, start_date, end_date)
+
+def _fetch_error(codigo_sgs, error):
+    """Mensagem de erro de uma carga que falhou."""
+    if isinstance(error, requests.exceptions.Timeout):
+        return f"Erro BCB ({codigo_sgs}): Timeout ao acessar API."
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"Erro BCB ({codigo_sgs}): Erro na requisição - {error}"
+    return f"Erro processando dados BCB ({codigo_sgs}): {error}"
+
+def _frame_result(codigo_sgs, df, period, start_date, end_date):
+    """(recorte da série completa ou None, mensagem de erro ou None), como em fetch_sgs_frame."""
+    try:
+        if df is None or df.empty:
+            print(f"BCB ({codigo_sgs}): Nenhum dado retornado pela API para o período/datas.")
+            return None, None
+
+        df = slice_series(df, period, start_date, end_date)
+
+        if df.empty:
+             print(f"BCB ({codigo_sgs}): DataFrame vazio após filtro final de datas.")
+             return None, None
+
+        return df.copy(), None # Cópia: quem chamou pode alterar sem afetar o cache
+
+    except Exception as e:
+        return None, _fetch_error(codigo_sgs, e)
+
+def _load_in_background(codigo_sgs, session):
+    """Future da carga completa do código no executor do módulo (a em andamento, se houver)."""
+    global _fetch_executor
+    with _loading_lock:
+        future = _loading.get(codigo_sgs)
+        if future is None or future.done():
+            if _fetch_executor is None:
+                _fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="busca-serie")
+            future = _fetch_executor.submit(get_full_series, codigo_sgs, session)
+            _loading[codigo_sgs] = future
+    return future
+
+def fetch_sgs_many(codigos_sgs, period=None, start_date=None, end_date=None, deadline=None):
+    """Busca várias séries SGS; só as que não estão em memória vão à rede, em paralelo.
+
+    A espera pelas que vão à rede é limitada a `deadline` segundos (padrão
+    FETCH_DEADLINE_SECONDS, e nunca além do fetch_deadline ativo): as que não
+    chegarem a tempo voltam com mensagem de erro e continuam carregando em
+    segundo plano, prontas para a próxima consulta. As cargas rodam num
+    executor único do módulo (FETCH_WORKERS threads), com no máximo uma por
+    código, então consultas repetidas com a API lenta não acumulam threads.
+    Retorna ({codigo_sgs: DataFrame ou None}, [mensagens de erro]).
+    """
+    codigos_sgs = list(dict.fromkeys(codigos_sgs)) # Remove repetidos mantendo a ordem
+    results = {}
+    missing = []
+    for codigo_sgs in codigos_sgs:
+        if series_cache.peek(codigo_sgs) is not None or not (period or (start_date and end_date)):
+            results[codigo_sgs] = fetch_sgs_frame(codigo_sgs, period, start_date, end_date)
+        else:
+            missing.append(codigo_sgs)
+
+    if missing:
+        session = get_http_session()
+        timeout = _remaining_wait(deadline)
+        count("busca_serie_faltas", len(missing))
+        futures = {codigo_sgs: _load_in_background(codigo_sgs, session) for codigo_sgs in missing}
+        wait(futures.values(), timeout=timeout) # As cargas atrasadas seguem e preenchem o cache
+        for codigo_sgs, future in futures.items():
+            if future.done():
+                error = future.exception()
+                results[codigo_sgs] = (None, _fetch_error(codigo_sgs, error)) if error else _frame_result(
+                    codigo_sgs, future.result(), period, start_date, end_date
+                )
+            else:
+                count("busca_serie_tempo_esgotado")
+                results[codigo_sgs] = (None, (
+                    f"Erro BCB ({codigo_sgs}): Sem resposta em {timeout:.0f}s; "
+                    "a série continua carregando em segundo plano, tente de novo em instantes."
+                ))
+
+    fetched = {}
+    errors = []
+    for codigo_sgs in codigos_sgs:
+        df, error_msg = results[codigo_sgs]
+        if error_msg:
+            errors.append(error_msg)
+        fetched[codigo_sgs] = df
+    return fetched, errors
+
+def load_monthly_table(index_names=None, start_date=None, end_date=None, deadline=None):
+    """Tabela mensal (%) de vários índices, alinhada por mês (meses x nomes dos índices).
+
+    Por padrão traz o histórico completo de todos os índices de INDICES_IDS.
+    Retorna (DataFrame, [mensagens de erro]); índices sem dados ficam de fora.
+    """
+    index_names = list(INDICES_IDS) if index_names is None else list(index_names)
+    start_date = start_date or SGS_HISTORY_START
+    end_date = end_date or date.today()
+    fetched, errors = fetch_sgs_many(
+        [INDICES_IDS[name] for name in index_names], start_date=start_date, end_date=end_date, deadline=deadline
+    )
+    columns = {}
+    for name in index_names:
+        df = fetched.get(INDICES_IDS[name])
+        if df is not None and not df.empty:
+            columns[name] = df[f'sgs_{INDICES_IDS[name]}']
+    if not columns:
+        return pd.DataFrame(columns=index_names, dtype=float), errors
+    return pd.concat(columns, axis=1).sort_index(), errors
+
+def load_monthly_series(index_names=None, deadline=None):
+    """Histórico completo dos índices alinhado por ordinal de mês (MonthlySeries meses x índices).
+
+    Retorna (MonthlySeries, [mensagens de erro]); índices sem dados ficam de fora.
+    """
+    index_names = list(INDICES_IDS) if index_names is None else list(index_names)
+    fetched, errors = fetch_sgs_many(
+        [INDICES_IDS[name] for name in index_names], start_date=SGS_HISTORY_START, end_date=date.today(),
+        deadline=deadline
+    )
+    series = [
+        MonthlySeries.from_frame(fetched[INDICES_IDS[name]], names=(name,))
+        for name in index_names
+        if fetched.get(INDICES_IDS[name]) is not None and not fetched[INDICES_IDS[name]].empty
+    ]
+    return MonthlySeries.combine(series), errors
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Registro dos índices e seus códigos no SGS do BCB."""
+
+from collections import OrderedDict
+from datetime import date
+
+# --- Configuração Índices ---
+INDICES_IDS = OrderedDict([
+    ('IPCA', 433),
+    ('INPC', 188),
+    ('IGP-DI', 190),
+    ('INCC', 192),
+    ('IGP-M', 189),
+    ('IPC-FIPE', 191)
+])
+
+SGS_HISTORY_START = date(1994, 7, 1) # Pouco antes do Plano Real
+
+# --- Calendário de Divulgação ---
+# (meses após o mês de referência, dia aproximado da divulgação). Ex.: o IPCA de
+# março sai por volta do dia 10 de abril; o IGP-M fecha no fim do próprio mês e
+# aparece no SGS no início do seguinte.
+INDICES_RELEASE = OrderedDict([
+    ('IPCA', (1, 10)),
+    ('INPC', (1, 10)),
+    ('IGP-DI', (1, 8)),
+    ('INCC', (1, 8)),
+    ('IGP-M', (1, 1)),
+    ('IPC-FIPE', (1, 3))
+])
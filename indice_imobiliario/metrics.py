@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Medição de tempo por etapa e contadores, com exportação Prometheus ou JSON-lines.
+
+Uso:
+    with span("bcb_http"):
+        ...
+    count("busca_serie_acertos")
+
+Cada etapa guarda contagem, soma e as últimas durações (para p50/p99). Se a
+variável INDICE_METRICS_LOG apontar para um arquivo, cada medição também é
+gravada nele como uma linha JSON.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+RECENT_SAMPLES = 1024 # Durações recentes guardadas por etapa para os percentis
+QUANTILES = (0.5, 0.9, 0.99)
+
+def _quantile(sorted_values, q):
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+class MetricsRegistry:
+    """Durações por etapa e contadores do processo."""
+
+    def __init__(self, log_path=None):
+        self._lock = threading.Lock()
+        self._stages = {} # etapa -> [contagem, soma_segundos, deque de durações recentes]
+        self._counters = {}
+        self._log_path = log_path
+        self._log_file = None
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = [0, 0.0, deque(maxlen=RECENT_SAMPLES)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2].append(seconds)
+            if self._log_path:
+                self._write_log({"ts": round(time.time(), 3), "etapa": stage, "ms": round(seconds * 1000, 3)})
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    @contextmanager
+    def span(self, stage):
+        """Mede o bloco e registra a duração na etapa (mesmo se houver exceção)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def _write_log(self, record):
+        try:
+            if self._log_file is None:
+                self._log_file = open(self._log_path, "a", encoding="utf-8")
+            self._log_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._log_file.flush()
+        except OSError as e:
+            print(f"Métricas: Falha ao gravar {self._log_path}, log desativado - {e}")
+            self._log_path = None
+
+    def snapshot(self):
+        """{'etapas': {etapa: {contagem, total_ms, p50_ms, p90_ms, p99_ms}}, 'contadores': {...}}."""
+        with self._lock:
+            stages = {name: (n, total, sorted(recent)) for name, (n, total, recent) in self._stages.items()}
+            counters = dict(self._counters)
+        result = {}
+        for name, (n, total, recent) in sorted(stages.items()):
+            result[name] = {"contagem": n, "total_ms": total * 1000}
+            for q in QUANTILES:
+                result[name][f"p{int(q * 100)}_ms"] = _quantile(recent, q) * 1000
+        return {"etapas": result, "contadores": dict(sorted(counters.items()))}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+# Registro do processo, usado por todo o pacote
+metrics = MetricsRegistry(log_path=os.environ.get("INDICE_METRICS_LOG") or None)
+span = metrics.span
+count = metrics.count
+observe = metrics.observe
+
+def metrics_snapshot():
+    """Etapas, contadores e estatísticas do cache do processo."""
+    from .cache import cache_stats
+    snapshot = metrics.snapshot()
+    snapshot["cache"] = cache_stats()
+    return snapshot
+
+def prometheus_text():
+    """Métricas no formato texto de exposição do Prometheus."""
+    snapshot = metrics_snapshot()
+    lines = [
+        "# HELP indice_etapa_segundos Duração de cada etapa (quantis sobre as medições recentes).",
+        "# TYPE indice_etapa_segundos summary",
+    ]
+    for stage, values in snapshot["etapas"].items():
+        for q in QUANTILES:
+            lines.append(f'indice_etapa_segundos{{etapa="{stage}",quantile="{q}"}} {values[f"p{int(q * 100)}_ms"] / 1000:.6f}')
+        lines.append(f'indice_etapa_segundos_sum{{etapa="{stage}"}} {values["total_ms"] / 1000:.6f}')
+        lines.append(f'indice_etapa_segundos_count{{etapa="{stage}"}} {values["contagem"]}')
+    lines += ["# HELP indice_eventos_total Contadores de eventos.", "# TYPE indice_eventos_total counter"]
+    for name, value in snapshot["contadores"].items():
+        lines.append(f'indice_eventos_total{{evento="{name}"}} {value}')
+    lines += ["# HELP indice_cache Estado do cache em memória.", "# TYPE indice_cache gauge"]
+    for name, value in snapshot["cache"].items():
+        lines.append(f'indice_cache{{campo="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
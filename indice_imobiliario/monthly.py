@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Séries mensais indexadas por ordinal de mês, sem DatetimeIndex nem Period.
+
+Cada mês é um inteiro (ano * 12 + mês - 1) e as séries ficam numa grade
+contínua de meses, de modo que localizar um mês é uma subtração e recortar um
+período é uma fatia do array, sem cópia. Só na hora de exibir é que se volta
+para DataFrame (to_frame).
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+def month_ordinal(value):
+    """Ordinal do mês de uma data, Timestamp ou texto 'AAAA-MM' / 'AAAA-MM-DD'."""
+    if isinstance(value, str):
+        year, month = int(value[0:4]), int(value[5:7])
+        if not 1 <= month <= 12:
+            raise ValueError(f"Mês inválido: {value}")
+        return year * 12 + month - 1
+    return value.year * 12 + value.month - 1
+
+def ordinal_label(ordinal):
+    """Texto 'AAAA-MM' de um ordinal de mês."""
+    return f"{ordinal // 12:04d}-{ordinal % 12 + 1:02d}"
+
+def month_start(ordinal):
+    """Timestamp do primeiro dia do mês do ordinal."""
+    return pd.Timestamp(year=int(ordinal) // 12, month=int(ordinal) % 12 + 1, day=1)
+
+def ordinals_to_datetime64(ordinals):
+    """Array de ordinais -> datetime64[ns] do primeiro dia de cada mês (vetorizado)."""
+    return (np.asarray(ordinals, dtype=np.int64) - 1970 * 12).astype("datetime64[M]").astype("datetime64[ns]")
+
+def index_ordinals(index):
+    """Ordinais de mês de um DatetimeIndex ou PeriodIndex mensal."""
+    return np.asarray(index.year, dtype=np.int64) * 12 + np.asarray(index.month, dtype=np.int64) - 1
+
+class MonthlySeries:
+    """Uma ou mais séries mensais alinhadas (meses x nomes) numa grade contínua de ordinais. Imutável.
+
+    `values` é um array float64 somente leitura; meses sem valor são NaN.
+    """
+
+    __slots__ = ("names", "first_ordinal", "values", "_positions", "_digest")
+
+    def __init__(self, names, first_ordinal, values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        values = values.view()
+        values.flags.writeable = False
+        names = tuple(names)
+        if values.shape[1] != len(names):
+            raise ValueError(f"{len(names)} nomes para {values.shape[1]} colunas")
+        object.__setattr__(self, "names", names)
+        object.__setattr__(self, "first_ordinal", int(first_ordinal))
+        object.__setattr__(self, "values", values)
+        object.__setattr__(self, "_positions", {name: i for i, name in enumerate(names)})
+        object.__setattr__(self, "_digest", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MonthlySeries é imutável")
+
+    def __reduce__(self):
+        return (MonthlySeries, (self.names, self.first_ordinal, np.array(self.values)))
+
+    @classmethod
+    def from_frame(cls, df, names=None):
+        """Converte um DataFrame/Series mensal (DatetimeIndex ou PeriodIndex); meses ausentes viram NaN."""
+        if isinstance(df, pd.Series):
+            df = df.to_frame()
+        names = tuple(df.columns) if names is None else tuple(names)
+        if df.empty:
+            return cls(names, 0, np.empty((0, len(names))))
+        ordinals = index_ordinals(df.index)
+        first = int(ordinals.min())
+        grid = np.full((int(ordinals.max()) - first + 1, len(names)), np.nan)
+        rows, keep = np.unique(ordinals - first, return_index=True) # Mês repetido: fica o primeiro
+        grid[rows] = df.to_numpy(dtype=float)[keep]
+        return cls(names, first, grid)
+
+    @classmethod
+    def combine(cls, series_list):
+        """Alinha várias MonthlySeries na grade de meses que cobre todas (colunas na ordem dada)."""
+        series_list = [s for s in series_list if len(s.names)]
+        names = tuple(name for s in series_list for name in s.names)
+        if not series_list:
+            return cls(names, 0, np.empty((0, 0)))
+        non_empty = [s for s in series_list if len(s)]
+        if not non_empty:
+            return cls(names, 0, np.empty((0, len(names))))
+        first = min(s.first_ordinal for s in non_empty)
+        last = max(s.last_ordinal for s in non_empty)
+        grid = np.full((last - first + 1, len(names)), np.nan)
+        col = 0
+        for s in series_list:
+            start = s.first_ordinal - first
+            grid[start:start + len(s), col:col + len(s.names)] = s.values
+            col += len(s.names)
+        return cls(names, first, grid)
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def __repr__(self):
+        if not len(self):
+            return f"MonthlySeries({list(self.names)}, vazia)"
+        return f"MonthlySeries({list(self.names)}, {ordinal_label(self.first_ordinal)} a {ordinal_label(self.last_ordinal)})"
+
+    @property
+    def last_ordinal(self):
+        return self.first_ordinal + len(self) - 1
+
+    @property
+    def ordinals(self):
+        return np.arange(self.first_ordinal, self.first_ordinal + len(self), dtype=np.int64)
+
+    def digest(self):
+        """Identificador do conteúdo (nomes, meses e valores), para chavear caches; calculado uma vez."""
+        if self._digest is None:
+            h = hashlib.blake2b(repr((self.names, self.first_ordinal, self.values.shape)).encode("utf-8"), digest_size=16)
+            h.update(np.ascontiguousarray(self.values).tobytes())
+            object.__setattr__(self, "_digest", h.digest())
+        return self._digest
+
+    def position(self, ordinal):
+        """Linha do mês na grade (None se fora do período)."""
+        row = ordinal - self.first_ordinal
+        return row if 0 <= row < len(self) else None
+
+    def value(self, name, ordinal):
+        """Valor de uma série num mês (NaN se fora do período)."""
+        row = self.position(ordinal)
+        return float(self.values[row, self._positions[name]]) if row is not None else float("nan")
+
+    def column(self, name):
+        """Valores de uma série (vista 1-D, sem cópia)."""
+        return self.values[:, self._positions[name]]
+
+    def select(self, names):
+        """Subconjunto das séries, na ordem dada (vista sem cópia quando as colunas são contíguas)."""
+        positions = [self._positions[name] for name in names]
+        if positions and positions == list(range(positions[0], positions[0] + len(positions))):
+            values = self.values[:, positions[0]:positions[0] + len(positions)]
+        else:
+            values = self.values[:, positions]
+        return MonthlySeries(names, self.first_ordinal, values)
+
+    def slice(self, start_ordinal=None, end_ordinal=None):
+        """Meses entre dois ordinais, inclusive (vista sem cópia; limitado ao período disponível)."""
+        start = 0 if start_ordinal is None else min(max(start_ordinal - self.first_ordinal, 0), len(self))
+        end = len(self) if end_ordinal is None else min(max(end_ordinal - self.first_ordinal + 1, start), len(self))
+        return MonthlySeries(self.names, self.first_ordinal + start, self.values[start:end])
+
+    def take(self, ordinals, names=None):
+        """Valores nos meses pedidos (meses x séries); NaN para meses fora do período."""
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        values = self.values if names is None else self.values[:, [self._positions[name] for name in names]]
+        rows = ordinals - self.first_ordinal
+        inside = (rows >= 0) & (rows < len(self))
+        result = np.full((len(ordinals), values.shape[1]), np.nan)
+        result[inside] = values[rows[inside]]
+        return result
+
+    def with_values(self, values):
+        """Nova série na mesma grade e com os mesmos nomes, com outros valores."""
+        return MonthlySeries(self.names, self.first_ordinal, values)
+
+    def to_frame(self):
+        """DataFrame (meses x séries) indexado pelo primeiro dia de cada mês, para exibição."""
+        index = pd.DatetimeIndex(ordinals_to_datetime64(self.ordinals), name="data")
+        return pd.DataFrame(np.array(self.values), index=index, columns=list(self.names))
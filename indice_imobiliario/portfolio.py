@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Reajuste em lote de uma carteira de contratos, distribuído em vários processos.
+
+Uso:
+    python -m indice_imobiliario.portfolio contratos.csv -o resultado.csv --workers 8
+
+Colunas de entrada (CSV ou Parquet): id_contrato, aluguel_inicial, data_inicio,
+data_fim, indice. As tabelas dos índices são carregadas uma única vez e enviadas
+a cada processo; os contratos são lidos e gravados em blocos, de modo que a
+memória usada não cresce com o tamanho da carteira. Parquet requer pyarrow.
+"""
+
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .simulation import RentScenario, build_rent_scenarios, simulate_rent_scenarios
+from .tables import get_rolling_12m_table
+
+INPUT_COLUMNS = ("id_contrato", "aluguel_inicial", "data_inicio", "data_fim", "indice")
+OUTPUT_COLUMNS = (
+    "id_contrato", "indice", "aluguel_final", "total_pago",
+    "melhor_cenario", "total_pago_melhor", "diferenca_melhor", "status",
+)
+
+# Estado de cada processo de trabalho (definido por _init_worker)
+_worker_table = None
+_worker_scenarios = {}
+
+def _require_pyarrow():
+    """Importa pyarrow.parquet (dependência opcional, só para arquivos Parquet)."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Arquivos Parquet exigem o pacote 'pyarrow' (pip install pyarrow).")
+    return pq
+
+def adjust_contract(rolling_table, initial_rent, start_date, end_date, index_name, scenarios=None):
+    """Reajusta um contrato e compara com os demais cenários (índices, médias e mínimos).
+
+    Retorna uma tupla na ordem de OUTPUT_COLUMNS (sem o id do contrato).
+    """
+    if index_name not in rolling_table:
+        return (index_name, None, None, None, None, None, f"Erro: índice '{index_name}' sem dados")
+    if pd.isna(start_date) or pd.isna(end_date) or pd.isna(initial_rent):
+        return (index_name, None, None, None, None, None, "Erro: aluguel ou datas inválidos")
+    if scenarios is None:
+        scenarios = build_rent_scenarios(rolling_table.names, exclude_base=index_name)
+
+    # O cenário real é o primeiro da matriz; os alternativos vêm em seguida
+    months, _, rent, total_paid = simulate_rent_scenarios(
+        initial_rent, start_date, end_date, [RentScenario("base", (index_name,))] + scenarios, rolling_table
+    )
+    if not len(months):
+        return (index_name, None, None, None, None, None, "Erro: período do contrato vazio")
+
+    final_rent, actual_total = float(rent[0, -1]), float(total_paid[0])
+    if not scenarios:
+        return (index_name, final_rent, actual_total, None, None, None, "Calculado")
+    best = 1 + int(np.argmin(total_paid[1:]))
+    best_total = float(total_paid[best])
+    return (index_name, final_rent, actual_total, scenarios[best - 1].label, best_total, best_total - actual_total, "Calculado")
+
+def _init_worker(rolling_table):
+    """Recebe a tabela de acumulados 12m uma única vez por processo."""
+    global _worker_table
+    _worker_table = rolling_table
+    _worker_scenarios.clear()
+
+def _process_chunk(records):
+    """Processa um bloco de contratos no processo de trabalho."""
+    rows = []
+    for contract_id, initial_rent, start_date, end_date, index_name in records:
+        if index_name not in _worker_scenarios and index_name in _worker_table:
+            _worker_scenarios[index_name] = build_rent_scenarios(_worker_table.names, exclude_base=index_name)
+        try:
+            result = adjust_contract(
+                _worker_table, initial_rent, start_date, end_date, index_name, _worker_scenarios.get(index_name)
+            )
+        except Exception as e:
+            result = (index_name, None, None, None, None, None, f"Erro: {e}")
+        rows.append((contract_id,) + result)
+    return rows
+
+def _iter_contract_chunks(path, chunk_size):
+    """Lê a carteira em blocos de até chunk_size contratos."""
+    if path.lower().endswith(".parquet"):
+        pq = _require_pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=list(INPUT_COLUMNS)):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(
+            path, chunksize=chunk_size, usecols=list(INPUT_COLUMNS),
+            dtype={"id_contrato": str, "indice": str}
+        )
+
+def _chunk_records(chunk):
+    """Converte um bloco lido em registros simples (datas já convertidas) para o processo de trabalho."""
+    return list(zip(
+        chunk["id_contrato"],
+        pd.to_numeric(chunk["aluguel_inicial"], errors="coerce"),
+        pd.to_datetime(chunk["data_inicio"], errors="coerce"),
+        pd.to_datetime(chunk["data_fim"], errors="coerce"),
+        chunk["indice"].astype(str).str.strip(),
+    ))
+
+class _ResultWriter:
+    """Grava os resultados em blocos, em CSV ou Parquet (pela extensão do arquivo)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._parquet_writer = None
+        self._header_written = False
+
+    def write(self, rows):
+        df = pd.DataFrame(rows, columns=list(OUTPUT_COLUMNS))
+        if self.path.lower().endswith(".parquet"):
+            pq = _require_pyarrow()
+            import pyarrow as pa
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode="a" if self._header_written else "w",
+                      header=not self._header_written, index=False, float_format="%.2f")
+            self._header_written = True
+        return len(df)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def run_portfolio(input_path, output_path, workers=None, chunk_size=1000):
+    """Processa a carteira inteira e devolve o número de contratos gravados."""
+    rolling_table, errors = get_rolling_12m_table()
+    for error_msg in errors:
+        print(error_msg)
+    if not len(rolling_table):
+        raise SystemExit("Nenhum dado de índice disponível para calcular os reajustes.")
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = 2 * workers # Limita os blocos em memória (lidos e ainda não gravados)
+    pending = deque()
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rolling_table,)) as pool, \
+            _ResultWriter(output_path) as writer:
+        for chunk in _iter_contract_chunks(input_path, chunk_size):
+            pending.append(pool.submit(_process_chunk, _chunk_records(chunk)))
+            if len(pending) >= max_pending:
+                written += writer.write(pending.popleft().result())
+        while pending:
+            written += writer.write(pending.popleft().result())
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reajuste em lote de contratos de aluguel.")
+    parser.add_argument("entrada", help="Carteira de contratos (.csv ou .parquet)")
+    parser.add_argument("-o", "--saida", required=True, help="Arquivo de resultado (.csv ou .parquet)")
+    parser.add_argument("--workers", type=int, default=None, help="Número de processos (padrão: núcleos da CPU)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Contratos por bloco (padrão: 1000)")
+    args = parser.parse_args(argv)
+
+    written = run_portfolio(args.entrada, args.saida, workers=args.workers, chunk_size=args.chunk_size)
+    print(f"Contratos processados: {written}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Projeção Monte Carlo dos reajustes para os meses do contrato ainda sem dado.
+
+Os meses futuros de todos os índices são sorteados juntos por bootstrap em
+blocos do histórico mensal: cada bloco é um trecho de meses consecutivos em
+que todos os índices têm valor, copiado inteiro para o caminho simulado, o que
+preserva a correlação entre os índices e a persistência de curto prazo da
+inflação. Os caminhos (caminhos x meses x índices) passam pelas mesmas regras
+da calculadora em arrays inteiros, sem laço por caminho, e o resultado são os
+percentis do aluguel mês a mês e do total pago.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .cache import memory_cache
+from .metrics import span
+from .monthly import MonthlySeries, month_ordinal
+from .search import _segments, _total_paid
+from .simulation import (
+    _scenario_adjustments,
+    build_rolling_12m_table,
+    get_adjustment_schedule,
+    scenario_kernel,
+    scenario_membership,
+)
+
+DEFAULT_PATHS = 2000
+DEFAULT_BLOCK_MONTHS = 12
+DEFAULT_PERCENTILES = (5, 50, 95)
+BOOTSTRAP_START = "2000-01" # Fora do sorteio: a transição do Plano Real e a crise cambial de 1999
+
+def bootstrap_monthly_paths(values, n_paths, n_months, block_months=DEFAULT_BLOCK_MONTHS, seed=0):
+    """Caminhos futuros (caminhos x meses x índices) por bootstrap em blocos das linhas completas de `values`.
+
+    values: histórico mensal (%) em meses consecutivos x índices. Os blocos só
+    começam onde há `block_months` meses seguidos sem NaN em nenhum índice.
+    """
+    complete = ~np.isnan(values).any(axis=1)
+    block_months = min(block_months, int(complete.sum()))
+    if block_months < 1:
+        raise ValueError("Histórico sem nenhum mês com todos os índices para o bootstrap")
+    # Início válido: o bloco inteiro é completo (soma móvel das linhas completas)
+    complete_run = np.convolve(complete, np.ones(block_months, dtype=np.int64), mode="valid")
+    starts = np.flatnonzero(complete_run == block_months)
+    if not len(starts): # Nenhum trecho contínuo longo o bastante: blocos de um mês
+        starts, block_months = np.flatnonzero(complete), 1
+
+    rng = np.random.default_rng(seed)
+    n_blocks = -(-n_months // block_months)
+    chosen = rng.choice(starts, size=(n_paths, n_blocks))
+    rows = (chosen[..., None] + np.arange(block_months)).reshape(n_paths, -1)[:, :n_months]
+    return values[rows] # Mesma linha para todos os índices: correlação preservada
+
+def project_rent_paths(start_date, end_date, scenarios, monthly, n_paths=DEFAULT_PATHS,
+                       block_months=DEFAULT_BLOCK_MONTHS, percentiles=DEFAULT_PERCENTILES, seed=0,
+                       history_start=BOOTSTRAP_START):
+    """Percentis do aluguel unitário (aluguel inicial = 1) com os meses futuros projetados.
+
+    monthly: valores mensais (%) dos índices (MonthlySeries). Os meses até o
+    último com todos os índices do cenário ficam com o dado real; depois dele,
+    cada caminho usa o valor real quando já divulgado e o sorteado nos demais.
+    Retorna (meses do contrato, percentis do aluguel (percentis x cenários x
+    meses), percentis do total pago (percentis x cenários), primeiro mês
+    projetado).
+    """
+    names = [name for name in monthly.names if any(name in sc.indices for sc in scenarios)]
+    missing = sorted({name for sc in scenarios for name in sc.indices} - set(names))
+    if missing:
+        raise ValueError(f"Sem dados mensais para projetar: {', '.join(missing)}")
+    monthly = monthly.select(names)
+    months, is_anniversary, index_months = get_adjustment_schedule(start_date, end_date)
+
+    # Último mês com todos os índices: daí em diante entra a projeção
+    complete_rows = np.flatnonzero(~np.isnan(monthly.values).any(axis=1))
+    last_complete = monthly.first_ordinal + int(complete_rows[-1]) if len(complete_rows) else monthly.first_ordinal - 1
+    future = is_anniversary & (index_months > last_complete)
+
+    # Reajustes só nos aniversários (caminhos x cenários x aniversários); os com dado
+    # real seguem as mesmas regras (e o mesmo tratamento de NaN) da calculadora
+    rolling = memory_cache.get_or_compute(("rolling_12m", monthly.digest()), lambda: build_rolling_12m_table(monthly))
+    adjustment = _scenario_adjustments(scenarios, rolling, is_anniversary & ~future, index_months)[:, is_anniversary]
+    adjustment = np.broadcast_to(adjustment, (n_paths,) + adjustment.shape).copy()
+
+    if future.any():
+        n_future = int(index_months[future].max() - last_complete)
+        history = monthly.slice(month_ordinal(history_start) if history_start else None, last_complete).values
+        with span("projecao_bootstrap"):
+            simulated = bootstrap_monthly_paths(history, n_paths, n_future, block_months, seed)
+        # Valores já divulgados depois do último mês completo prevalecem sobre os sorteados
+        released = monthly.take(np.arange(last_complete + 1, last_complete + n_future + 1))
+        simulated = np.where(np.isnan(released), simulated, released)
+        # Os 11 meses reais anteriores completam a janela de 12 do primeiro mês projetado
+        recent = monthly.take(np.arange(last_complete - 10, last_complete + 1))
+        factors = 1 + np.concatenate((np.broadcast_to(recent, (n_paths,) + recent.shape), simulated), axis=1) / 100
+        rolling_future = (sliding_window_view(factors, 12, axis=1).prod(axis=-1) - 1) * 100 # (caminhos x meses x índices)
+        accum_values = rolling_future[:, index_months[future] - last_complete - 1]
+        membership = scenario_membership(scenarios, names)
+        adjustment[:, :, future[is_anniversary]] = scenario_kernel(scenarios, membership, accum_values)
+
+    # O aluguel é constante entre aniversários: percentis por nível, sem array (caminhos x meses)
+    adjustment = np.nan_to_num(adjustment, nan=0.0)
+    levels = np.cumprod(np.concatenate((np.zeros(adjustment.shape[:2] + (1,)), adjustment), axis=-1) / 100 + 1, axis=-1)
+    total_paid = _total_paid(1.0, _segments(is_anniversary), adjustment)
+    rent = np.percentile(levels, percentiles, axis=0)[..., np.cumsum(is_anniversary)]
+    first_projected = int(months[future][0]) if future.any() else None
+    return months, rent, np.percentile(total_paid, percentiles, axis=0), first_projected
+
+def project_rent_scenarios(start_rent, start_date, end_date, scenarios, monthly, n_paths=DEFAULT_PATHS,
+                           block_months=DEFAULT_BLOCK_MONTHS, percentiles=DEFAULT_PERCENTILES, seed=0):
+    """project_rent_paths em cache (memory_cache) e reescalado pelo aluguel inicial.
+
+    Com semente fixa, a mesma consulta dá sempre os mesmos percentis; a chave
+    inclui a versão dos dados mensais, então um mês novo refaz a projeção.
+    """
+    if not isinstance(monthly, MonthlySeries):
+        monthly = MonthlySeries.from_frame(monthly)
+    scenarios, percentiles = tuple(scenarios), tuple(percentiles)
+    key = ("projecao", scenarios, month_ordinal(start_date), start_date.day > 1, month_ordinal(end_date),
+           monthly.digest(), n_paths, block_months, percentiles, seed)
+
+    def compute():
+        with span("projecao_monte_carlo"):
+            return project_rent_paths(start_date, end_date, scenarios, monthly, n_paths, block_months, percentiles, seed)
+
+    months, rent, total_paid, first_projected = memory_cache.get_or_compute(key, compute)
+    return months, start_rent * rent, start_rent * total_paid, first_projected
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Frequência de atualização de cada série conforme o calendário de divulgação.
+
+Os índices saem no máximo uma vez por mês: perto da data esperada (ou enquanto o
+mês esperado não chegou ao SGS) a série é consultada com frequência; no resto do
+mês, só raramente (cada consulta também rebusca os últimos meses armazenados
+para pegar revisões; ver store.REVISION_MONTHS).
+"""
+
+from datetime import date, timedelta
+
+from .indices import INDICES_IDS, INDICES_RELEASE
+
+RELEASE_LEAD_DAYS = 3 # Começa a consultar alguns dias antes da data esperada
+DUE_REFRESH_SECONDS = 15 * 60 # Divulgação esperada e ainda não recebida
+IDLE_REFRESH_SECONDS = 12 * 3600 # Fora da janela de divulgação
+
+_RELEASE_BY_CODE = {INDICES_IDS[name]: release for name, release in INDICES_RELEASE.items()}
+
+def _release_date(ordinal, months_after, day):
+    """Data esperada de divulgação do mês de referência (ordinal = ano * 12 + mês - 1)."""
+    year, month = divmod(ordinal + months_after, 12)
+    return date(year, month + 1, 1) + timedelta(days=day - 1)
+
+def expected_last_month(codigo_sgs, today=None):
+    """Ordinal do último mês de referência que já deveria estar no SGS (None se o código não tiver calendário)."""
+    release = _RELEASE_BY_CODE.get(codigo_sgs)
+    if release is None:
+        return None
+    months_after, day = release
+    today = today or date.today()
+    ordinal = today.year * 12 + today.month - 1 - months_after + 1
+    while _release_date(ordinal, months_after, day) - timedelta(days=RELEASE_LEAD_DAYS) > today:
+        ordinal -= 1
+    return ordinal
+
+def refresh_interval(codigo_sgs, df, today=None):
+    """Segundos até a próxima consulta ao BCB para a série `df` do código."""
+    expected = expected_last_month(codigo_sgs, today)
+    if expected is None or df is None or df.empty:
+        return DUE_REFRESH_SECONDS
+    last = df.index[-1]
+    return DUE_REFRESH_SECONDS if last.year * 12 + last.month - 1 < expected else IDLE_REFRESH_SECONDS
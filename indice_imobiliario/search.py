@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""Busca exata da melhor regra de reajuste entre todos os subconjuntos de índices.
+
+Para cada regra de agregação (média, mínimo, mediana, média aparada) encontra o
+subconjunto de índices com o menor total pago ('barato') ou com o total mais
+próximo de um valor de referência ('justo'), sem enumerar os 2^n subconjuntos:
+a busca em profundidade descarta ramos cujo limite já não supera o melhor
+encontrado. No objetivo 'justo', uma tolerância opcional (em R$) encerra a
+busca ao achar um total tão perto da referência, o que evita varrer milhares
+de subconjuntos por diferenças de centavos; sem ela (padrão) a busca é exata.
+
+O limite vale porque toda regra é simétrica e não decrescente em cada valor:
+entre os conjuntos que contêm os índices já escolhidos e mais k índices, o
+menor (maior) reajuste possível em cada aniversário vem de acrescentar os k
+menores (maiores) valores restantes daquele aniversário, e o total pago cresce
+com cada reajuste. Com os restantes ordenados, somas por prefixo dão esses
+extremos para todo k de uma vez; um ramo é descartado quando, em todos os
+tamanhos, o intervalo [menor, maior] de totais não chega mais perto do alvo
+que o melhor já encontrado.
+
+Mesmo com a poda, a busca 'justo' exata cresce exponencialmente quando o alvo
+fica no meio dos totais possíveis (muitos conjuntos chegam perto dele); para
+muitos índices, max_nodes ou max_seconds limitam a busca e devolvem o melhor
+encontrado até ali.
+"""
+
+import time
+
+import numpy as np
+
+from .metrics import span
+from .monthly import MonthlySeries
+from .simulation import AGGREGATIONS, RentScenario, aggregate_adjustments, get_adjustment_schedule
+
+OBJECTIVES = ("barato", "justo")
+
+def _segments(is_anniversary):
+    """Meses pagos em cada nível de aluguel: antes do 1º aniversário, entre aniversários e após o último."""
+    positions = np.flatnonzero(is_anniversary)
+    return np.diff(np.concatenate(([0], positions, [len(is_anniversary)])))
+
+def _total_paid(start_rent, segments, perc):
+    """Total pago dados os reajustes % por aniversário (último eixo); cresce com cada reajuste."""
+    levels = np.cumprod(1 + perc / 100, axis=-1)
+    return start_rent * (segments[0] + (levels * segments[1:]).sum(axis=-1))
+
+def _trimmed_mean(total, lowest, highest, size):
+    """Média aparada a partir da soma, do menor e do maior valor e da quantidade (como em aggregate_adjustments)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(size >= 3, (total - lowest - highest) / (size - 2), total / size)
+
+def _median_range(chosen, rest, ks):
+    """Mediana por aniversário de `chosen` mais os k menores e mais os k maiores de `rest`, para cada k.
+
+    rest está em ordem crescente. Percorre uma vez a união ordenada de chosen e
+    rest: a quantidade de valores mantidos até cada posição é a de escolhidos
+    mais, dos restantes, os k primeiros (ou os k últimos), sem ordenar de novo.
+    Retorna (menor, maior), cada um (k x aniversários).
+    """
+    m, r = chosen.shape[1], rest.shape[1]
+    merged = np.concatenate((chosen, rest), axis=1)
+    order = np.argsort(merged, axis=1, kind="stable")
+    ordered = np.take_along_axis(merged, order, axis=1)
+    from_rest = order >= m
+    seen_chosen = np.cumsum(~from_rest, axis=1)
+    seen_rest = np.cumsum(from_rest, axis=1)
+    k = ks[:, None, None]
+    size = (m + ks)[:, None, None]
+    rows = np.arange(len(merged))
+
+    def median(seen):
+        lower = np.argmax(seen > (size - 1) // 2, axis=2)
+        upper = np.argmax(seen > size // 2, axis=2)
+        return (ordered[rows, lower] + ordered[rows, upper]) / 2
+
+    return (median(seen_chosen + np.minimum(seen_rest, k)),
+            median(seen_chosen + np.maximum(seen_rest - (r - k), 0)))
+
+class _RuleSearch:
+    """Busca em profundidade com poda para uma regra e um objetivo, com orçamento opcional de nós e de tempo."""
+
+    def __init__(self, values, kind, cost, objective, target, min_size, tolerance=0.0, max_nodes=None, deadline=None):
+        self.values = values # (aniversários x índices elegíveis)
+        self.kind = kind
+        self.cost = cost
+        self.objective = objective
+        self.target = target
+        self.min_size = min_size
+        self.stop_score = 0.0 if objective == "barato" else tolerance # Pontuação que já encerra a busca
+        self.max_nodes = max_nodes
+        self.deadline = deadline # time.monotonic() limite
+        self.best_score = np.inf
+        self.best_set = None
+        self.best_total = None
+        self.nodes = 0
+        self.pruned = 0
+        self.stopped = False # Orçamento esgotado: o melhor encontrado pode não ser o ótimo
+
+    def _score(self, total):
+        return total if self.objective == "barato" else abs(total - self.target)
+
+    def _adjustment_range(self, included, remaining):
+        """Para cada k, menor e maior reajuste por aniversário entre os conjuntos `included` + k restantes.
+
+        Com os restantes em ordem crescente em cada aniversário, os extremos vêm
+        dos k menores e dos k maiores (toda regra é simétrica e não decrescente em
+        cada valor); somas por prefixo dão a média e a média aparada de todos os k
+        de uma vez. Retorna (ks, menor, maior), os dois últimos (k x aniversários);
+        k = 0 (o próprio conjunto) só se já houver escolhidos.
+        """
+        chosen = self.values[:, included]
+        if not remaining:
+            perc = aggregate_adjustments(chosen, self.kind)[None]
+            return np.zeros(1, dtype=np.int64), perc, perc
+        rest = np.sort(self.values[:, remaining], axis=1)
+        m, r = chosen.shape[1], rest.shape[1]
+        ks = np.arange(0 if m else 1, r + 1)
+        size = (m + ks)[:, None]
+        has_rest = (ks > 0)[:, None]
+        if self.kind == "mediana":
+            return (ks,) + _median_range(chosen, rest, ks)
+
+        outside = np.full(len(rest), np.inf)
+        chosen_min = chosen.min(axis=1) if m else outside
+        chosen_max = chosen.max(axis=1) if m else -outside
+        low_min = np.where(has_rest, np.minimum(chosen_min, rest[:, 0]), chosen_min)
+        high_min = np.where(has_rest, np.minimum(chosen_min, rest[:, np.minimum(r - ks, r - 1)].T), chosen_min)
+        if self.kind == "minimo":
+            return ks, low_min, high_min
+
+        prefix = np.zeros((len(rest), r + 1))
+        np.cumsum(rest, axis=1, out=prefix[:, 1:])
+        chosen_sum = chosen.sum(axis=1)
+        low_sum = chosen_sum + prefix[:, ks].T # k menores
+        high_sum = chosen_sum + (prefix[:, -1:] - prefix[:, r - ks]).T # k maiores
+        if self.kind == "media":
+            return ks, low_sum / size, high_sum / size
+        if self.kind == "media_aparada":
+            low_max = np.where(has_rest, np.maximum(chosen_max, rest[:, np.maximum(ks - 1, 0)].T), chosen_max)
+            high_max = np.where(has_rest, np.maximum(chosen_max, rest[:, -1]), chosen_max)
+            return ks, _trimmed_mean(low_sum, low_min, low_max, size), _trimmed_mean(high_sum, high_min, high_max, size)
+        raise ValueError(f"Regra de reajuste desconhecida: {self.kind}")
+
+    def _out_of_budget(self):
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            return True
+        return self.deadline is not None and self.nodes % 32 == 0 and time.monotonic() > self.deadline
+
+    def visit(self, included, order, start):
+        """Avalia o conjunto `included` e os que o estendem com índices de order[start:]."""
+        if self.stopped or self._out_of_budget():
+            self.stopped = True
+            return
+        self.nodes += 1
+        remaining = order[start:]
+        if self.best_score <= self.stop_score:
+            self.pruned += 1
+            return
+        if not included and not remaining:
+            return
+        ks, low, high = self._adjustment_range(included, remaining)
+        low_total = self.cost(low)
+        if included and len(included) >= self.min_size: # k = 0: o próprio conjunto
+            total = float(low_total[0])
+            score = self._score(total)
+            if score < self.best_score:
+                self.best_score, self.best_set, self.best_total = score, list(included), total
+        if not remaining:
+            return
+        # Limite da subárvore: para cada tamanho possível, o intervalo [menor, maior] dos totais
+        valid = (ks > 0) & (len(included) + ks >= self.min_size)
+        if not valid.any():
+            bound = np.inf
+        elif self.objective == "barato":
+            bound = low_total[valid].min()
+        else:
+            high_total = self.cost(high[valid])
+            bound = np.maximum(0.0, np.maximum(low_total[valid] - self.target, self.target - high_total)).min()
+        if bound >= self.best_score:
+            self.pruned += 1
+            return
+        for i in range(start, len(order)):
+            self.visit(included + [order[i]], order, i + 1)
+
+def find_best_rules(start_rent, start_date, end_date, rolling, index_names=None, aggregations=AGGREGATIONS,
+                    objective="barato", target_total=None, min_size=1, tolerance=0.0, max_nodes=None,
+                    max_seconds=None):
+    """Melhor subconjunto de índices para cada regra de agregação, por busca exata com poda.
+
+    objective: 'barato' (menor total pago) ou 'justo' (total mais próximo de
+    target_total). tolerance (R$, só no 'justo'): aceita o primeiro conjunto a
+    essa distância da referência em vez do mais próximo; 0 mantém a busca
+    exata. max_nodes (por regra) e max_seconds (a chamada inteira, dividido
+    entre as regras ainda não buscadas) limitam a busca: esgotado o orçamento,
+    a regra volta com o melhor conjunto encontrado até ali e 'completa' falso.
+    Só entram índices com acumulado 12m em todos os aniversários do contrato
+    que já têm dado. Retorna (lista de dicts com cenário, total pago, nós
+    visitados e se a busca foi completa, por regra; índices excluídos por
+    falta de dados).
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Objetivo inválido: {objective} (use {', '.join(OBJECTIVES)})")
+    if objective == "justo" and target_total is None:
+        raise ValueError("O objetivo 'justo' precisa de target_total")
+    if tolerance < 0:
+        raise ValueError("A tolerância não pode ser negativa")
+    if (max_nodes is not None and max_nodes < 1) or (max_seconds is not None and max_seconds <= 0):
+        raise ValueError("O orçamento da busca precisa ser positivo")
+    finish = None if max_seconds is None else time.monotonic() + max_seconds
+    if not isinstance(rolling, MonthlySeries):
+        rolling = MonthlySeries.from_frame(rolling)
+    index_names = list(rolling.names) if index_names is None else [name for name in index_names if name in rolling]
+
+    months, is_anniversary, index_months = get_adjustment_schedule(start_date, end_date)
+    values = rolling.take(index_months[is_anniversary], names=index_names) # (aniversários x índices)
+    # Aniversários sem dado de nenhum índice (futuro): sem reajuste em qualquer regra
+    has_data = ~np.isnan(values).all(axis=1)
+    eligible = [i for i in range(len(index_names)) if not np.isnan(values[has_data, i]).any()]
+    excluded = [index_names[i] for i in range(len(index_names)) if i not in eligible]
+    values = np.where(has_data[:, None], values, 0.0)[:, eligible]
+    names = [index_names[i] for i in eligible]
+    segments = _segments(is_anniversary)
+
+    def cost(perc):
+        return _total_paid(start_rent, segments, perc)
+
+    results = []
+    if not names:
+        return results, excluded
+    # Índices individuais em ordem do objetivo: bons conjuntos aparecem cedo e podam mais
+    single_totals = cost(values.T)
+    scores = single_totals if objective == "barato" else np.abs(single_totals - target_total)
+    order = [int(i) for i in np.argsort(scores, kind="stable")]
+    for position, kind in enumerate(aggregations):
+        # Tempo restante dividido igualmente entre as regras que faltam
+        deadline = None if finish is None else time.monotonic() + (finish - time.monotonic()) / (len(aggregations) - position)
+        search = _RuleSearch(values, kind, cost, objective, target_total, max(min_size, 1), tolerance,
+                             max_nodes, deadline)
+        with span("busca_regra"):
+            search.visit([], order, 0)
+        if search.best_set is None:
+            continue
+        chosen = tuple(names[i] for i in sorted(search.best_set))
+        scenario = RentScenario("base", chosen) if len(chosen) == 1 else RentScenario(kind, chosen)
+        results.append({
+            "regra": kind,
+            "cenario": scenario,
+            "total_pago": search.best_total,
+            "nos_visitados": search.nodes,
+            "ramos_podados": search.pruned,
+            "completa": not search.stopped,
+        })
+    return results, excluded
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Serviço HTTP/JSON local para inflação acumulada e reajuste de aluguel.
+
+Uso:
+    python -m indice_imobiliario.server --porta 8765
+
+Rotas (GET):
+    /inflacao?indice=IPCA&inicio=2023-01&fim=2023-12
+        Inflação acumulada (%) entre dois meses, inclusive.
+    /reajuste?indice=IGP-M&mes=2024-03
+    /reajuste?indices=IGP-M,IPCA&regra=media&mes=2024-03
+        Reajuste (%) no aniversário do contrato (acumulado 12m do mês anterior);
+        regra: base (padrão, um índice), media ou minimo.
+    /saude
+        Índices carregados, último mês disponível e estatísticas do cache.
+    /metricas
+        Tempos por etapa, contadores e cache no formato texto do Prometheus.
+
+As tabelas ficam pré-calculadas em memória (IndexTables) e são recarregadas em
+segundo plano; cada consulta é só uma leitura de array.
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .cache import cache_stats
+from .metrics import prometheus_text, span
+from .monthly import month_ordinal, ordinal_label
+from .tables import IndexTables
+
+RULES = ("base", "media", "minimo")
+
+class _BadRequest(Exception):
+    """Parâmetros inválidos na consulta (resposta 400)."""
+
+def _param(params, name):
+    values = params.get(name)
+    if not values or not values[0].strip():
+        raise _BadRequest(f"Parâmetro obrigatório ausente: {name}")
+    return values[0].strip()
+
+def _month_param(params, name):
+    value = _param(params, name)
+    try:
+        return month_ordinal(value)
+    except ValueError:
+        raise _BadRequest(f"Mês inválido em '{name}': {value} (use AAAA-MM)")
+
+def _index_names(tables, params, name):
+    names = [item.strip() for item in _param(params, name).split(",") if item.strip()]
+    unknown = [item for item in names if item not in tables.columns]
+    if unknown:
+        raise _BadRequest(f"Índice(s) sem dados: {', '.join(unknown)}")
+    return names
+
+def handle_inflacao(tables, params):
+    name = _index_names(tables, params, "indice")[0]
+    start, end = _month_param(params, "inicio"), _month_param(params, "fim")
+    if end < start:
+        raise _BadRequest("'fim' não pode ser anterior a 'inicio'")
+    return {
+        "indice": name,
+        "inicio": ordinal_label(start),
+        "fim": ordinal_label(end),
+        "inflacao_acumulada_perc": tables.accumulated_inflation(name, start, end),
+    }
+
+def handle_reajuste(tables, params):
+    rule = params.get("regra", ["base"])[0]
+    if rule not in RULES:
+        raise _BadRequest(f"Regra inválida: {rule} (use {', '.join(RULES)})")
+    names = _index_names(tables, params, "indices" if "indices" in params else "indice")
+    if rule == "base" and len(names) != 1:
+        raise _BadRequest("A regra 'base' usa exatamente um índice")
+    anniversary = _month_param(params, "mes")
+    return {
+        "indices": names,
+        "regra": rule,
+        "mes_reajuste": ordinal_label(anniversary),
+        "mes_indice": ordinal_label(anniversary - 1),
+        "reajuste_perc": tables.adjustment_perc(names, anniversary, rule),
+    }
+
+def handle_saude(tables, params):
+    return {"indices": tables.names, "ultimo_mes": ordinal_label(tables.last_ordinal), "cache": cache_stats()}
+
+def handle_metricas(tables, params):
+    return prometheus_text()
+
+ROUTES = {
+    "/inflacao": handle_inflacao,
+    "/reajuste": handle_reajuste,
+    "/saude": handle_saude,
+    "/metricas": handle_metricas,
+}
+
+class IndexRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Mantém a conexão aberta entre consultas (keep-alive)
+    disable_nagle_algorithm = True # Cabeçalho e corpo saem sem esperar o ACK do cliente
+    server_version = "IndiceImobiliario/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        handler = ROUTES.get(url.path)
+        if handler is None:
+            self._send_json(404, {"erro": f"Rota não encontrada: {url.path}"})
+            return
+        try:
+            with span("servidor" + url.path):
+                body = handler(self.server.tables, parse_qs(url.query))
+        except _BadRequest as e:
+            self._send_json(400, {"erro": str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {"erro": f"Erro interno: {e}"})
+            return
+        self._send_json(200, body)
+
+    def _send_json(self, status, body):
+        if isinstance(body, str): # Texto puro (métricas Prometheus)
+            payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            payload, content_type = json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass # Sem log por requisição no caminho crítico
+
+class IndexServer(ThreadingHTTPServer):
+    """Servidor HTTP com as tabelas dos índices em memória, recarregadas periodicamente."""
+
+    daemon_threads = True
+
+    def __init__(self, address, tables, reload_seconds=3600):
+        super().__init__(address, IndexRequestHandler)
+        self.tables = tables
+        self._reload_seconds = reload_seconds
+        self._stop_reload = threading.Event()
+
+    def _reload_loop(self):
+        while not self._stop_reload.wait(self._reload_seconds):
+            try:
+                self.tables = IndexTables.load() # Troca atômica da referência
+            except Exception as e:
+                print(f"Servidor: Falha ao recarregar tabelas, mantendo as atuais - {e}")
+
+    def serve_forever(self, poll_interval=0.5):
+        if self._reload_seconds:
+            threading.Thread(target=self._reload_loop, name="recarga-tabelas", daemon=True).start()
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self._stop_reload.set()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço HTTP de inflação acumulada e reajuste de aluguel.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--recarregar-segundos", type=int, default=3600,
+                        help="Intervalo para recarregar as séries (0 desativa)")
+    args = parser.parse_args(argv)
+
+    server = IndexServer((args.host, args.porta), IndexTables.load(), reload_seconds=args.recarregar_segundos)
+    print(f"Servindo em http://{args.host}:{args.porta}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
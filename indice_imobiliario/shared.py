@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""Camada de cache compartilhada entre réplicas (opcional): Redis ou diretório comum.
+
+Com várias réplicas do app atrás de um balanceador, cada processo tem o seu
+memory_cache e buscaria as séries no BCB por conta própria. Com a variável
+INDICE_SHARED_CACHE definida, as séries baixadas e os acumulados 12m são
+publicados uma vez nessa camada, com número de versão, e as demais réplicas os
+leem dali sem nova busca:
+
+    INDICE_SHARED_CACHE=redis://localhost:6379/0   # servidor compatível com Redis (pacote 'redis')
+    INDICE_SHARED_CACHE=/dev/shm/indice_cache      # diretório em memória ou volume comum
+
+Cada publicação grava o conteúdo da nova versão e só depois aponta a versão
+corrente para ele, então um leitor nunca vê conteúdo pela metade. Uma trava com
+prazo garante que só uma réplica busca a mesma série por vez. Entradas com chave
+pelo conteúdo (como o acumulado 12m de uma versão dos dados) não recebem novas
+versões, só chaves novas: no Redis elas vencem em DIGEST_TTL_SECONDS e no
+diretório a publicação de uma chave nova da mesma família apaga a anterior.
+Falhas da camada compartilhada nunca derrubam a consulta: viram falta de cache e
+a réplica segue sozinha. O conteúdo é serializado com pickle; use apenas um
+servidor ou diretório restrito às réplicas.
+"""
+
+import hashlib
+import os
+import pickle
+import time
+
+from .metrics import count
+
+DEFAULT_LOCK_SECONDS = 120 # Prazo da trava de busca (maior que uma carga completa do BCB)
+DIGEST_TTL_SECONDS = 24 * 3600 # Validade no Redis das entradas com chave pelo conteúdo (recalcular é barato)
+
+def _key_slug(key):
+    """Nome estável de uma chave (tupla) para arquivo ou chave Redis: prefixo legível + hash."""
+    digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest()
+    return f"{key[0]}-{digest}" if isinstance(key, tuple) and key else digest
+
+class SharedCache:
+    """Operações comuns às camadas; subclasses implementam _read, _write, _lock, _unlock e _supersede."""
+
+    description = ""
+
+    def get(self, key):
+        """(valor, versão, publicado_em) da versão corrente, ou None se ausente ou com falha."""
+        try:
+            entry = self._read(_key_slug(key))
+        except Exception as e:
+            print(f"Cache compartilhado ({self.description}): Falha na leitura de {key} - {e}")
+            count("cache_compartilhado_erros")
+            return None
+        count("cache_compartilhado_acertos" if entry is not None else "cache_compartilhado_faltas")
+        if entry is None:
+            return None
+        payload, version, published_at = entry
+        return pickle.loads(payload), version, published_at
+
+    def publish(self, key, value, ttl=None, family=None):
+        """Publica o valor como nova versão corrente; devolve a versão (None em caso de falha).
+
+        ttl: segundos até a entrada vencer (onde a camada suporta). family: chave
+        do grupo a que a entrada pertence; a publicada antes na mesma família é
+        dada como substituída.
+        """
+        slug = _key_slug(key)
+        try:
+            version = self._write(slug, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time(), ttl)
+            if family is not None:
+                self._supersede(_key_slug(family), slug)
+            return version
+        except Exception as e:
+            print(f"Cache compartilhado ({self.description}): Falha ao publicar {key} - {e}")
+            count("cache_compartilhado_erros")
+            return None
+
+    def lock(self, key, seconds=DEFAULT_LOCK_SECONDS):
+        """Tenta a trava de busca da chave; com a camada fora do ar, deixa a réplica buscar sozinha."""
+        try:
+            return self._lock(_key_slug(key), seconds)
+        except Exception as e:
+            print(f"Cache compartilhado ({self.description}): Falha na trava de {key} - {e}")
+            return True
+
+    def unlock(self, key):
+        try:
+            self._unlock(_key_slug(key))
+        except Exception as e:
+            print(f"Cache compartilhado ({self.description}): Falha ao liberar a trava de {key} - {e}")
+
+    def get_or_compute(self, key, compute, family=None):
+        """Valor publicado da chave; se ausente, calcula e publica (para chaves já versionadas pelo conteúdo).
+
+        A entrada vence em DIGEST_TTL_SECONDS; com `family` (ex.: a chave sem o
+        digest), publicar um conteúdo novo substitui o da versão anterior dos dados.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry[0]
+        value = compute()
+        self.publish(key, value, ttl=DIGEST_TTL_SECONDS, family=family)
+        return value
+
+class SharedDirectoryCache(SharedCache):
+    """Camada num diretório comum às réplicas (tmpfs como /dev/shm no mesmo host, ou volume montado).
+
+    Cada versão é um arquivo próprio e o arquivo '.atual' aponta a versão
+    corrente; as trocas usam os.replace, que é atômico no mesmo sistema de arquivos.
+    Sem prazo de validade: o arquivo '.ultima' de cada família guarda a última
+    chave publicada, e os arquivos da anterior são apagados ao publicar outra.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.description = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, slug, suffix):
+        return os.path.join(self.path, f"{slug}.{suffix}")
+
+    def _replace(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _current(self, slug):
+        try:
+            with open(self._file(slug, "atual"), encoding="utf-8") as f:
+                version, published_at = f.read().split()
+        except FileNotFoundError:
+            return None
+        return int(version), float(published_at)
+
+    def _read(self, slug):
+        for _ in range(2): # A versão lida pode ter sido substituída e apagada logo em seguida
+            current = self._current(slug)
+            if current is None:
+                return None
+            try:
+                with open(self._file(slug, f"v{current[0]}"), "rb") as f:
+                    return f.read(), current[0], current[1]
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _write(self, slug, payload, published_at, ttl=None):
+        current = self._current(slug)
+        version = (current[0] if current else 0) + 1
+        self._replace(self._file(slug, f"v{version}"), payload)
+        self._replace(self._file(slug, "atual"), f"{version} {published_at!r}".encode("utf-8"))
+        # Mantém a versão anterior para leitores em andamento; apaga as mais antigas
+        if version > 2:
+            try:
+                os.remove(self._file(slug, f"v{version - 2}"))
+            except FileNotFoundError:
+                pass
+        return version
+
+    def _supersede(self, family_slug, slug):
+        path = self._file(family_slug, "ultima")
+        try:
+            with open(path, encoding="utf-8") as f:
+                previous = f.read().strip()
+        except FileNotFoundError:
+            previous = None
+        if previous == slug:
+            return
+        self._replace(path, slug.encode("utf-8"))
+        if not previous:
+            return
+        # Leitores que já abriram o arquivo seguem lendo; os próximos veem a falta e recalculam
+        prefix = f"{previous}."
+        for name in os.listdir(self.path):
+            if name.startswith(prefix) and not name.endswith(".trava"):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+    def _lock(self, slug, seconds):
+        path = self._file(slug, "trava")
+        for _ in range(2):
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) <= seconds:
+                        return False
+                    os.remove(path) # Trava vencida (réplica que caiu no meio da busca)
+                except FileNotFoundError:
+                    pass
+        return False
+
+    def _unlock(self, slug):
+        try:
+            os.remove(self._file(slug, "trava"))
+        except FileNotFoundError:
+            pass
+
+class RedisSharedCache(SharedCache):
+    """Camada num servidor compatível com Redis (Redis, Valkey, KeyDB...).
+
+    Chaves: 'indice:<chave>:v<n>' com o conteúdo de cada versão e
+    'indice:<chave>:atual' com "<versão> <publicado_em>"; a versão vem de INCR.
+    Com ttl, as três chaves vencem juntas e as substituídas somem sozinhas.
+    """
+
+    PREVIOUS_VERSION_SECONDS = 300 # Versão anterior ainda legível por quem já leu o ponteiro
+
+    def __init__(self, url=None, client=None, prefix="indice"):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("INDICE_SHARED_CACHE com Redis exige o pacote 'redis' (pip install redis).")
+            client = redis.Redis.from_url(url)
+        self._client = client
+        self._prefix = prefix
+        self.description = url or "redis"
+
+    def _name(self, slug, suffix):
+        return f"{self._prefix}:{slug}:{suffix}"
+
+    def _read(self, slug):
+        for _ in range(2):
+            current = self._client.get(self._name(slug, "atual"))
+            if current is None:
+                return None
+            version, published_at = current.decode("utf-8").split()
+            payload = self._client.get(self._name(slug, f"v{version}"))
+            if payload is not None:
+                return payload, int(version), float(published_at)
+        return None
+
+    def _write(self, slug, payload, published_at, ttl=None):
+        version = int(self._client.incr(self._name(slug, "versao")))
+        ttl = int(ttl) if ttl else None
+        pipe = self._client.pipeline()
+        pipe.set(self._name(slug, f"v{version}"), payload, ex=ttl)
+        pipe.set(self._name(slug, "atual"), f"{version} {published_at!r}", ex=ttl)
+        if ttl:
+            pipe.expire(self._name(slug, "versao"), ttl)
+        if version > 1:
+            pipe.expire(self._name(slug, f"v{version - 1}"), self.PREVIOUS_VERSION_SECONDS)
+        pipe.execute()
+        return version
+
+    def _supersede(self, family_slug, slug):
+        pass # As entradas substituídas vencem pelo ttl
+
+    def _lock(self, slug, seconds):
+        return bool(self._client.set(self._name(slug, "trava"), b"1", nx=True, ex=int(seconds)))
+
+    def _unlock(self, slug):
+        self._client.delete(self._name(slug, "trava"))
+
+def open_shared_cache(spec):
+    """Camada compartilhada a partir de uma URL redis:// (ou rediss://, unix://) ou de um diretório; None se vazio."""
+    if not spec:
+        return None
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedCache(spec)
+    return SharedDirectoryCache(spec)
+
+# Camada do processo (None sem INDICE_SHARED_CACHE: cada réplica só com o próprio memory_cache)
+shared_cache = open_shared_cache(os.environ.get("INDICE_SHARED_CACHE"))
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""Simulação vetorizada de reajuste anual de aluguel por índice, média ou mínimo.
+
+O aluguel é linear no valor inicial, então os caminhos de reajuste ficam em
+cache por aluguel unitário (simulate_rent_scenarios): mudar o aluguel inicial
+só reescala, e estender a data final calcula apenas os meses novos.
+"""
+
+from dataclasses import dataclass
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from .accumulation import calculate_rolling_12m_accumulation
+from .cache import memory_cache
+from .metrics import count
+from .monthly import MonthlySeries, month_ordinal
+
+# --- Simulação de Aluguel (Kernel Vetorizado) ---
+def get_adjustment_schedule(start_date, end_date):
+    """Meses do contrato (ordinais), máscara dos meses de reajuste e mês do índice usado em cada um.
+
+    Os meses são os dias 01 entre as duas datas, inclusive: um contrato iniciado
+    no meio do mês começa a pagar no mês seguinte.
+    """
+    start_ordinal = month_ordinal(start_date)
+    first = start_ordinal + (1 if start_date.day > 1 else 0)
+    months = np.arange(first, month_ordinal(end_date) + 1, dtype=np.int64)
+    # Reajuste no mês de aniversário do contrato (e não no primeiro mês)
+    is_anniversary = (months % 12 == start_ordinal % 12) & (months > start_ordinal)
+    # A data do índice para reajuste é o mês ANTERIOR ao mês do reajuste
+    return months, is_anniversary, months - 1
+
+def compute_rent_path(start_rent, adjustment_perc):
+    """Aluguel pago mês a mês e total pago, dados os reajustes (%) por mês (NaN = sem reajuste).
+
+    Aceita um vetor (um cenário) ou uma matriz (cenários x meses); o cálculo é
+    feito ao longo do último eixo.
+    """
+    factors = 1 + np.nan_to_num(np.asarray(adjustment_perc, dtype=float), nan=0.0) / 100
+    start = np.full(factors.shape[:-1] + (1,), float(start_rent))
+    # Produto acumulado sequencial, a partir do aluguel inicial
+    rent = np.cumprod(np.concatenate((start, factors), axis=-1), axis=-1)[..., 1:]
+    if rent.shape[-1]:
+        total_paid = np.cumsum(rent, axis=-1)[..., -1]
+    else:
+        total_paid = np.zeros(rent.shape[:-1])
+    if rent.ndim == 1:
+        total_paid = float(total_paid)
+    return rent, total_paid
+
+# --- Cenários de Reajuste (Índice Base, Média, Mínimo, Mediana, Média Aparada) ---
+AGGREGATIONS = ("media", "minimo", "mediana", "media_aparada")
+AGGREGATION_LABELS = {"media": "Média", "minimo": "Mínimo", "mediana": "Mediana", "media_aparada": "Média aparada"}
+
+@dataclass(frozen=True)
+class RentScenario:
+    """Regra de reajuste: um índice base, ou uma agregação (AGGREGATIONS) de um conjunto de índices."""
+    kind: str # 'base', 'media', 'minimo', 'mediana' ou 'media_aparada'
+    indices: tuple
+
+    @property
+    def label(self):
+        """Nome exibido do cenário (ex: "Média (IGP-M, IPCA)")."""
+        if self.kind == "base":
+            return self.indices[0]
+        return f"{AGGREGATION_LABELS[self.kind]} ({', '.join(self.indices)})"
+
+def aggregate_adjustments(values, kind):
+    """Aplica a regra ao longo do último eixo; NaN marca índice fora do conjunto (ignorado).
+
+    'media_aparada' descarta o maior e o menor valor quando há 3 ou mais índices.
+    Todas as regras são não decrescentes em cada valor.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if kind == "minimo":
+            return np.fmin.reduce(values, axis=-1)
+        count = (~np.isnan(values)).sum(axis=-1)
+        total = np.nansum(values, axis=-1)
+        if kind in ("base", "media"):
+            return total / count
+        ordered = np.sort(values, axis=-1) # NaN vai para o fim
+        last = np.maximum(count - 1, 0)[..., None]
+        if kind == "mediana":
+            lower = np.take_along_axis(ordered, last // 2, axis=-1)[..., 0]
+            upper = np.take_along_axis(ordered, (last + 1) // 2, axis=-1)[..., 0]
+            return (lower + upper) / 2
+        if kind == "media_aparada":
+            highest = np.take_along_axis(ordered, last, axis=-1)[..., 0]
+            trimmed = (total - ordered[..., 0] - highest) / (count - 2)
+            return np.where(count >= 3, trimmed, total / count)
+    raise ValueError(f"Regra de reajuste desconhecida: {kind}")
+
+def build_rent_scenarios(index_names, exclude_base=None, max_combo_size=None):
+    """Cenários base de cada índice e de Média/Mínimo para todas as combinações de 2 até N índices."""
+    index_names = list(index_names)
+    scenarios = [RentScenario("base", (name,)) for name in index_names if name != exclude_base]
+    max_size = len(index_names) if max_combo_size is None else min(max_combo_size, len(index_names))
+    for r in range(2, max_size + 1):
+        for combo in combinations(index_names, r):
+            scenarios.append(RentScenario("media", combo))
+            scenarios.append(RentScenario("minimo", combo))
+    return scenarios
+
+def evaluate_rent_scenarios(start_rent, start_date, end_date, scenarios, precalculated_rolling_data):
+    """Simula todos os cenários de uma vez sobre uma matriz (cenários x meses de reajuste).
+
+    Cada cenário vira uma linha de pertinência sobre as séries de
+    `precalculated_rolling_data` (acumulado 12m, MonthlySeries ou DataFrame
+    indexado por mês); as regras são calculadas para todos os cenários numa
+    única passada vetorizada (scenario_kernel).
+    Retorna (ordinais dos meses, reajustes % [cenários x meses], aluguéis [cenários x meses], totais pagos).
+    """
+    if not isinstance(precalculated_rolling_data, MonthlySeries):
+        precalculated_rolling_data = MonthlySeries.from_frame(precalculated_rolling_data)
+    months, is_anniversary, index_months = get_adjustment_schedule(start_date, end_date)
+    adjustment_perc = _scenario_adjustments(scenarios, precalculated_rolling_data, is_anniversary, index_months)
+    rent, total_paid = compute_rent_path(start_rent, adjustment_perc)
+    return months, adjustment_perc, rent, total_paid
+
+def scenario_membership(scenarios, names):
+    """Matriz booleana (cenários x índices): True onde o índice entra no cenário."""
+    positions = {name: i for i, name in enumerate(names)}
+    rows = np.repeat(np.arange(len(scenarios)), [len(sc.indices) for sc in scenarios])
+    columns = [positions[name] for sc in scenarios for name in sc.indices]
+    membership = np.zeros((len(scenarios), len(names)), dtype=bool)
+    membership[rows, columns] = True
+    return membership
+
+def scenario_kernel(scenarios, membership, accum_values):
+    """Reajuste % de cada cenário a partir do acumulado 12m (... x aniversários x índices).
+
+    Devolve (... x cenários x aniversários); as dimensões iniciais (ex.: caminhos
+    simulados) são preservadas. NaN em qualquer índice do cenário propaga (sem
+    reajuste no mês).
+    """
+    kinds = np.array([sc.kind for sc in scenarios])
+    missing = np.isnan(accum_values)
+    # Índice ausente em algum cenário: (... x aniversários x cenários)
+    any_missing = (missing.astype(np.float64) @ membership.T.astype(np.float64)) > 0
+    adjustment = np.empty(accum_values.shape[:-1] + (len(scenarios),))
+
+    # Base e média: soma dos índices do cenário por produto de matrizes, sem materializar (... x cenários x índices)
+    mean_rows = np.flatnonzero(np.isin(kinds, ("base", "media")))
+    if len(mean_rows):
+        totals = np.where(missing, 0.0, accum_values) @ membership[mean_rows].T.astype(np.float64)
+        adjustment[..., mean_rows] = totals / membership[mean_rows].sum(axis=1)
+    # Mínimo, mediana e média aparada: só nas linhas desses cenários
+    for kind in sorted(set(kinds) - {"base", "media"}):
+        rows = np.flatnonzero(kinds == kind)
+        selected = membership[rows][:, None, :] # (cenários, 1, índices)
+        values = np.where(selected, accum_values[..., None, :, :], np.nan) # (... x cenários x aniversários x índices)
+        adjustment[..., rows] = np.moveaxis(aggregate_adjustments(values, kind), -2, -1)
+    adjustment[any_missing] = np.nan
+    return np.swapaxes(adjustment, -1, -2)
+
+def _scenario_adjustments(scenarios, rolling, is_anniversary, index_months):
+    """Reajustes % (cenários x meses) do calendário dado; NaN nos meses sem reajuste."""
+    membership = scenario_membership(scenarios, rolling.names)
+    # Acumulado 12m de cada índice nos meses de reajuste: (meses de reajuste x índices)
+    accum_values = rolling.take(index_months[is_anniversary])
+    adjustment_perc = np.full((len(scenarios), len(is_anniversary)), np.nan)
+    adjustment_perc[:, is_anniversary] = scenario_kernel(scenarios, membership, accum_values)
+    return adjustment_perc
+
+# --- Simulação em Cache (caminhos por aluguel unitário) ---
+def _extend_unit_paths(paths, scenarios, rolling, is_anniversary, index_months):
+    """Estende (reajustes %, aluguel unitário, total pago unitário acumulado) até o fim do calendário.
+
+    Só os meses após os já calculados em `paths` são simulados, a partir do
+    último aluguel e do total acumulados.
+    """
+    done = 0 if paths is None else paths[0].shape[1]
+    adjustment_new = _scenario_adjustments(scenarios, rolling, is_anniversary[done:], index_months[done:])
+    factors = 1 + np.nan_to_num(adjustment_new, nan=0.0) / 100
+    if done == 0:
+        rent_new = np.cumprod(factors, axis=1)
+        return adjustment_new, rent_new, np.cumsum(rent_new, axis=1)
+    adjustment, rent, total = paths
+    rent_new = rent[:, -1:] * np.cumprod(factors, axis=1)
+    total_new = total[:, -1:] + np.cumsum(rent_new, axis=1)
+    return (
+        np.concatenate((adjustment, adjustment_new), axis=1),
+        np.concatenate((rent, rent_new), axis=1),
+        np.concatenate((total, total_new), axis=1),
+    )
+
+def simulate_rent_scenarios(start_rent, start_date, end_date, scenarios, precalculated_rolling_data):
+    """Mesmo resultado de evaluate_rent_scenarios, com os caminhos de reajuste em cache (memory_cache).
+
+    A chave é (cenários, mês de início, versão dos dados); a data final só
+    define quantos meses do caminho são usados. Um fim mais distante que o já
+    calculado simula apenas os meses novos; outro aluguel inicial reescala.
+    """
+    if not isinstance(precalculated_rolling_data, MonthlySeries):
+        precalculated_rolling_data = MonthlySeries.from_frame(precalculated_rolling_data)
+    months, is_anniversary, index_months = get_adjustment_schedule(start_date, end_date)
+    key = ("rent_paths", tuple(scenarios), month_ordinal(start_date), start_date.day > 1,
+           precalculated_rolling_data.digest())
+    paths = memory_cache.get(key)
+    if paths is None or paths[0].shape[1] < len(months):
+        count("simulacao_meses_calculados", len(months) - (0 if paths is None else paths[0].shape[1]))
+        paths = _extend_unit_paths(paths, scenarios, precalculated_rolling_data, is_anniversary, index_months)
+        for array in paths:
+            array.flags.writeable = False # Compartilhados entre consultas
+        memory_cache.put(key, paths)
+
+    n = len(months)
+    adjustment, rent, total = paths
+    total_paid = start_rent * total[:, n - 1] if n else np.zeros(len(scenarios))
+    return months, adjustment[:, :n], start_rent * rent[:, :n], total_paid
+
+def build_rolling_12m_table(monthly):
+    """Acumulado 12m de todos os índices (MonthlySeries), pronto para a simulação.
+
+    Aceita MonthlySeries ou DataFrame mensal (meses x índices).
+    """
+    if not isinstance(monthly, MonthlySeries):
+        monthly = MonthlySeries.from_frame(monthly)
+    return calculate_rolling_12m_accumulation(monthly)
+
+# --- Simulação de Pagamentos (um cenário, com histórico mês a mês) ---
+def simulate_rent_payments_v3(start_rent, start_date, end_date, scenario, precalculated_rolling_data):
+    """Simula pagamentos de aluguel mês a mês, aplicando reajuste anual (vetorizado)."""
+    # Verifica se temos os dados pré-calculados para TODOS os índices base necessários
+    missing_data = [idx for idx in scenario.indices if idx not in precalculated_rolling_data]
+    if missing_data:
+        return None, 0, f"Dados acumulados 12m ausentes para simular com: {', '.join(missing_data)}"
+
+    months, adjustment_perc, rent, total_paid = simulate_rent_scenarios(
+        start_rent, start_date, end_date, [scenario], precalculated_rolling_data
+    )
+    adjustment_perc, rent = adjustment_perc[0], rent[0]
+    adjusted_value = np.diff(rent, prepend=float(start_rent)) # Diferença para o mês anterior
+
+    # Cria o DataFrame do histórico
+    history_df = pd.DataFrame({
+        "Mês/Ano": [f"{month % 12 + 1:02d}/{month // 12}" for month in months],
+        "Índice Mês Reajuste (%)": adjustment_perc, # Só mostra se houve reajuste
+        "Valor Reajuste (R$)": np.where(adjusted_value != 0, adjusted_value, np.nan),
+        "Aluguel Pago (R$)": rent
+    })
+    return history_df, float(total_paid[0]), None # Retorna DF, Total e None (sem erro)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Armazenamento local (SQLite) das séries mensais, com sincronização incremental.
+
+Valores passados quase nunca mudam, então cada sincronização busca na API só
+os meses posteriores ao último armazenado mais uma janela curta dos últimos
+meses (REVISION_MONTHS), regravada por cima para absorver revisões recentes.
+"""
+
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from .bcb import download_sgs_chunked
+from .indices import SGS_HISTORY_START
+from .metrics import count, span
+
+SGS_STORE_PATH = os.environ.get(
+    "SGS_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sgs_store.sqlite3")
+)
+REVISION_MONTHS = 12 # Meses já armazenados buscados de novo a cada sincronização (revisões)
+
+def _open_sgs_store():
+    """Abre (e cria, se necessário) o banco SQLite das séries."""
+    conn = sqlite3.connect(SGS_STORE_PATH, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sgs_valores ("
+        " codigo_sgs INTEGER NOT NULL, data TEXT NOT NULL, valor REAL NOT NULL,"
+        " PRIMARY KEY (codigo_sgs, data))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sgs_sync ("
+        " codigo_sgs INTEGER PRIMARY KEY, ultimo_mes TEXT NOT NULL, atualizado_em TEXT NOT NULL)"
+    )
+    return conn
+
+def load_sgs_store(codigo_sgs):
+    """Lê do disco a série mensal armazenada (None se ainda não houver dados)."""
+    with span("store_leitura"), closing(_open_sgs_store()) as conn:
+        rows = conn.execute(
+            "SELECT data, valor FROM sgs_valores WHERE codigo_sgs = ? ORDER BY data",
+            (codigo_sgs,)
+        ).fetchall()
+    if not rows:
+        return None
+    dates, values = zip(*rows)
+    # Datas ISO 'aaaa-mm-dd' convertidas direto pelo numpy, sem parsing linha a linha
+    index = pd.DatetimeIndex(np.array(dates, dtype='datetime64[D]').astype('datetime64[ns]'), name='data')
+    return pd.DataFrame({f'sgs_{codigo_sgs}': np.array(values, dtype=np.float64)}, index=index)
+
+def sync_sgs_store(codigo_sgs, session=None, keep_local_on_error=True):
+    """Busca os meses após o último armazenado (e os REVISION_MONTHS anteriores) e devolve a série completa.
+
+    Os meses da janela de revisão são regravados com o valor atual da API.
+    Sem nada armazenado, baixa o histórico desde SGS_HISTORY_START em blocos de
+    datas paralelos (download_sgs_chunked). Se a busca incremental falhar, a
+    série já armazenada é devolvida mesmo assim (ou, com keep_local_on_error=False,
+    a exceção é propagada para quem chamou saber que os dados não foram atualizados).
+    """
+    with closing(_open_sgs_store()) as conn:
+        row = conn.execute("SELECT ultimo_mes FROM sgs_sync WHERE codigo_sgs = ?", (codigo_sgs,)).fetchone()
+    last_month = date.fromisoformat(row[0]) if row else None
+
+    if last_month is None:
+        fetch_start = SGS_HISTORY_START
+    else:
+        fetch_start = (pd.Timestamp(last_month) - pd.DateOffset(months=REVISION_MONTHS - 1)).date()
+
+    today = date.today()
+    new_df = None
+    if fetch_start <= today:
+        try:
+            new_df = download_sgs_chunked(codigo_sgs, fetch_start, today, session=session)
+        except Exception as e:
+            if last_month is None or not keep_local_on_error:
+                raise # Nada armazenado para usar no lugar (ou quem chamou trata a falha)
+            print(f"Store BCB ({codigo_sgs}): Falha na busca incremental, usando dados locais - {e}")
+
+    if new_df is not None and not new_df.empty:
+        new_df = new_df[~new_df.index.duplicated(keep='first')]
+        col_name = f'sgs_{codigo_sgs}'
+        rows = list(zip(repeat(codigo_sgs), new_df.index.strftime('%Y-%m-%d'), new_df[col_name].tolist()))
+        newest = max(new_df.index.max().date(), last_month) if last_month else new_df.index.max().date()
+        with span("store_gravacao"), closing(_open_sgs_store()) as conn, conn:
+            if last_month is not None: # Só a janela de revisão é lida para comparar com os valores novos
+                stored = dict(conn.execute(
+                    "SELECT data, valor FROM sgs_valores WHERE codigo_sgs = ? AND data >= ?",
+                    (codigo_sgs, fetch_start.isoformat())
+                ).fetchall())
+                changed = sum(1 for _, data, valor in rows if data in stored and stored[data] != valor)
+                if changed:
+                    print(f"Store BCB ({codigo_sgs}): {changed} mês(es) revisado(s) na janela de revisão.")
+                    count("store_revisoes", changed)
+            conn.executemany("INSERT OR REPLACE INTO sgs_valores (codigo_sgs, data, valor) VALUES (?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO sgs_sync (codigo_sgs, ultimo_mes, atualizado_em) VALUES (?, ?, ?)",
+                (codigo_sgs, newest.isoformat(), pd.Timestamp.now().isoformat(timespec='seconds'))
+            )
+
+    return load_sgs_store(codigo_sgs)
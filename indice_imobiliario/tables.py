@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Tabelas dos índices em memória, em arrays indexados por mês, para consultas rápidas.
+
+Cada mês é identificado por um ordinal inteiro (ano * 12 + mês - 1), de modo que
+localizar um mês é uma subtração, sem busca em índices de datas. Cada série é
+guardada como número-índice encadeado, então qualquer acumulado (janela livre,
+12 meses ou reajuste de aniversário) é uma única divisão.
+"""
+
+import numpy as np
+
+from .accumulation import build_number_index
+from .cache import memory_cache
+from .fetch import load_monthly_series
+from .metrics import span
+from .monthly import MonthlySeries
+from .shared import shared_cache
+from .simulation import build_rolling_12m_table
+
+def get_rolling_12m_table(index_names=None):
+    """Acumulado 12m do histórico completo (MonthlySeries meses x índices), em cache.
+
+    A chave é o conteúdo das séries mensais (digest), então a tabela só é recalculada
+    quando chega um mês novo (ou uma revisão); com a camada compartilhada, a
+    primeira réplica a calcular publica para as demais. Retorna (MonthlySeries, [mensagens de erro]).
+    """
+    monthly, errors = load_monthly_series(index_names)
+    if not len(monthly):
+        return monthly, errors
+
+    def compute():
+        with span("acumulado_12m"):
+            return build_rolling_12m_table(monthly)
+
+    key = ("rolling_12m", monthly.digest())
+    if shared_cache is not None:
+        family = ("rolling_12m", tuple(monthly.names)) # Mesmos índices: o digest novo substitui o anterior
+        rolling = memory_cache.get_or_compute(key, lambda: shared_cache.get_or_compute(key, compute, family=family))
+    else:
+        rolling = memory_cache.get_or_compute(key, compute)
+    return rolling, errors
+
+class IndexTables:
+    """Valores mensais (%) e acumulados 12m de vários índices, alinhados por mês."""
+
+    __slots__ = ("names", "columns", "first_ordinal", "last_ordinal", "monthly", "number_index", "valid_count")
+
+    def __init__(self, monthly):
+        if not isinstance(monthly, MonthlySeries):
+            monthly = MonthlySeries.from_frame(monthly)
+        self.names = list(monthly.names)
+        self.columns = {name: i for i, name in enumerate(self.names)}
+        self.first_ordinal = monthly.first_ordinal
+        self.last_ordinal = monthly.last_ordinal
+        self.monthly = monthly.values # Grade contínua de meses: meses ausentes ficam NaN
+
+        # Linha 0 é a base (antes do primeiro mês); linha r + 1 acumula até o mês da linha r
+        valid = ~np.isnan(self.monthly)
+        base = np.ones((1, len(self.names)))
+        self.number_index = np.vstack([base, build_number_index(monthly).values])
+        # Quantidade acumulada de meses com valor, para saber se uma janela está completa
+        self.valid_count = np.vstack([0 * base, np.cumsum(valid, axis=0)]).astype(np.int64)
+
+    @classmethod
+    def load(cls, index_names=None):
+        """Carrega o histórico completo dos índices (armazenamento local + API)."""
+        monthly, errors = load_monthly_series(index_names)
+        for error_msg in errors:
+            print(error_msg)
+        if not len(monthly):
+            raise RuntimeError("Nenhum dado de índice disponível.")
+        return cls(monthly)
+
+    def _row(self, ordinal):
+        """Posição do mês nas tabelas (None se fora do período disponível)."""
+        if self.first_ordinal <= ordinal <= self.last_ordinal:
+            return ordinal - self.first_ordinal
+        return None
+
+    def accumulated_inflation(self, name, start_ordinal, end_ordinal):
+        """Inflação acumulada (%) de um índice entre dois meses, inclusive (None sem dados)."""
+        col = self.columns[name]
+        start_row = max(start_ordinal - self.first_ordinal, 0)
+        end_row = min(end_ordinal - self.first_ordinal, len(self.monthly) - 1)
+        if end_row < start_row or self.valid_count[end_row + 1, col] == self.valid_count[start_row, col]:
+            return None
+        return float((self.number_index[end_row + 1, col] / self.number_index[start_row, col] - 1) * 100)
+
+    def accumulated_12m(self, cols, ordinal):
+        """Acumulado 12m (%) até o mês, para as colunas informadas (NaN sem 12 meses válidos)."""
+        row = self._row(ordinal)
+        if row is None or row < 11:
+            return np.full(len(cols), np.nan)
+        end, start = self.number_index[row + 1, cols], self.number_index[row - 11, cols]
+        complete = self.valid_count[row + 1, cols] - self.valid_count[row - 11, cols] == 12
+        return np.where(complete, (end / start - 1) * 100, np.nan)
+
+    def adjustment_perc(self, names, anniversary_ordinal, rule="base"):
+        """Reajuste (%) no mês de aniversário: acumulado 12m do mês anterior.
+
+        rule: 'base' (um índice), 'media' ou 'minimo' entre os índices informados.
+        Retorna None se algum índice não tiver o acumulado 12m desse mês.
+        """
+        values = self.accumulated_12m([self.columns[name] for name in names], anniversary_ordinal - 1)
+        if np.isnan(values).any():
+            return None
+        if rule == "minimo":
+            return float(values.min())
+        return float(values.sum() / len(values))
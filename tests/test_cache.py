@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Coalescência de cargas concorrentes (SingleFlight) no LRUCache e no SeriesCache."""
+
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from indice_imobiliario.cache import LRUCache, SeriesCache
+
+THREADS = 16
+
+def _run_concurrently(fn):
+    """Chama fn em THREADS threads liberadas juntas; devolve (resultados, exceções)."""
+    barrier = threading.Barrier(THREADS)
+    results, errors = [], []
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results, errors
+
+def _slow_loader(cache, calls, result):
+    """Loader que só termina quando as demais threads já estão esperando por ele."""
+    def load():
+        calls.append(1)
+        deadline = time.monotonic() + 5
+        while cache.stats()["coalescidas"] < THREADS - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return load
+
+def test_concurrent_misses_share_one_load():
+    cache, calls = LRUCache(), []
+    load = _slow_loader(cache, calls, "valor")
+    results, errors = _run_concurrently(lambda: cache.get_or_compute(("serie", 433), load))
+    assert errors == []
+    assert results == ["valor"] * THREADS
+    assert len(calls) == 1
+    assert cache.stats()["coalescidas"] == THREADS - 1
+
+def test_waiters_receive_the_loader_exception():
+    cache, calls = LRUCache(), []
+    load = _slow_loader(cache, calls, RuntimeError("fora do ar"))
+    results, errors = _run_concurrently(lambda: cache.get_or_compute(("serie", 433), load))
+    assert results == []
+    assert len(errors) == THREADS and all(str(e) == "fora do ar" for e in errors)
+    assert len(calls) == 1
+    with pytest.raises(RuntimeError): # A falha não fica em cache: a próxima chamada tenta de novo
+        cache.get_or_compute(("serie", 433), lambda: (_ for _ in ()).throw(RuntimeError("de novo")))
+
+def test_series_cache_fetches_once_for_concurrent_sessions():
+    cache, calls = LRUCache(), []
+    frame = pd.DataFrame({"sgs_433": [0.5, 0.4]}, index=pd.DatetimeIndex(["2024-01-01", "2024-02-01"], name="data"))
+    load = _slow_loader(cache, calls, frame)
+    series_cache = SeriesCache(lambda codigo_sgs, session=None: load(), refresh_interval=3600, cache=cache)
+    results, errors = _run_concurrently(lambda: series_cache.get(433))
+    assert errors == []
+    assert len(results) == THREADS and all(result is results[0] for result in results)
+    assert len(calls) == 1
+
+def test_failed_refresh_of_evicted_series_does_not_cache_none():
+    cache = LRUCache()
+
+    def failing_loader(codigo_sgs, session=None):
+        raise RuntimeError("fora do ar")
+
+    series_cache = SeriesCache(failing_loader, refresh_interval=3600, cache=cache)
+    series_cache.refresh(433)
+    assert series_cache.peek(433) is None
+    assert series_cache.failures() == {433: "fora do ar"}
+
+def test_refresh_skipped_by_another_replica_does_not_cache_none():
+    class LockedShared: # Outra réplica com a trava e nada publicado ainda
+        def get(self, key):
+            return None
+
+        def lock(self, key):
+            return False
+
+    series_cache = SeriesCache(lambda codigo_sgs, session=None: None, refresh_interval=3600,
+                               cache=LRUCache(), shared=LockedShared())
+    series_cache.refresh(433)
+    assert series_cache.peek(433) is None
+    assert series_cache.failures() == {}
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Busca com poda (find_best_rules) contra a enumeração de todos os subconjuntos."""
+
+import time
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import make_monthly_table
+from indice_imobiliario import (
+    AGGREGATIONS,
+    RentScenario,
+    build_rolling_12m_table,
+    evaluate_rent_scenarios,
+    find_best_rules,
+    month_start,
+)
+
+N_INDICES = 7
+
+@pytest.fixture(scope="module")
+def rolling():
+    return build_rolling_12m_table(make_monthly_table(240, N_INDICES))
+
+def _contracts(rolling, n, seed=0):
+    """Contratos aleatórios de 2 a 10 anos; alguns terminam depois do último mês com dado."""
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        first = rolling.first_ordinal + 12 + int(rng.integers(0, 200))
+        last = first + 12 * int(rng.integers(2, 11)) + int(rng.integers(0, 12))
+        yield month_start(first), month_start(last)
+
+def _brute_force_totals(rolling, start, end, kind):
+    """Total pago de cada subconjunto de índices com a regra `kind` (cenários da calculadora)."""
+    scenarios = [
+        RentScenario("base", combo) if len(combo) == 1 else RentScenario(kind, combo)
+        for size in range(1, N_INDICES + 1)
+        for combo in combinations(rolling.names, size)
+    ]
+    _, _, _, totals = evaluate_rent_scenarios(1000.0, start, end, scenarios, rolling)
+    return totals
+
+@pytest.mark.parametrize("objective", ["barato", "justo"])
+def test_pruned_search_matches_brute_force(rolling, objective):
+    for start, end in _contracts(rolling, 4):
+        target = None
+        if objective == "justo": # Referência entre os totais possíveis, sem coincidir com nenhum
+            _, _, _, reference = evaluate_rent_scenarios(1000.0, start, end, [RentScenario("base", ("IDX01",))], rolling)
+            target = float(reference[0]) * 1.01
+        results, excluded = find_best_rules(1000.0, start, end, rolling, objective=objective, target_total=target)
+        assert excluded == []
+        assert [result["regra"] for result in results] == list(AGGREGATIONS)
+        for result in results:
+            assert result["completa"]
+            totals = _brute_force_totals(rolling, start, end, result["regra"])
+            scores = totals if objective == "barato" else np.abs(totals - target)
+            score = result["total_pago"] if objective == "barato" else abs(result["total_pago"] - target)
+            assert score == pytest.approx(scores.min(), rel=1e-9, abs=1e-6)
+
+def test_justo_tolerance_accepts_any_total_within_it(rolling):
+    start, end = next(_contracts(rolling, 1, seed=1))
+    _, _, _, reference = evaluate_rent_scenarios(1000.0, start, end, [RentScenario("base", ("IDX01",))], rolling)
+    target = float(reference[0]) * 1.01
+    exact, _ = find_best_rules(1000.0, start, end, rolling, objective="justo", target_total=target)
+    tolerant, _ = find_best_rules(1000.0, start, end, rolling, objective="justo", target_total=target, tolerance=50.0)
+    for exact_result, tolerant_result in zip(exact, tolerant):
+        best = abs(exact_result["total_pago"] - target)
+        assert abs(tolerant_result["total_pago"] - target) <= max(best, 50.0) + 1e-6
+        assert tolerant_result["nos_visitados"] <= exact_result["nos_visitados"]
+
+def test_negative_tolerance_is_rejected(rolling):
+    start, end = next(_contracts(rolling, 1))
+    with pytest.raises(ValueError):
+        find_best_rules(1000.0, start, end, rolling, objective="justo", target_total=1.0, tolerance=-1.0)
+
+@pytest.fixture(scope="module")
+def many_indices():
+    """20 índices e um alvo no meio dos totais possíveis: o caso mais lento da busca 'justo'."""
+    rolling = build_rolling_12m_table(make_monthly_table(387, 20))
+    start, end = month_start(rolling.first_ordinal + 120), month_start(rolling.first_ordinal + 239)
+    scenarios = [RentScenario("base", (name,)) for name in rolling.names]
+    _, _, _, totals = evaluate_rent_scenarios(1000.0, start, end, scenarios, rolling)
+    return rolling, start, end, float(np.median(totals)) + 0.123
+
+def test_time_budget_bounds_the_search_with_many_indices(many_indices):
+    rolling, start, end, target = many_indices
+    began = time.monotonic()
+    results, _ = find_best_rules(1000.0, start, end, rolling, objective="justo", target_total=target, max_seconds=2.0)
+    assert time.monotonic() - began < 3.0
+    assert [result["regra"] for result in results] == list(AGGREGATIONS)
+    for result in results: # Mesmo interrompida, a regra devolvida é um conjunto válido e bem avaliado
+        _, _, _, total = evaluate_rent_scenarios(1000.0, start, end, [result["cenario"]], rolling)
+        assert result["total_pago"] == pytest.approx(float(total[0]), rel=1e-9)
+
+def test_node_budget_returns_the_best_found_so_far(many_indices):
+    rolling, start, end, target = many_indices
+    results, _ = find_best_rules(1000.0, start, end, rolling, aggregations=("media",), objective="justo",
+                                 target_total=target, max_nodes=500)
+    assert len(results) == 1
+    assert results[0]["nos_visitados"] <= 500
+    assert not results[0]["completa"]
+
+@pytest.mark.parametrize("budget", [{"max_nodes": 0}, {"max_seconds": -1.0}])
+def test_non_positive_budget_is_rejected(rolling, budget):
+    start, end = next(_contracts(rolling, 1))
+    with pytest.raises(ValueError):
+        find_best_rules(1000.0, start, end, rolling, **budget)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Simulação em cache (simulate_rent_scenarios) contra o núcleo sem cache (evaluate_rent_scenarios)."""
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import make_monthly_table
+from indice_imobiliario import (
+    RentScenario,
+    build_rent_scenarios,
+    build_rolling_12m_table,
+    evaluate_rent_scenarios,
+    memory_cache,
+    month_start,
+    simulate_rent_scenarios,
+)
+
+@pytest.fixture
+def rolling():
+    monthly = make_monthly_table(180, 4)
+    monthly.iloc[40:46, 1] = np.nan # Buraco numa série: cenários com ela ficam sem reajuste nesses meses
+    return build_rolling_12m_table(monthly)
+
+@pytest.fixture(autouse=True)
+def clear_rent_paths():
+    memory_cache.clear(lambda key: key[0] == "rent_paths")
+    yield
+    memory_cache.clear(lambda key: key[0] == "rent_paths")
+
+def _random_contracts(rolling, n, seed=0):
+    """Contratos aleatórios; os inícios se repetem para exercitar acerto, extensão e recorte do cache."""
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(rolling.first_ordinal, rolling.last_ordinal, size=12)
+    scenarios = build_rent_scenarios(rolling.names)
+    for _ in range(n):
+        start = month_start(int(rng.choice(starts)))
+        if rng.random() < 0.3: # Início no meio do mês: aniversários deslocados
+            start = start.replace(day=15)
+        months = int(rng.integers(1, 12 * 12))
+        end = month_start(start.year * 12 + start.month - 1 + months - 1)
+        chosen = [scenarios[i] for i in sorted(rng.choice(len(scenarios), size=int(rng.integers(1, 6)), replace=False))]
+        yield float(rng.uniform(500, 10000)), start, end, chosen
+
+def test_simulate_matches_evaluate_on_random_contracts(rolling):
+    for start_rent, start, end, scenarios in _random_contracts(rolling, 300):
+        expected = evaluate_rent_scenarios(start_rent, start, end, scenarios, rolling)
+        got = simulate_rent_scenarios(start_rent, start, end, scenarios, rolling)
+        np.testing.assert_array_equal(got[0], expected[0])
+        for got_array, expected_array in zip(got[1:], expected[1:]):
+            np.testing.assert_allclose(got_array, expected_array, rtol=1e-12, equal_nan=True)
+
+def test_longer_contract_extends_cached_paths(rolling):
+    scenarios = [RentScenario("base", ("IDX01",)), RentScenario("media", ("IDX01", "IDX03"))]
+    start = date(2000, 3, 1)
+    simulate_rent_scenarios(1000.0, start, date(2003, 2, 1), scenarios, rolling)
+    got = simulate_rent_scenarios(2500.0, start, date(2008, 2, 1), scenarios, rolling)
+    expected = evaluate_rent_scenarios(2500.0, start, date(2008, 2, 1), scenarios, rolling)
+    np.testing.assert_allclose(got[2], expected[2], rtol=1e-12)
+    np.testing.assert_allclose(got[3], expected[3], rtol=1e-12)